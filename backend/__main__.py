@@ -18,7 +18,9 @@ from backend.console import (
     filter_by_ner,
     parse_directory,
     parse_corpus,
+    parse_tables,
     heuristic_filter,
+    text_index,
     add_conditions,
     ps_ner_filter,
     methods,
@@ -49,7 +51,9 @@ def parse_args() -> argparse.Namespace:
     ner_filtered.add_args(subparsers)
     parse_directory.add_args(subparsers)
     parse_corpus.add_args(subparsers)
+    parse_tables.add_args(subparsers)
     heuristic_filter.add_args(subparsers)
+    text_index.add_args(subparsers)
     add_conditions.add_args(subparsers)
     ps_ner_filter.add_args(subparsers)
     methods.add_args(subparsers)
@@ -144,9 +148,15 @@ def main():
     elif args.command == parse_corpus.ScriptName:
         parse_corpus.run(args)
 
+    elif args.command == parse_tables.ScriptName:
+        parse_tables.run(args)
+
     elif args.command == heuristic_filter.ScriptName:
         heuristic_filter.run(args)
 
+    elif args.command == text_index.ScriptName:
+        text_index.run(args)
+
     elif args.command == add_conditions.ScriptName:
         add_conditions.run(args)
 
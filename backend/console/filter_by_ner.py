@@ -115,7 +115,11 @@ def run(args: ArgumentParser):
     # Load Materials bert to GPU
     bert = bert_model.MaterialsBERT()
     bert.init_local_model(
-        sett.NERPipeline.model, sett.NERPipeline.pytorch_device)
+        sett.NERPipeline.model, sett.NERPipeline.pytorch_device,
+        sett.NERPipeline.backend, sett.NERPipeline.onnx_quantize,
+        sett.NERPipeline.onnx_dir)
+    if sett.NERPipeline.use_cache:
+        bert.init_cache(db)
 
     log.info("Running NER filter on selected paragraphs.")
     log.info("Run info = {}", runinfo)
@@ -3,7 +3,9 @@ from tqdm import tqdm
 
 import argcomplete
 from argparse import ArgumentParser, _SubParsersAction
-from backend.postgres.orm import FilteredParagraphs, PaperTexts, PropertyMetadata
+import sqlalchemy as sa
+from backend.postgres.orm import PaperTexts, PropertyMetadata
+from backend.text.keywords import KeywordAutomaton
 
 from collections import defaultdict
 
@@ -14,6 +16,9 @@ log = pylogg.New(ScriptName)
 # material_entity_types = ['POLYMER', 'POLYMER_FAMILY', 'MONOMER', 'ORGANIC']
 filtration_dict = defaultdict(int)
 
+# Number of paragraphs to fetch per query.
+_batch_size = 5000
+
 class FilterPropertyName:
 	property_tg = 'glass transition temperature'
 	property_tm = 'melting temperature'
@@ -54,6 +59,13 @@ def add_args(subparsers: _SubParsersAction):
 	parser.add_argument(
 			"-r", "--filter", default='', choices=list(FilterPropertyName.__dict__.keys()), 
 			help= "Name of the property filter. Should look like property_*")
+	parser.add_argument(
+			"-a", "--all-properties", default=False, action='store_true',
+			help="Run all the property filters in a single pass over the paragraphs.")
+	parser.add_argument(
+			"-b", "--backend", default='python', choices=['python', 'postgres'],
+			help="Run the keyword match in python on the streamed paragraphs, "
+			"or in postgres using the trigram index of text-index. Default: python")
 	argcomplete.autocomplete(parser)
 
 	## add property argument 
@@ -62,29 +74,180 @@ def add_args(subparsers: _SubParsersAction):
 			help="Number of paragraphs to process. Default: 10000000")
 		
 
-def add_to_filtered_paragrahs(db, para_id, filter_name):
-	paragraph = FilteredParagraphs().get_one(db, {'para_id': para_id, 'filter_name': filter_name})
-	if paragraph is not None:
-		log.trace(f"Paragraph in PostGres: {para_id}. Skipped.")
-		return False
-	
-	else:
-		obj = FilteredParagraphs()
-		obj.para_id = para_id
-		obj.filter_name = filter_name
-		obj.insert(db)
+def iter_paragraphs(db, last_processed_id : int, limit : int, batch_size : int = _batch_size):
+	""" Stream the (id, text) rows of the paragraphs of the filtered papers
+	after the last processed id, in batches ordered by id. Each batch is
+	fetched with a keyset paginated query, so only one batch is kept in
+	memory at a time.
+	"""
+	query = sa.text('''
+	SELECT pt.id, pt.text FROM paper_texts pt
+	WHERE pt.id > :last_id
+	AND EXISTS (SELECT 1 FROM filtered_papers fp WHERE fp.doi = pt.doi)
+	ORDER BY pt.id LIMIT :size;
+	''')
+
+	while limit > 0:
+		size = min(batch_size, limit)
+		rows = db.execute(query, {'last_id': last_processed_id, 'size': size}).all()
+		if rows:
+			yield rows
+		if len(rows) < size:
+			return
+		last_processed_id = rows[-1].id
+		limit -= len(rows)
+
+
+def filter_paragraphs(db, last_processed_id : int, limit : int, match) -> tuple[int, int, int]:
+	""" Run a filter over the streamed paragraphs after the last processed id
+	and add the passing ones to filtered_paragraphs, one bulk insert and
+	commit per batch.
+
+	match:		Function of a paragraph returning the names of the filters
+				it passes.
+
+	Returns the (last processed id, number of paragraphs, number of added rows).
+	"""
+	from backend import sett
+	from backend.postgres import persist
+
+	# Not more than debugCount per run.
+	if sett.Run.debugCount > 0:
+		limit = min(limit, sett.Run.debugCount)
+
+	last_id = None
+	total = 0
+	added = 0
+
+	with tqdm(unit='para') as pbar:
+		for batch in iter_paragraphs(db, last_processed_id, limit):
+			passed = []
+			for para in batch:
+				passed.extend((para.id, name) for name in match(para))
+
+			added += persist.add_filtered_paragraphs(db, passed)
+			db.commit()
+
+			last_id = batch[-1].id
+			total += len(batch)
+			filtration_dict['total_paragraphs'] += len(batch)
+			pbar.update(len(batch))
+			log.trace("Processed paragraphs up to row ID {}. Added {} rows.", last_id, added)
+
+	return last_id, total, added
 
-		log.trace(f"Added to PostGres: {para_id}")
-		return True
-	
 
 def keyword_filter(keyword_list, para):
 	"""Pass a filter to only pass paragraphs with relevant information to the LLM"""
-	if any([keyword in para.text or keyword in para.text.lower() for keyword in keyword_list]):
+	text = para.text
+	lower = text.lower()
+	if any(keyword in text or keyword in lower for keyword in keyword_list):
 		return True
 	
 	return False
 
+
+def property_filters() -> list[str]:
+	""" Return the names of all the property filters. """
+	return [name for name in FilterPropertyName.__dict__.keys()
+		 if name.startswith('property_')]
+
+
+def build_property_automaton(db) -> KeywordAutomaton:
+	""" Build a single keyword automaton over the other names of all the
+	properties in the property metadata, labeled by the filter names.
+	"""
+	filters = {getattr(FilterPropertyName, name): name for name in property_filters()}
+	keywords = {}
+
+	for prop_metadata in PropertyMetadata().get_all(db):
+		name = filters.get(prop_metadata.name)
+		if name is None:
+			log.warn("No property filter for {}. Skipped.", prop_metadata.name)
+			continue
+		keywords[name] = prop_metadata.other_names
+
+	return KeywordAutomaton(keywords)
+
+
+def keyword_properties(automaton : KeywordAutomaton, para) -> set[str]:
+	""" Return the names of the property filters passed by a paragraph.
+	Same as running keyword_filter for each property.
+	"""
+	return automaton.find(para.text) | automaton.find(para.text.lower())
+
+
+def _like_pattern(keyword : str) -> str:
+	""" Return the LIKE pattern to find a keyword as a substring. """
+	for ch in ('\\', '%', '_'):
+		keyword = keyword.replace(ch, '\\' + ch)
+	return '%' + keyword + '%'
+
+
+def keyword_condition(keyword_list : list[str], column : str = 'pt.text') -> tuple[str, dict]:
+	""" Return the SQL condition and its parameters equivalent to the
+	keyword_filter on a text column. Lowercase keywords are matched case
+	insensitively, the others as is. Both LIKE and ILIKE can use a pg_trgm
+	GIN index on the column for the keywords of 3 or more characters.
+	"""
+	terms = []
+	params = {}
+	for i, keyword in enumerate(dict.fromkeys(k for k in keyword_list if k)):
+		op = 'ILIKE' if keyword == keyword.lower() else 'LIKE'
+		terms.append(f"{column} {op} :kw_{i}")
+		params[f'kw_{i}'] = _like_pattern(keyword)
+
+	if not terms:
+		return 'FALSE', params
+
+	return '(' + ' OR '.join(terms) + ')', params
+
+
+def last_paragraph_id(db, last_processed_id : int, limit : int) -> int:
+	""" Return the id of the last paragraph of the filtered papers within
+	limit paragraphs after the last processed id, None if there is none.
+	"""
+	from backend import sett
+
+	# Not more than debugCount per run.
+	if sett.Run.debugCount > 0:
+		limit = min(limit, sett.Run.debugCount)
+
+	query = sa.text('''
+	SELECT max(id) AS id FROM (
+		SELECT pt.id FROM paper_texts pt
+		WHERE pt.id > :last_id
+		AND EXISTS (SELECT 1 FROM filtered_papers fp WHERE fp.doi = pt.doi)
+		ORDER BY pt.id LIMIT :limit
+	) AS batch;
+	''')
+	return db.execute(query, {'last_id': last_processed_id, 'limit': limit}).scalar()
+
+
+def insert_matching_paragraphs(db, filter_name : str, keyword_list : list[str],
+							   first_id : int, last_id : int) -> int:
+	""" Add the paragraphs with ids in (first_id, last_id] passing the
+	keyword filter to filtered_paragraphs, by a single INSERT .. SELECT
+	in postgres. The existing rows are skipped. Does not commit.
+
+	Returns the number of inserted rows.
+	"""
+	condition, params = keyword_condition(keyword_list)
+	query = sa.text(f'''
+	INSERT INTO filtered_paragraphs (para_id, filter_name, date_added)
+	SELECT pt.id, :filter_name, now() FROM paper_texts pt
+	WHERE pt.id > :first_id AND pt.id <= :last_id
+	AND EXISTS (SELECT 1 FROM filtered_papers fp WHERE fp.doi = pt.doi)
+	AND {condition}
+	AND NOT EXISTS (
+		SELECT 1 FROM filtered_paragraphs fpa
+		WHERE fpa.para_id = pt.id AND fpa.filter_name = :filter_name
+	);
+	''')
+	params.update(filter_name=filter_name, first_id=first_id, last_id=last_id)
+	return db.execute(query, params).rowcount
+
+
 def process_property(mode, keyword_list, para, prop_metadata, ner_filter= False, heuristic_filter = True):
 	if heuristic_filter:
 		if keyword_filter(keyword_list, para):
@@ -97,89 +260,119 @@ def run(args: ArgumentParser):
 	from backend.utils import checkpoint
 
 	db = postgres.connect()
-	
-	runinfo = {
-		'user': sett.Run.userName,
-		'filter': args.filter,
-		}
+
+	if args.all_properties:
+		return run_all_properties(args, db)
+
+	if not args.filter:
+		raise ValueError("Filter name or --all-properties is required.")
 	
 	last_processed_id = checkpoint.get_last(db, name= args.filter, table= PaperTexts.__tablename__)
 	log.info("Last run row ID: {}", last_processed_id)
 
-	# Query the unprocessed list of rows.
-	query= '''
-	SELECT pt.id AS para_id FROM paper_texts pt
-	JOIN filtered_papers fp ON fp.doi = pt.doi
-	WHERE pt.id > :last_processed_id ORDER BY pt.id LIMIT :limit;
-	'''
-
-	# #Query for sel1k
-	# query = '''
-	# SELECT pt.id AS para_id FROM paper_texts pt
-	# JOIN filtered_papers fp ON fp.doi = pt.doi
-	# WHERE pt.id > :last_processed_id
-	# AND fp.filter_name = 'select-1k'
-	# ORDER BY pt.id
-	# LIMIT :limit;
-	# '''
-
-	t2 = log.info("Querying list of non-processed paragraphs.")
-	records = postgres.raw_sql(query, {'last_processed_id': last_processed_id, 'limit': args.limit})
-	t2.note("Found {} paragraphs not processed.", len(records))
-
-	if len(records) == 0:
-		return
-	else:
-		log.note("Unprocessed Row IDs: {} to {}",
-							records[0].para_id, records[-1].para_id)
-	
-
 	property = getattr(FilterPropertyName, args.filter)
 	mode = property.replace(" ", "_")
 
 	prop_metadata = PropertyMetadata().get_one(db, {"name": property})
 	keyword_list = prop_metadata.other_names
-	
-	relevant_paras = 0
-
-	for row in tqdm(records):
-		if row.para_id < last_processed_id:
-			continue
 
-		if sett.Run.debugCount >0 and filtration_dict['total_paragraphs'] > sett.Run.debugCount:
-			break
-
-		filtration_dict['total_paragraphs'] +=1
+	def match(para):
+		found = process_property(mode= mode,keyword_list=keyword_list, para= para, 
+						   prop_metadata=prop_metadata, ner_filter=False, heuristic_filter=True)
+		return (args.filter,) if found else ()
+
+	t2 = log.info("Filtering non-processed paragraphs in {}.", args.backend)
+	if args.backend == 'postgres':
+		last_id = last_paragraph_id(db, last_processed_id, args.limit)
+		if last_id is not None:
+			added = insert_matching_paragraphs(db, args.filter, keyword_list, last_processed_id, last_id)
+			db.commit()
+	else:
+		last_id, total, added = filter_paragraphs(db, last_processed_id, args.limit, match)
 
-		# Fetch the paragraph texts.
-		para = PaperTexts().get_one(db, {'id': row.para_id})
+	if last_id is None:
+		t2.note("Found 0 paragraphs not processed.")
+		return
 
-		found = process_property(mode= mode,keyword_list=keyword_list, para= para, 
-														prop_metadata=prop_metadata, ner_filter=False, heuristic_filter=True)
-			
-		if found:
-			log.note(f"{para.id} passed the heuristic filter ")
-			relevant_paras +=1
-
-			if add_to_filtered_paragrahs(db, para_id= row.para_id, filter_name = args.filter):
-				if relevant_paras % 50 == 0:
-					db.commit()
-				
-
-		else:
-			log.info(f"{para.id} did not pass the heuristic filter")
-			# log.trace(para.text)
-
-		if filtration_dict['total_paragraphs']% 100 == 0 or filtration_dict['total_paragraphs']== len(records):
-			log.info(f'Number of total paragraphs: {filtration_dict["total_paragraphs"]}')
-			log.info(f'Number of paragraphs with {property} keywords: {filtration_dict[f"{mode}_keyword_paragraphs"]}')
-	
-	log.info(f'Last processed para_id: {row.para_id}')
+	t2.done("Added {} paragraphs to filtered_paragraphs.", added)
+	if args.backend == 'python':
+		log.info(f'Number of total paragraphs: {total}')
+		log.info(f'Number of paragraphs with {property} keywords: {filtration_dict[f"{mode}_keyword_paragraphs"]}')
+	log.info(f'Last processed para_id: {last_id}')
 
-	checkpoint.add_new(db, name = args.filter, table = PaperTexts.__tablename__, row = row.para_id, 
+	checkpoint.add_new(db, name = args.filter, table = PaperTexts.__tablename__, row = last_id, 
 										comment = {'user': sett.Run.userName, 'filter': args.filter,
 										'debug': True if sett.Run.debugCount > 0 else False})
 	
 	db.commit()
 
 
+def run_all_properties(args: ArgumentParser, db):
+	""" Run all the property filters in one pass. Each paragraph is fetched
+	once and added to filtered_paragraphs for every property it passes.
+	The checkpoint of each property filter is used and updated.
+	"""
+	from backend import sett
+	from backend.utils import checkpoint
+
+	automaton = build_property_automaton(db)
+	names = sorted(automaton.labels)
+	if not names:
+		log.error("No property metadata found for the property filters.")
+		return
+
+	log.info("Built keyword automaton of {} properties ({} states).",
+		  len(names), len(automaton))
+
+	# Start from the oldest checkpoint, skip the properties already
+	# processed for a paragraph.
+	last_ids = {
+		name: checkpoint.get_last(db, name=name, table=PaperTexts.__tablename__)
+		for name in names
+	}
+	last_processed_id = min(last_ids.values())
+	log.info("Last run row ID: {}", last_processed_id)
+
+	def match(para):
+		found = [name for name in keyword_properties(automaton, para)
+		   if para.id > last_ids[name]]
+		for name in found:
+			filtration_dict[f'{name}_keyword_paragraphs']+=1
+		return found
+
+	t2 = log.info("Filtering non-processed paragraphs in {}.", args.backend)
+	if args.backend == 'postgres':
+		last_id = last_paragraph_id(db, last_processed_id, args.limit)
+		if last_id is not None:
+			added = 0
+			for name in names:
+				if last_id <= last_ids[name]:
+					continue
+				found = insert_matching_paragraphs(
+					db, name, automaton.keywords[name], last_ids[name], last_id)
+				db.commit()
+				filtration_dict[f'{name}_keyword_paragraphs'] += found
+				added += found
+	else:
+		last_id, total, added = filter_paragraphs(db, last_processed_id, args.limit, match)
+
+	if last_id is None:
+		t2.note("Found 0 paragraphs not processed.")
+		return
+
+	t2.done("Added {} paragraphs to filtered_paragraphs.", added)
+	if args.backend == 'python':
+		log.info(f'Number of total paragraphs: {total}')
+
+	for name in names:
+		log.info(f'Number of paragraphs with {name} keywords: {filtration_dict[f"{name}_keyword_paragraphs"]}')
+
+	log.info(f'Last processed para_id: {last_id}')
+
+	for name in names:
+		if last_id > last_ids[name]:
+			checkpoint.add_new(db, name = name, table = PaperTexts.__tablename__, row = last_id,
+										comment = {'user': sett.Run.userName, 'filter': name,
+										'debug': True if sett.Run.debugCount > 0 else False})
+
+	db.commit()
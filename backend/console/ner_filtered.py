@@ -6,6 +6,9 @@ ScriptName = 'ner-filtered'
 
 log = pylogg.New(ScriptName)
 
+# Number of paragraphs to fetch and tag together.
+_window = 128
+
 
 def add_args(subparsers: _SubParsersAction):
     parser: ArgumentParser = subparsers.add_parser(
@@ -17,6 +20,33 @@ def add_args(subparsers: _SubParsersAction):
     parser.add_argument(
         "-l", "--limit", default=100000, type=int,
         help="Number of paragraphs to process. Default: 100000")
+    parser.add_argument(
+        "-b", "--batch-size", default=16, type=int,
+        help="Number of paragraphs per NER model batch. Default: 16")
+
+
+def _tag_paragraphs(db, bert, para_ids : list[int], batch_size : int):
+    """ Fetch the paragraphs and compute their NER labels in batches.
+        Returns the dicts of paragraphs and NER labels by para_id.
+    """
+    import sqlalchemy as sa
+    from backend.postgres.orm import PaperTexts
+
+    paragraphs = {
+        para.id: para for para in db.scalars(
+            sa.select(PaperTexts).where(PaperTexts.id.in_(para_ids)))
+    }
+
+    # The labels are computed one by one by the pipeline on failure.
+    ids = list(paragraphs.keys())
+    try:
+        texts = [paragraphs[i].text for i in ids]
+        tags = dict(zip(ids, bert.get_tags_batch(texts, batch_size)))
+    except Exception as err:
+        log.error("Failed to tag {} paragraphs in batch: {}", len(ids), err)
+        tags = {}
+
+    return paragraphs, tags
 
 
 def run(args: ArgumentParser):
@@ -24,7 +54,7 @@ def run(args: ArgumentParser):
     from backend.postgres import checkpoint, persist
     from backend.record_extraction import bert_model, utils
     from backend.record_extraction.pipeline import NERPipeline
-    from backend.postgres.orm import FilteredParagraphs, PaperTexts
+    from backend.postgres.orm import FilteredParagraphs
 
     db = postgres.connect()
 
@@ -90,7 +120,11 @@ def run(args: ArgumentParser):
     # Load Materials bert to GPU
     bert = bert_model.MaterialsBERT()
     bert.init_local_model(
-        sett.NERPipeline.model, sett.NERPipeline.pytorch_device)
+        sett.NERPipeline.model, sett.NERPipeline.pytorch_device,
+        sett.NERPipeline.backend, sett.NERPipeline.onnx_quantize,
+        sett.NERPipeline.onnx_dir)
+    if sett.NERPipeline.use_cache:
+        bert.init_cache(db)
     
     # Initialize the pipeline.
     pipeline = NERPipeline(db, method, bert, norm_dataset, prop_metadata)
@@ -100,8 +134,11 @@ def run(args: ArgumentParser):
     log.info("Run info = {}", runinfo)
 
     n = 0
+    paragraphs = {}
+    tags = {}
+
     # Process each paragraph.
-    for row in tqdm(records):
+    for i, row in enumerate(tqdm(records)):
         n += 1
         if row.filter_id < last:
             continue
@@ -109,14 +146,22 @@ def run(args: ArgumentParser):
         if sett.Run.debugCount > 0 and n > sett.Run.debugCount:
             break
 
-        # Fetch the paragraph.
-        paragraph = PaperTexts().get_one(db, {'id': row.para_id})
+        # Fetch and tag the paragraphs of the next window together.
+        if row.para_id not in paragraphs:
+            para_ids = [r.para_id for r in records[i : i + _window]]
+            paragraphs, tags = _tag_paragraphs(
+                db, bert, para_ids, args.batch_size)
+
+        paragraph = paragraphs.get(row.para_id)
+        if paragraph is None:
+            log.error("Paragraph {} not found.", row.para_id)
+            continue
 
         if sett.Run.debugCount > 0:
             print(paragraph.text)
 
         try:
-            pipeline.run(paragraph)
+            pipeline.run(paragraph, tags.get(row.para_id))
         except Exception as err:
             log.error("Failed to process paragraph {}: {}", row.para_id, err)
             if sett.Run.debugCount > 0: raise err
@@ -1,15 +1,30 @@
 import os
+import time
+import queue
+import array
 import pylogg
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from argparse import ArgumentParser, _SubParsersAction
 
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
 from backend import postgres, sett
 from backend.postgres.orm import PaperCorpus
+from backend.utils import shards
 
 ScriptName = 'parse-corpus'
 
 log = pylogg.New(ScriptName)
 
+# Number of new files to register per insert statement.
+_batch_size = 5000
+
+# Minimum number of files directly under the directory crawled per thread.
+_min_chunk = 1000
+
 
 def add_args(subparsers: _SubParsersAction):
     parser: ArgumentParser = subparsers.add_parser(
@@ -18,49 +33,155 @@ def add_args(subparsers: _SubParsersAction):
     parser.add_argument(
         'directory',
         help="Path to directory in the corpus.")
+    parser.add_argument(
+        '-w', '--workers', default=8, type=int,
+        help="Number of threads to crawl the subdirectories. Default: 8")
 
 
-def _add_to_postgres(db, abspath : str, rootdir : str = ''):
-    """ Add a paragraph text to postgres if it already does not
-        exist in the database.
+def _corpus_row(abspath : str, relpath : str, filesize : int,
+                filemtime : datetime, directory : str = None) -> dict:
+    """ Return the paper_corpus row of a new file. """
+    filename = os.path.basename(abspath)
+    if directory is None:
+        directory = os.path.basename(os.path.dirname(abspath))
+    return {
+        'doi': filename2doi(filename),
+        'relpath': relpath,
+        'directory': directory,
+        'doctype': os.path.splitext(abspath)[1][1:],
+        'filename': filename,
+        'filebytes': filesize,
+        'filemtime': filemtime,
+        'date_added': datetime.now(),
+    }
+
+
+def _scan_tree(top : str, rootdir : str, registered : set[str],
+               out : queue.Queue, stop : threading.Event,
+               entries : list[os.DirEntry] = None):
+    """ Walk a directory tree with os.scandir. The rows of the files not
+        registered yet are put in the queue in batches, along with the
+        number of files seen and the stat latencies.
+        If entries is given, only these file entries of the top directory
+        are scanned, without listing it.
+        The members of the tar or zip shards are registered as files,
+        with a relpath of the form `<shard relpath>/<member name>`.
+        None is put in the queue when done.
     """
-    relpath = abspath.removeprefix(rootdir).removeprefix('/')
-    paperfile = PaperCorpus().get_one(db, {'relpath': relpath})
+    try:
+        _walk_tree(top, rootdir, registered, out, stop, entries)
+    except Exception as err:
+        log.error("Failed to crawl {}: {}", top, err)
+    finally:
+        out.put(None)
 
-    if paperfile is not None:
-        log.trace(f"Paper file in PostGres: {relpath}. Skipped.")
-        return False
 
-    # Add the file to database.
-    filename = os.path.basename(abspath)
-    doistr = filename2doi(filename)
-    doctype = os.path.splitext(abspath)[1][1:]
-    directory = os.path.basename(os.path.dirname(abspath))
+def _list_tree(top : str, stop : threading.Event):
+    """ Yield the (path, entries) of the directories of a tree. """
+    stack = [top]
+    while stack and not stop.is_set():
+        path = stack.pop()
+        try:
+            entries = list(os.scandir(path))
+        except OSError as err:
+            log.warn("Failed to read directory: {} ({})", path, err)
+            continue
 
-    try:
-        stats = os.stat(abspath)
-        filesize = stats.st_size
-        filemtime = datetime.fromtimestamp(stats.st_mtime)
-    except:
-        log.warn("Failed to read file stats: {}", abspath)
-        filesize = -1
-        filemtime = None
+        stack += [entry.path for entry in entries
+                  if entry.is_dir(follow_symlinks=False)]
+        yield path, entries
+
+
+def _walk_tree(top : str, rootdir : str, registered : set[str],
+               out : queue.Queue, stop : threading.Event,
+               entries : list[os.DirEntry] = None):
+    seen = 0
+    rows = []
+    latencies = array.array('d')
+
+    if entries is None:
+        listings = _list_tree(top, stop)
+    else:
+        listings = [(top, entries)]
 
-    paperfile = PaperCorpus()
-    paperfile.doi = doistr
-    paperfile.relpath = relpath
-    paperfile.directory = directory
-    paperfile.doctype = doctype
-    paperfile.filename = filename
-    paperfile.filebytes = filesize
-    paperfile.filemtime = filemtime
+    for path, entries in listings:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                continue
 
-    paperfile.insert(db)
+            relpath = entry.path.removeprefix(rootdir).removeprefix('/')
+            if shards.is_shard(entry.name):
+                # The member index is read instead of the file stats.
+                t0 = time.perf_counter()
+                try:
+                    with shards.Shard(entry.path) as shard:
+                        members = shard.members()
+                except Exception as err:
+                    log.warn("Failed to read shard: {} ({})", entry.path, err)
+                    continue
+                latencies.append(time.perf_counter() - t0)
 
-    log.trace(f"Added to PostGres: {relpath}")
+                directory = os.path.basename(path)
+                for member in members:
+                    seen += 1
+                    member_relpath = shards.member_path(relpath, member.name)
+                    if member_relpath in registered:
+                        continue
+                    rows.append(_corpus_row(
+                        member.name, member_relpath, member.size,
+                        datetime.fromtimestamp(member.mtime), directory))
+                if len(rows) >= _batch_size:
+                    out.put((seen, rows, latencies))
+                    seen, rows, latencies = 0, [], array.array('d')
+                continue
 
-    return True
+            seen += 1
+            if relpath in registered:
+                continue
 
+            t0 = time.perf_counter()
+            try:
+                stats = entry.stat()
+                filesize = stats.st_size
+                filemtime = datetime.fromtimestamp(stats.st_mtime)
+            except OSError:
+                log.warn("Failed to read file stats: {}", entry.path)
+                filesize = -1
+                filemtime = None
+            latencies.append(time.perf_counter() - t0)
+
+            rows.append(_corpus_row(entry.path, relpath, filesize, filemtime))
+            if len(rows) >= _batch_size:
+                out.put((seen, rows, latencies))
+                seen, rows, latencies = 0, [], array.array('d')
+
+    out.put((seen, rows, latencies))
+
+
+def _add_to_postgres(db, rows : list[dict]) -> int:
+    """ Register the new files to postgres in bulk and commit.
+        Returns the number of added files.
+    """
+    if not rows:
+        return 0
+
+    # A single statement, so that the rowcount skips the conflicts.
+    stmt = insert(PaperCorpus).values(rows).on_conflict_do_nothing(
+        index_elements=['relpath'])
+    added = db.execute(stmt).rowcount
+    db.commit()
+
+    log.trace("Added {} of {} files to PostGres.", added, len(rows))
+    return added
+
+
+def _percentiles(values : array.array, percents : list[int]) -> list[float]:
+    """ Return the percentiles of the values, nearest rank method. """
+    if len(values) == 0:
+        return [0.0 for _ in percents]
+    values = sorted(values)
+    return [values[min(len(values) - 1, int(len(values) * p / 100))]
+            for p in percents]
 
 
 def filename2doi(doi: str):
@@ -77,33 +198,81 @@ def run(args: ArgumentParser):
     if not os.path.isdir(args.directory):
         raise ValueError("No such directory", args.directory)
 
+    db = postgres.connect()
+    corpus_root = os.path.dirname(args.directory)
+    dirname = os.path.basename(args.directory)
+
+    # Load the already registered files once.
+    t2 = log.info("Loading the registered files of {}", dirname)
+    registered = set(db.execute(
+        sa.text("SELECT relpath FROM paper_corpus WHERE relpath LIKE :prefix"),
+        {'prefix': dirname + '/%'}).scalars())
+    t2.done("Found {} registered files.", len(registered))
+
+    # Crawl each subdirectory in a separate thread. The files directly
+    # under the directory are split in chunks crawled by the threads too,
+    # for the publisher directories without subdirectories.
+    workers = max(args.workers, 1)
+    entries = list(os.scandir(args.directory))
+    subdirs = [entry.path for entry in entries
+               if entry.is_dir(follow_symlinks=False)]
+    files = [entry for entry in entries
+             if not entry.is_dir(follow_symlinks=False)]
+
+    chunk = max(_min_chunk, -(-len(files) // workers))
+    trees = [(args.directory, files[i:i + chunk])
+             for i in range(0, len(files), chunk)]
+    trees += [(path, None) for path in subdirs]
+
+    out = queue.Queue(maxsize=2 * workers)
+    stop = threading.Event()
+
     n = 0
     pg = 0
+    latencies = array.array('d')
+    t2 = log.info("Crawling {} subdirectories and {} files of {} using {} "
+                  "threads.", len(subdirs), len(files), args.directory,
+                  workers)
+    t0 = time.perf_counter()
 
-    db = postgres.connect()
+    with ThreadPoolExecutor(workers) as pool:
+        for top, top_entries in trees:
+            pool.submit(_scan_tree, top, corpus_root, registered, out, stop,
+                        top_entries)
 
-    t2 = log.info("Recursively crawling: {}", args.directory)
-    corpus_root = os.path.dirname(args.directory)
+        running = len(trees)
+        while running:
+            item = out.get()
+            if item is None:
+                running -= 1
+                continue
 
-    for root, subdirs, files in os.walk(args.directory):
-        log.trace("Entering: %s" %root)
+            seen, rows, lats = item
+            n += seen
+            latencies.extend(lats)
 
-        for filename in files:
-            abs_path = os.path.join(root, filename)
-            if _add_to_postgres(db, abs_path, corpus_root):
-                pg += 1
+            # Not more than debugCount new files.
+            # Use -1 for no limit.
+            if sett.Run.debugCount > 0:
+                rows = rows[:max(sett.Run.debugCount - pg, 0)]
 
-            n += 1
+            pg += _add_to_postgres(db, rows)
 
-            if not (n % 1000):
-                log.info("Processed {} files. Added {} files to DB.", n, pg)
-                PaperCorpus.commit(db)
+            if sett.Run.debugCount > 0 and pg >= sett.Run.debugCount \
+                    and not stop.is_set():
+                log.note("Processed maximum {} files.", pg)
+                stop.set()
 
-            # Not more than debugCount per directory
-            # Use -1 for no limit.
-            if sett.Run.debugCount > 0 and n >= sett.Run.debugCount:
-                log.note("Processed maximum {} files.", n)
-                break
+            if seen:
+                elapsed = max(time.perf_counter() - t0, 1e-9)
+                log.info("Processed {} files ({:.1f} files/s). "
+                         "Added {} files to DB.", n, n / elapsed, pg)
 
-    PaperCorpus.commit(db)
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    p50, p90, p99 = _percentiles(latencies, [50, 90, 99])
+    log.info("Crawled {} files in {:.1f} s ({:.1f} files/s).",
+             n, elapsed, n / elapsed)
+    log.info("Stat latency: p50 {:.3f} ms, p90 {:.3f} ms, p99 {:.3f} ms "
+             "({} files or shards).",
+             1000 * p50, 1000 * p90, 1000 * p99, len(latencies))
     t2.done("Added {} files to Postgres.", pg)
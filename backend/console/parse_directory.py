@@ -1,19 +1,32 @@
 import os
+import time
 import pylogg
+import hashlib
+import itertools
+import multiprocessing
+import sqlalchemy as sa
 from tqdm import tqdm
 from argparse import ArgumentParser, _SubParsersAction
 
 from backend import postgres, sett
-from backend.postgres.orm import Papers, PaperTexts
+from backend.postgres import persist
+from backend.postgres.orm import (
+    Papers, PaperTexts, ParsedFiles, FilteredParagraphs, ExtractedCrossrefs,
+    ExtractedMaterials, APIRequests, CuratedData
+)
 
-from backend.parser import PaperParser
+from backend.parser import PaperParser, ParserVersion
 from backend.parser.document import DocumentParser
 from backend.parser.paragraph import ParagraphParser
+from backend.utils import shards
 
 ScriptName = 'parse'
 
 log = pylogg.New(ScriptName)
 
+# Number of paragraphs to add to postgres together in parallel mode.
+_batch_paragraphs = 2000
+
 
 def add_args(subparsers: _SubParsersAction):
     parser: ArgumentParser = subparsers.add_parser(
@@ -27,44 +40,405 @@ def add_args(subparsers: _SubParsersAction):
         default=None,
         help="Parse a single file, useful for debugging."
     )
+    parser.add_argument(
+        '-w', '--workers', default=1, type=int,
+        help="Number of worker processes to parse the files. Default: 1"
+    )
+    parser.add_argument(
+        '--stream', default=False, action='store_true',
+        help="Use the streaming engine to parse the XML files."
+    )
+    parser.add_argument(
+        '--incremental', default=False, action='store_true',
+        help="Parse only the new or changed files, or the files parsed by "
+             "an older parser version, and replace their paragraphs."
+    )
+
+
+def _paragraph_rows(pid: int, doi: str, directory: str, doctype: str,
+                    texts: list[str]) -> list[dict]:
+    """ Return the paper_texts rows of the paragraph texts of a paper. """
+    return [
+        {'pid': pid, 'doi': doi, 'directory': directory, 'doctype': doctype,
+         'text': text} for text in texts
+    ]
+
+
+def _add_paragraphs_batch(db, directory: str,
+                          papers: list[tuple[str, str, list[str]]]) -> int:
+    """ Add the paragraph texts of a batch of papers to postgres in bulk
+        and commit. Texts already added for a paper are skipped.
+        papers: List of (doi, doctype, paragraph texts).
+        Returns the number of newly added paragraphs.
+    """
+    # get the foreign keys
+    dois = [doi for doi, _, _ in papers]
+    pids = dict(db.execute(
+        sa.select(Papers.doi, Papers.id).where(Papers.doi.in_(dois))).all())
+
+    rows = []
+    for doi, doctype, texts in papers:
+        if doi not in pids:
+            log.warn(f"Paper {doi} not found in postgres.")
+            continue
+        rows += _paragraph_rows(pids[doi], doi, directory, doctype, texts)
+
+    try:
+        pg = persist.add_paper_texts(db, rows)
+    except Exception:
+        db.rollback()
+        raise
+
+    PaperTexts.commit(db)
+    return pg
+
+
+def _add_paragraphs(db, doi: str, directory: str, doctype: str,
+                    texts: list[str]) -> int:
+    """ Add the paragraph texts of a paper to postgres and commit.
+        Returns the number of newly added paragraphs.
+    """
+    return _add_paragraphs_batch(db, directory, [(doi, doctype, texts)])
+
+
+def _remove_paragraphs(db, para_ids: list[int]) -> int:
+    """ Delete the paragraphs not found anymore in a reparsed paper, along
+        with their filter and cross reference rows, without committing.
+        The paragraphs with extracted materials, api requests or curated
+        data are kept, as these can not be recomputed from the new texts.
+        Returns the number of deleted paragraphs.
+    """
+    kept = set()
+    for column in (ExtractedMaterials.para_id, APIRequests.para_id,
+                   CuratedData.para_id):
+        kept.update(db.execute(
+            sa.select(column).where(column.in_(para_ids)).distinct()
+        ).scalars())
+
+    if kept:
+        log.warn("Kept {} old paragraphs with extracted or curated data.",
+                 len(kept))
+
+    removed = [para_id for para_id in para_ids if para_id not in kept]
+    if not removed:
+        return 0
+
+    db.execute(sa.delete(FilteredParagraphs).where(
+        FilteredParagraphs.para_id.in_(removed)))
+    db.execute(sa.delete(ExtractedCrossrefs).where(
+        ExtractedCrossrefs.para_id.in_(removed)))
+    db.execute(sa.delete(PaperTexts).where(PaperTexts.id.in_(removed)))
+    return len(removed)
+
+
+def _replace_paragraphs(db, doi: str, directory: str, doctype: str,
+                        texts: list[str], parsed: ParsedFiles) -> int:
+    """ Replace the paragraph texts of a reparsed paper and record the
+        parse, in a single transaction. Unchanged paragraphs keep their
+        rows, so the results linked to them remain valid. The removed
+        paragraphs are deleted with their filter rows, see
+        `_remove_paragraphs`.
+        Returns the number of newly added paragraphs.
+    """
+    pg = 0
 
+    # get the foreign key
+    paper = Papers().get_one(db, {'doi': doi})
+    if paper is None:
+        log.warn(f"Paper {doi} not found in postgres.")
+        return pg
 
-def _add_to_postgres(db, paper: Papers, directory: str, doctype: str,
-                     para: ParagraphParser):
-    """ Add a paragraph text to postgres if it already does not
-        exist in the database.
+    try:
+        existing = db.execute(sa.text("""
+            SELECT id, text FROM paper_texts
+            WHERE doi = :doi AND directory = :dirname
+            AND "section" IS DISTINCT FROM 'abstract';
+        """), {'doi': doi, 'dirname': directory}).fetchall()
+
+        # Remove the paragraphs not found anymore.
+        keep = set(texts)
+        stale = [row.id for row in existing if row.text not in keep]
+        if stale:
+            removed = _remove_paragraphs(db, stale)
+            log.trace("Removed {} old paragraphs of {}", removed, doi)
+
+        existing = set(row.text for row in existing)
+        texts_new = [text for text in texts if text not in existing]
+        pg = persist.add_paper_texts(db, _paragraph_rows(
+            paper.id, doi, directory, doctype, texts_new))
+
+        record = ParsedFiles().get_one(db, {'relpath': parsed.relpath})
+        if record is None:
+            parsed.paragraphs = len(texts)
+            parsed.insert(db)
+        else:
+            record.filebytes = parsed.filebytes
+            record.filemtime = parsed.filemtime
+            record.fingerprint = parsed.fingerprint
+            record.parser_version = parsed.parser_version
+            record.paragraphs = len(texts)
+    except Exception:
+        db.rollback()
+        raise
+
+    ParsedFiles.commit(db)
+    return pg
+
+
+def _fingerprint(filepath: str, contents: bytes = None) -> str:
+    """ Return a hash of the file contents. """
+    digest = hashlib.blake2b(digest_size=16)
+    if contents is not None:
+        digest.update(contents)
+        return digest.hexdigest()
+
+    with open(filepath, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _unchanged_shards(directory: str) -> set[str]:
+    """ Return the paths of the shards of a directory with the same size
+        and mtime as in the last complete incremental parse, by the current
+        parser version. Their papers do not need to be checked again.
     """
+    dirname = os.path.basename(directory)
+    previous = {
+        row.relpath: row for row in postgres.raw_sql("""
+            SELECT relpath, filebytes, filemtime, parser_version
+            FROM parsed_files WHERE directory = :dirname AND doi IS NULL;
+        """, {'dirname': dirname})
+    }
+
+    unchanged = set()
+    for shardpath in shards.list_shards(directory):
+        prev = previous.get(os.path.join(dirname, os.path.basename(shardpath)))
+        if prev is None or prev.parser_version < ParserVersion:
+            continue
+        stats = os.stat(shardpath)
+        if prev.filebytes == stats.st_size and prev.filemtime == stats.st_mtime:
+            unchanged.add(shardpath)
+    return unchanged
 
-    paragraph = PaperTexts().get_one(db, {'doi': paper.doi, 'text': para.text})
-    if paragraph is not None:
-        log.trace(f"Paragraph in PostGres: {para.text}. Skipped.")
-        return False
 
-    paragraph = PaperTexts()
-    paragraph.pid = paper.id
-    paragraph.directory = directory
-    paragraph.doi = paper.doi
-    paragraph.doctype = doctype
-    paragraph.section = None
-    paragraph.tag = None
-    paragraph.text = para.text
-    paragraph.insert(db)
+def _record_shards(db, directory: str, index: shards.ShardIndex):
+    """ Record the size and mtime of the shards of a directory after a
+        complete incremental parse. The rows of the shards have no DOI
+        and no fingerprint.
+    """
+    dirname = os.path.basename(directory)
+    for shardpath in index.shards:
+        stats = os.stat(shardpath)
+        relpath = os.path.join(dirname, os.path.basename(shardpath))
+        record = ParsedFiles().get_one(db, {'relpath': relpath})
+        if record is None:
+            record = ParsedFiles(doi=None, relpath=relpath, directory=dirname,
+                                 fingerprint=None, paragraphs=0)
+            db.add(record)
+        record.filebytes = stats.st_size
+        record.filemtime = stats.st_mtime
+        record.parser_version = ParserVersion
+    ParsedFiles.commit(db)
+    log.info("Recorded {} shards of {}.", len(index.shards), dirname)
+
+
+def _find_in_shards(directory: str, filename: str, index: shards.ShardIndex,
+                    deferred: bool = True) -> tuple | None:
+    """ Return the shard path and the member info of a paper stored in a
+        shard, or None if it is a loose file or not found. The loose files
+        are checked first, so that the shards are listed only if needed.
+    """
+    if not index.shards:
+        return None
+    if os.path.isfile(os.path.join(directory, filename)):
+        return None
+    return index.get(filename, deferred)
+
+
+def _select_changed(directory: str, records: list,
+                    index: shards.ShardIndex) -> tuple[list, dict]:
+    """ Select the files that are new, changed, or were parsed by an older
+        parser version. The file size and mtime are checked first, the
+        contents are hashed only if they differ. The member infos of the
+        papers stored in shards are given by the shard index, and the
+        papers with a current parse are assumed unchanged if they are not
+        found outside of the deferred, unchanged shards.
+
+        Returns the selected records, and the ParsedFiles payloads of the
+        selected files keyed by relpath.
+    """
+    dirname = os.path.basename(directory)
+
+    previous = {
+        row.relpath: row for row in postgres.raw_sql("""
+            SELECT relpath, filebytes, filemtime, fingerprint, parser_version
+            FROM parsed_files WHERE directory = :dirname;
+        """, {'dirname': dirname})
+    }
+
+    selected = []
+    payloads = {}
+    touched = 0
+
+    # shard path -> {file name: (row, relpath, size, mtime, current, prev)}
+    candidates = {}
+
+    def check(row, relpath, filesize, filemtime, current, prev, fingerprint):
+        nonlocal touched
+        if current and prev.fingerprint == fingerprint:
+            # Same contents, only the stats changed.
+            touched += 1
+            postgres.raw_sql("""
+                UPDATE parsed_files SET filebytes = :size, filemtime = :mtime
+                WHERE relpath = :relpath;
+            """, {'size': filesize, 'mtime': filemtime,
+                  'relpath': relpath}, commit=True)
+            return
+
+        parsed = ParsedFiles()
+        parsed.doi = row.doi
+        parsed.relpath = relpath
+        parsed.directory = dirname
+        parsed.filebytes = filesize
+        parsed.filemtime = filemtime
+        parsed.fingerprint = fingerprint
+        parsed.parser_version = ParserVersion
+        payloads[relpath] = parsed
+        selected.append(row)
+
+    for row in tqdm(records):
+        filename = doi2filename(row.doi, row.doctype)
+        abs_path = os.path.join(directory, filename)
+        relpath = os.path.join(dirname, filename)
+
+        prev = previous.get(relpath)
+        current = prev is not None and prev.parser_version >= ParserVersion
+
+        found = _find_in_shards(directory, filename, index,
+                                deferred=not current)
+        if found is not None:
+            shardpath, member = found
+            filesize, filemtime = member.size, member.mtime
+        else:
+            try:
+                stats = os.stat(abs_path)
+            except OSError:
+                if current and index.deferred:
+                    # Stored in a shard unchanged since the last parse.
+                    continue
+                log.error("File not found: {}", abs_path)
+                continue
+            filesize, filemtime = stats.st_size, stats.st_mtime
 
-    log.trace(f"Added to PostGres: {para.text}")
+        if current and prev.filebytes == filesize \
+                and prev.filemtime == filemtime:
+            continue
 
-    return True
+        if found is not None:
+            candidates.setdefault(shardpath, {})[filename] = \
+                (row, relpath, filesize, filemtime, current, prev)
+        else:
+            check(row, relpath, filesize, filemtime, current, prev,
+                  _fingerprint(abs_path))
+
+    # Hash the changed members of each shard in one sequential pass.
+    for shardpath, members in candidates.items():
+        with shards.Shard(shardpath) as shard:
+            for member, contents in shard.items(set(members)):
+                info = members.pop(os.path.basename(member.name), None)
+                if info is not None:
+                    check(*info, _fingerprint(None, contents))
+
+    log.info("Checked {} files, {} unchanged, {} touched, {} to parse.",
+             len(records), len(records) - len(selected) - touched, touched,
+             len(selected))
+    return selected, payloads
+
+
+def _store_paragraphs(db, doi: str, directory: str, doctype: str,
+                      texts: list[str], parsed: ParsedFiles = None) -> int:
+    """ Add the paragraph texts of a paper, or replace them if the
+        incremental parse payload is given.
+        Returns the number of newly added paragraphs.
+    """
+    if parsed is None:
+        return _add_paragraphs(db, doi, directory, doctype, texts)
+    return _replace_paragraphs(db, doi, directory, doctype, texts, parsed)
 
 
-def _parse_file(db, filepath, root="") -> DocumentParser | None:
+def _parse_worker(task: tuple[str, str, bool]) -> tuple:
+    """ Parse a single file in a worker process.
+        Only plain texts are returned, as the lxml elements can not be
+        sent back to the writer process.
+
+        Returns (filepath, doctype, paragraph texts, error message).
+    """
+    directory, filepath, streaming = task
+
+    try:
+        doc = PaperParser(directory, filepath, streaming)
+        if doc is None:
+            return filepath, None, [], "Parser not found"
+        doc.parse(parse_tables=False)
+    except Exception as err:
+        return filepath, None, [], str(err)
+
+    return filepath, doc.doctype, [para.text for para in doc.paragraphs], None
+
+
+def _parse_shard_worker(task: tuple[str, str, set[str], bool]) -> list[tuple]:
+    """ Parse the selected papers of a shard in a worker process, reading
+        the shard sequentially.
+
+        Returns a list of (filepath, doctype, paragraph texts, error message).
+    """
+    directory, shardpath, names, streaming = task
+
+    results = []
+    try:
+        with shards.Shard(shardpath) as shard:
+            for member, contents in shard.items(names):
+                filepath = shards.member_path(shardpath, member.name)
+                try:
+                    doc = PaperParser(directory, filepath, streaming, contents)
+                    if doc is None:
+                        results.append(
+                            (filepath, None, [], "Parser not found"))
+                        continue
+                    doc.parse(parse_tables=False)
+                except Exception as err:
+                    results.append((filepath, None, [], str(err)))
+                    continue
+                results.append((filepath, doc.doctype,
+                                [para.text for para in doc.paragraphs], None))
+    except Exception as err:
+        results.append((shardpath, None, [], str(err)))
+
+    return results
+
+
+def _log_throughput(t0: float, n: int, paras: int, pg: int):
+    """ Log the number of processed files and the parse rates. """
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    log.info("Processed {} papers ({:.2f} files/s, {:.1f} paragraphs/s). "
+             "Added {} paragraphs to Postgres.",
+             n, n / elapsed, paras / elapsed, pg)
+
+
+def _parse_file(db, filepath, root="", streaming=False,
+                parsed: ParsedFiles = None,
+                contents: bytes = None) -> DocumentParser | None:
     t2 = log.trace("Parsing {}", filepath)
     # Keep count of added items for statistics.
     pg = 0
     filename = os.path.basename(filepath)
 
     doi = filename2doi(filename)
-    directory = filepath.split("/")[-2]
+    # The parent of a shard member is the shard, not the directory.
+    directory = os.path.basename(root) if root else filepath.split("/")[-2]
 
-    doc = PaperParser(directory, filepath)
+    doc = PaperParser(directory, filepath, streaming, contents)
     if doc is None:
         log.error(f"Ignore: {filepath} (Parser not found)")
         return None, pg
@@ -84,23 +458,173 @@ def _parse_file(db, filepath, root="") -> DocumentParser | None:
             print("\t", "-" * 50)
             print("\t", para.text, flush=True)
 
-    # get the foreign key
-    paper = Papers().get_one(db, {'doi': doi})
-
-    for para in doc.paragraphs:
-        if paper is None:
-            log.warn(f"Paper {doi} not found in postgres.")
-            break
-        elif _add_to_postgres(db, paper, directory, doc.doctype, para):
-            pg += 1
-
-    PaperTexts.commit(db)
+    pg = _store_paragraphs(db, doi, directory, doc.doctype,
+                           [para.text for para in doc.paragraphs], parsed)
 
     t2.done("Parse done ({} paragraphs found). {}",
             len(doc.paragraphs), filepath)
     return doc, pg
 
 
+def _group_by_shard(directory: str, records: list,
+                    index: shards.ShardIndex) -> tuple[list, dict]:
+    """ Split the records into the ones stored as loose files, and the
+        file names of the ones stored in shards, keyed by shard path.
+    """
+    loose = []
+    grouped = {}
+    for row in records:
+        filename = doi2filename(row.doi, row.doctype)
+        found = _find_in_shards(directory, filename, index)
+        if found is not None:
+            shardpath, _ = found
+            grouped.setdefault(shardpath, set()).add(filename)
+        else:
+            loose.append(row)
+    return loose, grouped
+
+
+def _iter_documents(directory: str, records: list, index: shards.ShardIndex):
+    """ Yield (file name, file path, contents) of the records to parse.
+        The contents of the loose files are None, they are read by the
+        parser. The papers stored in shards are read one shard at a time,
+        sequentially.
+    """
+    records, grouped = _group_by_shard(directory, records, index)
+
+    for row in records:
+        filename = doi2filename(row.doi, row.doctype)
+        yield filename, os.path.join(directory, filename), None
+
+    for shardpath, names in grouped.items():
+        try:
+            with shards.Shard(shardpath) as shard:
+                for member, contents in shard.items(names):
+                    yield os.path.basename(member.name), \
+                        shards.member_path(shardpath, member.name), contents
+        except Exception as err:
+            log.error("Failed to read shard: {} ({})", shardpath, err)
+
+
+def _parse_parallel(db, directory: str, records: list, workers: int,
+                    streaming: bool = False, payloads: dict = None,
+                    index: shards.ShardIndex = None) -> int:
+    """ Parse the files using a pool of worker processes. The current
+        process is the single writer that adds the parsed paragraphs
+        to postgres. Failures are isolated and reported per file.
+        Paragraphs are replaced if the incremental parse payloads are given.
+        Each shard in the shard index is parsed by a single worker.
+        Returns the number of failed files.
+    """
+    dirname = os.path.basename(directory)
+
+    # Not more than debugCount per run
+    # Use -1 for no limit.
+    if sett.Run.debugCount > 0:
+        records = records[:sett.Run.debugCount]
+
+    if index is None:
+        index = shards.ShardIndex(directory)
+    records, grouped = _group_by_shard(directory, records, index)
+
+    tasks = []
+    for row in records:
+        filename = doi2filename(row.doi, row.doctype)
+        abs_path = os.path.join(directory, filename)
+        if not os.path.isfile(abs_path):
+            log.error("File not found: {}", abs_path)
+            continue
+        tasks.append((dirname, abs_path, streaming))
+
+    shard_tasks = [(dirname, shardpath, names, streaming)
+                   for shardpath, names in grouped.items()]
+    total = len(tasks) + sum(len(names) for names in grouped.values())
+
+    n = 0
+    paras = 0
+    failed = 0
+    total_pg = 0
+
+    # Paragraphs of several papers are added together in bulk.
+    batch = []
+    batch_texts = 0
+
+    def flush() -> tuple[int, int]:
+        """ Add the batched papers, returns (added paragraphs, failed). """
+        nonlocal batch, batch_texts
+        papers, batch, batch_texts = batch, [], 0
+        if not papers:
+            return 0, 0
+        try:
+            return _add_paragraphs_batch(db, dirname, papers), 0
+        except Exception as err:
+            log.warn("Failed to add {} papers to Postgres, retrying one "
+                     "paper at a time ({})", len(papers), err)
+
+        # Skip only the papers that fail on their own.
+        added = lost = 0
+        for paper in papers:
+            try:
+                added += _add_paragraphs_batch(db, dirname, [paper])
+            except Exception as err:
+                log.error("Failed to add paragraphs of {} to Postgres ({})",
+                          paper[0], err)
+                lost += 1
+        return added, lost
+
+    t2 = log.info("Parsing {} files using {} workers.", total, workers)
+    t0 = time.perf_counter()
+
+    # Recycle the workers periodically to release memory held by lxml.
+    with multiprocessing.Pool(workers, maxtasksperchild=1000) as pool:
+        results = itertools.chain(
+            pool.imap_unordered(_parse_worker, tasks, chunksize=4),
+            itertools.chain.from_iterable(
+                pool.imap_unordered(_parse_shard_worker, shard_tasks)))
+
+        for filepath, doctype, texts, error in tqdm(results, total=total):
+            n += 1
+
+            if error is not None:
+                failed += 1
+                log.error("Failed to parse: {} ({})", filepath, error)
+                continue
+
+            filename = os.path.basename(filepath)
+            doi = filename2doi(filename)
+            paras += len(texts)
+
+            if payloads is None:
+                batch.append((doi, doctype, texts))
+                batch_texts += len(texts)
+                if batch_texts >= _batch_paragraphs:
+                    added, lost = flush()
+                    total_pg += added
+                    failed += lost
+            else:
+                parsed = payloads[os.path.join(dirname, filename)]
+                try:
+                    total_pg += _replace_paragraphs(db, doi, dirname, doctype,
+                                                    texts, parsed)
+                except Exception as err:
+                    failed += 1
+                    log.error("Failed to add to Postgres: {} ({})",
+                              filepath, err)
+                    continue
+
+            if (n-1) % 50 == 0:
+                _log_throughput(t0, n, paras, total_pg)
+
+    added, lost = flush()
+    total_pg += added
+    failed += lost
+
+    _log_throughput(t0, n, paras, total_pg)
+    t2.done("Parsed {} files, {} failed. Added {} paragraphs to Postgres.",
+            n - failed, failed, total_pg)
+    return failed
+
+
 def filename2doi(doi: str):
     doi = doi.replace("@", "/").rstrip('.html')
     doi = doi.rstrip(".xml")
@@ -125,7 +649,7 @@ def run(args: ArgumentParser):
     if args.file:
         sett.Run.debugCount = 1
         args.file = os.path.join(args.directory, args.file)
-        return _parse_file(db, args.file)
+        return _parse_file(db, args.file, args.directory, args.stream)
 
     # Get the list of DOIs that are polymer papers and not found in the
     # paper_texts table, for a specific publisher directory.
@@ -143,40 +667,83 @@ def run(args: ArgumentParser):
     """
 
     dirname = os.path.basename(args.directory)
+    payloads = None
+
+    # Papers stored in the tar or zip shards of the directory, the shards
+    # are listed only as needed. In the incremental mode, the shards not
+    # changed since the last parse are listed last.
+    defer = _unchanged_shards(args.directory) if args.incremental else None
+    index = shards.ShardIndex(args.directory, defer)
+    if index.shards:
+        log.info("Found {} shards, {} unchanged.", len(index.shards),
+                 len(defer or ()))
+
+    if args.incremental:
+        # All the polymer papers are checked in the incremental mode.
+        query = """
+            SELECT DISTINCT p.doi, p.doctype FROM filtered_papers fp
+            JOIN papers p ON p.doi = fp.doi
+            WHERE p.directory = :dirname;
+        """
+
+        t2 = log.info("Querying list of DOIs for {}", dirname)
+        records = postgres.raw_sql(query, {'dirname': dirname})
+        t2.note("Found {} DOIs.", len(records))
+
+        records, payloads = _select_changed(args.directory, records, index)
+    else:
+        t2 = log.info("Querying list of non-parsed DOIs for {}", dirname)
+        records = postgres.raw_sql(query, {'dirname': dirname})
+        t2.note("Found {} DOIs not parsed.", len(records))
 
-    t2 = log.info("Querying list of non-parsed DOIs for {}", dirname)
-    records = postgres.raw_sql(query, {'dirname': dirname})
-    t2.note("Found {} DOIs not parsed.", len(records))
+    # The shards are recorded only if all their papers are parsed.
+    complete = payloads is not None and sett.Run.debugCount <= 0
 
     if len(records) == 0:
+        if complete and index.shards:
+            _record_shards(db, args.directory, index)
+        return
+
+    if args.workers > 1:
+        failed = _parse_parallel(db, args.directory, records, args.workers,
+                                 args.stream, payloads, index)
+        if complete and not failed and index.shards:
+            _record_shards(db, args.directory, index)
         return
 
     n = 0
     pg = 0
+    paras = 0
+    failed = 0
     total_pg = 0
+    t0 = time.perf_counter()
 
-    for row in tqdm(records):
+    documents = _iter_documents(args.directory, records, index)
+    for filename, abs_path, contents in tqdm(documents, total=len(records)):
         n += 1
-        doi = row.doi
-        doctype = row.doctype
-        filename = doi2filename(doi, doctype)
-        abs_path = os.path.join(args.directory, filename)
-        if not os.path.isfile(abs_path):
+        if contents is None and not os.path.isfile(abs_path):
             log.error("File not found: {}", abs_path)
 
+        parsed = None
+        if payloads is not None:
+            parsed = payloads[os.path.join(dirname, filename)]
+
         try:
-            doc, pg = _parse_file(db, abs_path, args.directory)
+            doc, pg = _parse_file(db, abs_path, args.directory, args.stream,
+                                  parsed, contents)
             if doc is None:
+                failed += 1
                 continue
         except Exception as err:
+            failed += 1
             log.error(f"Parse error: {abs_path} ({err})")
             continue
 
         total_pg += pg
+        paras += len(doc.paragraphs)
 
         if (n-1) % 50 == 0:
-            log.info("Processed {} papers. Added {} paragraphs to Postgres.",
-                     n, total_pg)
+            _log_throughput(t0, n, paras, total_pg)
 
         # Not more than debugCount per run
         # Use -1 for no limit.
@@ -185,3 +752,7 @@ def run(args: ArgumentParser):
             log.info("Added {} paragraphs to Postgres, ", total_pg)
             break
 
+    # The papers of a shard that could not be read are not counted in n.
+    if complete and not failed and n == len(records) and index.shards:
+        _record_shards(db, args.directory, index)
+
@@ -0,0 +1,293 @@
+import os
+import time
+import pylogg
+import itertools
+import multiprocessing
+import sqlalchemy as sa
+from tqdm import tqdm
+from datetime import datetime
+from argparse import ArgumentParser, _SubParsersAction
+
+from backend import postgres, sett
+from backend.postgres.orm import Papers, PaperTables, ParsedTables
+from backend.parser import PaperParser, ParserVersion
+from backend.parser.tabular import TableParser
+from backend.utils import shards
+
+ScriptName = 'parse-tables'
+
+log = pylogg.New(ScriptName)
+
+# Number of tables to add to postgres together.
+_batch_tables = 500
+
+# Number of papers to add to postgres together, with or without tables.
+_batch_papers = 1000
+
+
+def add_args(subparsers: _SubParsersAction):
+    parser: ArgumentParser = subparsers.add_parser(
+        ScriptName,
+        help='Parse the tables of the papers from a directory.')
+    parser.add_argument(
+        'directory',
+        help="Path to directory in the corpus.")
+    parser.add_argument(
+        '-w', '--workers', default=1, type=int,
+        help="Number of worker processes to parse the files. Default: 1"
+    )
+    parser.add_argument(
+        '--stream', default=False, action='store_true',
+        help="Use the streaming engine to parse the XML files."
+    )
+
+
+def _table_row(tabl: TableParser) -> dict:
+    """ Return the paper_tables row of a parsed table, without the pid.
+        Only plain values are used, so that it can be sent to the writer.
+    """
+    return {
+        'caption': tabl.caption,
+        'url': tabl.url,
+        'notes': tabl.notes,
+        'number': tabl.number,
+        'tbl_header': tabl.header,
+        'tbl_index': tabl.index,
+        'body': tabl.table_body,
+        'columns': tabl.to_columns(),
+        'descriptions': tabl.descriptions,
+    }
+
+
+def _parse_tables(directory: str, filepath: str, streaming: bool,
+                  contents: bytes = None) -> tuple:
+    """ Parse the tables of a single file.
+        Returns (filepath, table rows, error message).
+    """
+    try:
+        doc = PaperParser(directory, filepath, streaming, contents)
+        if doc is None:
+            return filepath, [], "Parser not found"
+        doc.parse(parse_tables=True, parse_paragraphs=False)
+    except Exception as err:
+        return filepath, [], str(err)
+
+    return filepath, [_table_row(tabl) for tabl in doc.tables], None
+
+
+def _parse_worker(task: tuple[str, str, bool]) -> tuple:
+    """ Parse the tables of a single file in a worker process. """
+    directory, filepath, streaming = task
+    return _parse_tables(directory, filepath, streaming)
+
+
+def _parse_shard_worker(task: tuple[str, str, set[str], bool]) -> list[tuple]:
+    """ Parse the tables of the selected papers of a shard in a worker
+        process, reading the shard sequentially.
+    """
+    directory, shardpath, names, streaming = task
+
+    results = []
+    try:
+        with shards.Shard(shardpath) as shard:
+            for member, contents in shard.items(names):
+                filepath = shards.member_path(shardpath, member.name)
+                results.append(
+                    _parse_tables(directory, filepath, streaming, contents))
+    except Exception as err:
+        results.append((shardpath, [], str(err)))
+
+    return results
+
+
+def _add_tables_batch(db, papers: list[tuple[str, list[dict]]]) -> int:
+    """ Add the tables of a batch of papers to postgres in bulk and commit.
+        Each paper is also recorded in the parsed_tables table, so that the
+        papers without tables are not parsed again.
+        papers: List of (doi, table rows).
+        Returns the number of added tables.
+    """
+    # get the foreign keys
+    dois = [doi for doi, _ in papers]
+    pids = dict(db.execute(
+        sa.select(Papers.doi, Papers.id).where(Papers.doi.in_(dois))).all())
+
+    rows = []
+    parsed = []
+    now = datetime.now()
+    for doi, tables in papers:
+        if doi not in pids:
+            log.warn(f"Paper {doi} not found in postgres.")
+            continue
+        for row in tables:
+            rows.append(dict(row, pid=pids[doi], date_added=now))
+        parsed.append({
+            'pid': pids[doi], 'tables': len(tables),
+            'parser_version': ParserVersion, 'date_added': now,
+        })
+
+    if not parsed:
+        return 0
+
+    try:
+        if rows:
+            db.execute(sa.insert(PaperTables), rows)
+        db.execute(sa.insert(ParsedTables), parsed)
+    except Exception:
+        db.rollback()
+        raise
+
+    PaperTables.commit(db)
+    return len(rows)
+
+
+def filename2doi(doi: str):
+    doi = doi.replace("@", "/").rstrip('.html')
+    doi = doi.rstrip(".xml")
+    return doi
+
+
+def doi2filename(doi: str, doctype: str):
+    filename = doi.replace("/", "@")
+    filename = filename + "." + doctype
+    return filename
+
+
+def run(args: ArgumentParser):
+    db = postgres.connect()
+
+    if args.directory.endswith("/"):
+        args.directory = args.directory[:-1]
+
+    if not os.path.isdir(args.directory):
+        raise ValueError("No such directory", args.directory)
+
+    # Get the list of DOIs that are polymer papers and whose tables are
+    # not parsed yet, for a specific publisher directory. The papers parsed
+    # before the parsed_tables table was added have only paper_tables rows.
+    query = """
+        SELECT DISTINCT p.doi, p.doctype FROM filtered_papers fp
+        JOIN papers p ON p.doi = fp.doi
+        WHERE p.directory = :dirname
+        AND NOT EXISTS (
+            SELECT 1 FROM parsed_tables pd WHERE pd.pid = p.id
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM paper_tables pt WHERE pt.pid = p.id
+        );
+    """
+
+    dirname = os.path.basename(args.directory)
+
+    t2 = log.info("Querying list of DOIs with non-parsed tables for {}",
+                  dirname)
+    records = postgres.raw_sql(query, {'dirname': dirname})
+    t2.note("Found {} DOIs.", len(records))
+
+    # Not more than debugCount per run
+    # Use -1 for no limit.
+    if sett.Run.debugCount > 0:
+        records = records[:sett.Run.debugCount]
+
+    if len(records) == 0:
+        return
+
+    # Papers stored in the tar or zip shards are parsed one shard per task.
+    # The shards are listed only for the papers not found as loose files.
+    index = shards.ShardIndex(args.directory)
+    tasks = []
+    grouped = {}
+    for row in records:
+        filename = doi2filename(row.doi, row.doctype)
+        abs_path = os.path.join(args.directory, filename)
+        if os.path.isfile(abs_path):
+            tasks.append((dirname, abs_path, args.stream))
+            continue
+
+        found = index.get(filename)
+        if found is None:
+            log.error("File not found: {}", abs_path)
+            continue
+        shardpath, _ = found
+        grouped.setdefault(shardpath, set()).add(filename)
+
+    shard_tasks = [(dirname, shardpath, names, args.stream)
+                   for shardpath, names in grouped.items()]
+    total = len(tasks) + sum(len(names) for names in grouped.values())
+
+    n = 0
+    ntables = 0
+    failed = 0
+    total_pg = 0
+
+    # Tables of several papers are added together in bulk.
+    batch = []
+    batch_tables = 0
+
+    def flush() -> tuple[int, int]:
+        """ Add the batched papers, returns (added tables, failed). """
+        nonlocal batch, batch_tables
+        papers, batch, batch_tables = batch, [], 0
+        if not papers:
+            return 0, 0
+        try:
+            return _add_tables_batch(db, papers), 0
+        except Exception as err:
+            log.warn("Failed to add {} papers to Postgres, retrying one "
+                     "paper at a time ({})", len(papers), err)
+
+        # Skip only the papers that fail on their own.
+        added = lost = 0
+        for doi, tables in papers:
+            try:
+                added += _add_tables_batch(db, [(doi, tables)])
+            except Exception as err:
+                log.error("Failed to add tables of {} to Postgres ({})",
+                          doi, err)
+                lost += 1
+        return added, lost
+
+    workers = max(args.workers, 1)
+    t2 = log.info("Parsing tables of {} files using {} workers.",
+                  total, workers)
+    t0 = time.perf_counter()
+
+    # Recycle the workers periodically to release memory held by lxml.
+    with multiprocessing.Pool(workers, maxtasksperchild=1000) as pool:
+        results = itertools.chain(
+            pool.imap_unordered(_parse_worker, tasks, chunksize=4),
+            itertools.chain.from_iterable(
+                pool.imap_unordered(_parse_shard_worker, shard_tasks)))
+
+        for filepath, tables, error in tqdm(results, total=total):
+            n += 1
+
+            if error is not None:
+                failed += 1
+                log.error("Failed to parse: {} ({})", filepath, error)
+                continue
+
+            doi = filename2doi(os.path.basename(filepath))
+            ntables += len(tables)
+
+            # Papers without tables are recorded as parsed too.
+            batch.append((doi, tables))
+            batch_tables += len(tables)
+
+            if batch_tables >= _batch_tables or len(batch) >= _batch_papers:
+                added, lost = flush()
+                total_pg += added
+                failed += lost
+
+            if (n-1) % 50 == 0:
+                elapsed = max(time.perf_counter() - t0, 1e-9)
+                log.info("Processed {} papers ({:.2f} files/s, {:.1f} "
+                         "tables/s). Added {} tables to Postgres.",
+                         n, n / elapsed, ntables / elapsed, total_pg)
+
+    added, lost = flush()
+    total_pg += added
+    failed += lost
+
+    t2.done("Parsed {} files, {} failed. Added {} tables to Postgres.",
+            n - failed, failed, total_pg)
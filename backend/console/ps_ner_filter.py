@@ -1,9 +1,10 @@
+import time
 import pylogg
 from tqdm import tqdm
 
 import argcomplete
 from argparse import ArgumentParser, _SubParsersAction
-from backend.postgres.orm import FilteredParagraphs, PaperTexts, PropertyMetadata
+from backend.postgres.orm import FilteredParagraphs, PropertyMetadata
 from backend.console.heuristic_filter import FilterPropertyName
 
 from collections import defaultdict
@@ -15,6 +16,9 @@ log = pylogg.New(ScriptName)
 material_entity_types = ['POLYMER', 'POLYMER_FAMILY', 'MONOMER', 'ORGANIC', 'INORGANIC']
 filtration_dict = defaultdict(int)
 
+# Number of model batches of paragraphs to sort by length together.
+_window_batches = 8
+
 class HeuristicFilterName:
 	tg_ner_full = 'property_tg'
 	tm_ner_full = 'property_tm'
@@ -55,29 +59,23 @@ def add_args(subparsers: _SubParsersAction):
 	parser.add_argument(
 			"-r", "--filter", default='', choices=list(HeuristicFilterName.__dict__.keys()), 
 			help= "Name of the ner filter. Should look like ner_*")
+	parser.add_argument(
+			"-a", "--all", default=False, action='store_true',
+			help="Run all the ner filters in one pass, once per distinct paragraph.")
 	argcomplete.autocomplete(parser)
 
 	## add property argument 
 	parser.add_argument(
 			"-l", "--limit", default=1000000, type=int,
 			help="Number of paragraphs to process. Default: 1000000")
+	parser.add_argument(
+			"-b", "--batch-size", default=16, type=int,
+			help="Number of paragraphs per NER model batch. Default: 16")
+	parser.add_argument(
+			"-t", "--threads", default=0, type=int,
+			help="Number of torch threads for CPU inference. Default: torch default")
 		 
 
-def _add_to_filtered_paragrahs(db, para_id, ner_filter_name):
-	paragraph = FilteredParagraphs().get_one(db, {'para_id': para_id, 'filter_name': ner_filter_name})
-	if paragraph is not None:
-		log.trace(f"Paragraph in PostGres: {para_id}. Skipped.")
-		return False
-	
-	else:
-		obj = FilteredParagraphs()
-		obj.para_id = para_id
-		obj.filter_name = ner_filter_name
-		obj.insert(db)
-
-		log.trace(f"Added to PostGres: {para_id}")
-
-
 def _ner_filter(ner_pipeline, para_text, unit_list, ner_output=None):
 
 	"""Pass paragraph through NER pipeline to check whether it contains relevant information"""
@@ -100,18 +98,43 @@ def _ner_filter(ner_pipeline, para_text, unit_list, ner_output=None):
 	return ner_output, output_flag
 
 
+def _iter_ner_outputs(bert, records, batch_size : int):
+	""" Yield the (rows, NER outputs) of the records window by window.
+	The paragraphs of a window are sorted by length into model batches.
+	"""
+	batch_size = max(batch_size, 1)
+	window = batch_size * _window_batches
+	for i in range(0, len(records), window):
+		rows = records[i : i + window]
+		yield rows, bert.pipeline_batch([row.text for row in rows], batch_size)
+
+
 def run(args: ArgumentParser):
+	import torch
 	from backend import postgres, sett
+	from backend.postgres import persist
 	from backend.utils import checkpoint
 	from backend.record_extraction import bert_model
 
 	db = postgres.connect()
 
+	if args.threads > 0:
+		torch.set_num_threads(args.threads)
+
 	# Load Materials bert to GPU
 	bert = bert_model.MaterialsBERT()
 	bert.init_local_model(
-		sett.NERPipeline.model, sett.NERPipeline.pytorch_device)
-	ner_pipeline = bert.pipeline
+		sett.NERPipeline.model, sett.NERPipeline.pytorch_device,
+		sett.NERPipeline.backend, sett.NERPipeline.onnx_quantize,
+		sett.NERPipeline.onnx_dir)
+	if sett.NERPipeline.use_cache:
+		bert.init_cache(db)
+
+	if args.all:
+		return run_all_filters(args, db, bert)
+
+	if not args.filter:
+		raise ValueError("Filter name or --all is required.")
 
 	prop_filter_name = getattr(HeuristicFilterName, args.filter)
 	ner_filter_name = args.filter
@@ -137,43 +160,48 @@ def run(args: ArgumentParser):
 	})
 	log.note("Found {} paragraphs not processed.", len(records))
 
+	# Not more than debugCount per run.
+	if sett.Run.debugCount > 0:
+		records = records[:sett.Run.debugCount]
+
 	if len(records) == 0:
 		return
 	else:
 		log.note("Unprocessed Row IDs: {} to {}",
 							records[0].para_id, records[-1].para_id)
-	
-
-	relevant_paras = 0
 
-	for row in tqdm(records):
-		if row.para_id < last_processed_id:
-			continue
+	log.info("Running NER with batch size {} on {} torch threads.",
+		  args.batch_size, torch.get_num_threads())
 
-		if sett.Run.debugCount >0 and filtration_dict['total_paragraphs'] > sett.Run.debugCount:
-				break
+	t0 = time.perf_counter()
+	pbar = tqdm(total=len(records))
 
-		filtration_dict['total_paragraphs'] +=1
+	for rows, outputs in _iter_ner_outputs(bert, records, args.batch_size):
+		passed = []
+		for row, ner_output in zip(rows, outputs):
+			_, ner_filter_output = _ner_filter(None, para_text=row.text, unit_list= prop_metadata.units, ner_output=ner_output)
+			if ner_filter_output:
+				log.trace(f'Paragraph: {row.para_id} passed {ner_filter_name}.')
+				filtration_dict[f'{mode}_keyword_paragraphs_ner']+=1
+				passed.append((row.para_id, ner_filter_name))
 
-		para = PaperTexts().get_one(db, {'id': row.para_id})
+		persist.add_filtered_paragraphs(db, passed)
+		db.commit()
 
-		ner_output, ner_filter_output = _ner_filter(ner_pipeline, para_text=para.text, unit_list= prop_metadata.units, ner_output=None)
-		if ner_filter_output:
-			log.note(f'Paragraph: {row.para_id} passed {ner_filter_name}.')
-			filtration_dict[f'{mode}_keyword_paragraphs_ner']+=1
-			if _add_to_filtered_paragrahs(db, row.para_id, ner_filter_name):
-				relevant_paras +=1
-				if relevant_paras % 50 == 0:
-					db.commit()
+		filtration_dict['total_paragraphs'] += len(rows)
+		pbar.update(len(rows))
 
-		else:
-			log.info(f"{row.para_id} did not pass {ner_filter_name}")
+		elapsed = max(time.perf_counter() - t0, 1e-9)
+		log.info(f'Number of paragraphs parsed so far: {filtration_dict["total_paragraphs"]} '
+		   f'({filtration_dict["total_paragraphs"] / elapsed:.2f} paragraphs/s)')
+		log.info(f'Number of paragraphs with {property} information after heuristic filter: {len(records)}')
+		log.info(f'Number of paragraphs with {property} information after NER filter ({ner_filter_name}) : {filtration_dict[f"{mode}_keyword_paragraphs_ner"]}')
 
-		if filtration_dict['total_paragraphs']% 100 == 0 or filtration_dict['total_paragraphs']== len(records):
-			log.info(f'Number of paragraphs parsed so far: {filtration_dict["total_paragraphs"]}')
-			log.info(f'Number of paragraphs with {property} information after heuristic filter: {len(records)}')
-			log.info(f'Number of paragraphs with {property} information after NER filter ({ner_filter_name}) : {filtration_dict[f"{mode}_keyword_paragraphs_ner"]}')
+	pbar.close()
+	row = records[-1]
 
+	if bert.cache is not None:
+		log.info("NER cache: {}", bert.cache.stats())
 
 	checkpoint.add_new(
 		db, name = ner_filter_name, table = FilteredParagraphs.__tablename__,
@@ -183,3 +211,108 @@ def run(args: ArgumentParser):
 		)
 	log.note(f'Last processed para_id: {row.para_id}')
 	db.commit()
+
+
+def run_all_filters(args: ArgumentParser, db, bert):
+	""" Run all the ner filters in one pass. The NER filter does not depend
+	on the property, so each paragraph of the union of the heuristic filters
+	is passed through the model once, and added to the ner filter of every
+	heuristic filter it belongs to. The checkpoint of each ner filter is
+	used and updated.
+	"""
+	import torch
+	from backend import postgres, sett
+	from backend.postgres import persist
+	from backend.utils import checkpoint
+
+	ner_filters = {
+		prop_filter_name: ner_filter_name
+		for ner_filter_name, prop_filter_name in HeuristicFilterName.__dict__.items()
+		if not ner_filter_name.startswith('_')
+	}
+
+	# Start from the oldest checkpoint, skip the filters already
+	# processed for a paragraph.
+	last_ids = {
+		name: checkpoint.get_last(db, name=name, table=FilteredParagraphs.__tablename__)
+		for name in ner_filters.values()
+	}
+	last_processed_id = min(last_ids.values())
+	log.info("Last run row ID: {}", last_processed_id)
+
+	query = '''
+	SELECT fp.para_id, pt.text, array_agg(fp.filter_name) AS filters
+	FROM filtered_paragraphs fp
+	JOIN paper_texts pt ON fp.para_id = pt.id
+	WHERE fp.filter_name = ANY(:prop_filter_names)
+	AND fp.para_id > :last_processed_id
+	GROUP BY fp.para_id, pt.id ORDER BY fp.para_id LIMIT :limit;
+	'''
+
+	log.info("Querying list of non-processed paragraphs.")
+	records = postgres.raw_sql(query, {
+		'prop_filter_names': list(ner_filters.keys()),
+		'last_processed_id': last_processed_id, 'limit': args.limit
+	})
+	log.note("Found {} paragraphs not processed.", len(records))
+
+	# Not more than debugCount per run.
+	if sett.Run.debugCount > 0:
+		records = records[:sett.Run.debugCount]
+
+	if len(records) == 0:
+		return
+	else:
+		log.note("Unprocessed Row IDs: {} to {}",
+							records[0].para_id, records[-1].para_id)
+
+	log.info("Running NER with batch size {} on {} torch threads.",
+		  args.batch_size, torch.get_num_threads())
+
+	t0 = time.perf_counter()
+	pbar = tqdm(total=len(records))
+	added = 0
+
+	for rows, outputs in _iter_ner_outputs(bert, records, args.batch_size):
+		passed = []
+		for row, ner_output in zip(rows, outputs):
+			_, ner_filter_output = _ner_filter(None, para_text=row.text, unit_list=None, ner_output=ner_output)
+			if not ner_filter_output:
+				continue
+
+			for prop_filter_name in row.filters:
+				ner_filter_name = ner_filters[prop_filter_name]
+				if row.para_id > last_ids[ner_filter_name]:
+					filtration_dict[f'{ner_filter_name}_paragraphs_ner']+=1
+					passed.append((row.para_id, ner_filter_name))
+
+		added += persist.add_filtered_paragraphs(db, passed)
+		db.commit()
+
+		filtration_dict['total_paragraphs'] += len(rows)
+		pbar.update(len(rows))
+
+		elapsed = max(time.perf_counter() - t0, 1e-9)
+		log.info(f'Number of paragraphs parsed so far: {filtration_dict["total_paragraphs"]} '
+		   f'({filtration_dict["total_paragraphs"] / elapsed:.2f} paragraphs/s)')
+		log.info(f'Number of paragraphs added to filtered_paragraphs: {added}')
+
+	pbar.close()
+	row = records[-1]
+
+	if bert.cache is not None:
+		log.info("NER cache: {}", bert.cache.stats())
+
+	for name in sorted(last_ids):
+		log.info(f'Number of paragraphs after NER filter ({name}) : {filtration_dict[f"{name}_paragraphs_ner"]}')
+
+	for name, last_id in last_ids.items():
+		if row.para_id > last_id:
+			checkpoint.add_new(
+				db, name = name, table = FilteredParagraphs.__tablename__,
+				row = row.para_id, comment = {
+					'user': sett.Run.userName, 'filter': name,
+					'debug': True if sett.Run.debugCount > 0 else False }
+				)
+	log.note(f'Last processed para_id: {row.para_id}')
+	db.commit()
@@ -0,0 +1,72 @@
+import pylogg
+import sqlalchemy as sa
+from argparse import ArgumentParser, _SubParsersAction
+
+from backend import postgres
+
+ScriptName = 'text-index'
+
+log = pylogg.New(ScriptName)
+
+# Trigram index on the paragraph texts, used by the postgres backend of
+# the heuristic filter.
+IndexName = 'paper_texts_text_trgm_idx'
+
+
+def add_args(subparsers: _SubParsersAction):
+    parser: ArgumentParser = subparsers.add_parser(
+        ScriptName,
+        help='Manage the pg_trgm index of the paragraph texts.')
+    parser.add_argument(
+        'action', choices=['create', 'drop', 'status'],
+        help="Create or drop the index, or show its status.")
+    parser.add_argument(
+        '--blocking', default=False, action='store_true',
+        help="Lock the paper_texts table while building or dropping the "
+             "index, which is faster than the default concurrent build.")
+
+
+def _execute(query: str, params: dict = {}) -> list:
+    """ Execute a statement outside of a transaction block, as required
+        by CREATE/DROP INDEX CONCURRENTLY.
+    """
+    with postgres.engine().connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        result = conn.execute(sa.text(query), params)
+        return result.all() if result.returns_rows else []
+
+
+def _status():
+    rows = _execute("""
+        SELECT i.indisvalid AS valid,
+            pg_size_pretty(pg_relation_size(c.oid)) AS size
+        FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = :name;
+    """, {'name': IndexName})
+
+    if not rows:
+        log.note("Index {} does not exist.", IndexName)
+    elif not rows[0].valid:
+        # A failed or interrupted concurrent build leaves an invalid index.
+        log.warn("Index {} is invalid ({}). Drop and create it again.",
+                 IndexName, rows[0].size)
+    else:
+        log.note("Index {} is valid ({}).", IndexName, rows[0].size)
+
+
+def run(args: ArgumentParser):
+    concurrently = '' if args.blocking else 'CONCURRENTLY'
+
+    if args.action == 'create':
+        _execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        t2 = log.info("Creating index {} on paper_texts.", IndexName)
+        _execute(f"CREATE INDEX {concurrently} IF NOT EXISTS {IndexName} "
+                 "ON paper_texts USING gin (text gin_trgm_ops);")
+        t2.done("Created index {}.", IndexName)
+
+    elif args.action == 'drop':
+        t2 = log.info("Dropping index {}.", IndexName)
+        _execute(f"DROP INDEX {concurrently} IF EXISTS {IndexName};")
+        t2.done("Dropped index {}.", IndexName)
+
+    _status()
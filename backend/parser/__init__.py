@@ -1,3 +1,5 @@
+import os
+
 from .acs import ACSParser
 from .elsevier import ElsevierParser
 from .wiley import WileyParser
@@ -9,15 +11,24 @@ from .ecs import ECSParser
 from .hindawi import HindawiParser
 from .informa import InformaParser
 from .rsc import RSCParser
-from .document import DocumentParser
+from .document import DocumentParser, XMLDocumentParser
+from ..utils import shards
+
+# Increase after changing the parsers, so that the files parsed by an older
+# version are parsed again by `parse --incremental`.
+ParserVersion = 1
 
 
-def PaperParser(publisher, filepath) -> DocumentParser:
+def PaperParser(publisher, filepath, streaming=False,
+                contents=None) -> DocumentParser:
     """ Return an appropriate document parser based on it's publisher. 
     
     Parameters:
         publisher   string: Name of the publisher.
-        filepath    string: Path to the XML or HTML document.
+        filepath    string: Path to the XML or HTML document, or to a
+                            member of a corpus shard (shard path/member).
+        streaming   bool:   Use the streaming engine for XML documents.
+        contents    bytes:  Contents of the document, if already read.
 
     Returns:
         None if no such publisher.
@@ -39,4 +50,13 @@ def PaperParser(publisher, filepath) -> DocumentParser:
     if publisher not in parsers.keys():
         return None
 
-    return parsers[publisher](filepath)
+    if contents is None and not os.path.exists(filepath):
+        shardpath, member = shards.split_member_path(filepath)
+        if member is not None:
+            with shards.Shard(shardpath) as shard:
+                contents = shard.read(member)
+
+    if streaming and issubclass(parsers[publisher], XMLDocumentParser):
+        return parsers[publisher](filepath, streaming=True, contents=contents)
+
+    return parsers[publisher](filepath, contents=contents)
@@ -7,14 +7,23 @@ class ACSParser(XMLDocumentParser):
     XML document parser for ACS papers.
     
     """
-    def __init__(self, filepath) -> None:
-        super().__init__('acs', filepath)
+    def __init__(self, filepath, streaming=False, contents=None) -> None:
+        super().__init__('acs', filepath, streaming, contents)
 
         # ACS XML specific configs
         self.table_xpath = '//*[local-name()="table-wrap"]'
         self.title_xpath = '//*[local-name()="article-title"]'
         self.date_xpath = '//*[local-name()="pub-date" and @pub-type="ppub"]'
         self.journal_xpath = '//*[local-name()="journal-title"]'
+        self.fallback_xpaths = [
+            '//*[local-name()="pub-date" and @date-type="pub"]',
+        ]
+
+    def parse(self, parse_tables=True, parse_paragraphs=True):
+        # Resolving the table labels of the xrefs needs the full tree.
+        if parse_tables:
+            self.streaming = False
+        return super().parse(parse_tables, parse_paragraphs)
 
     def parse_meta(self):
         super().parse_meta()
@@ -30,12 +39,12 @@ class ACSParser(XMLDocumentParser):
 
         pattern = re.compile(r"(\d+)")
 
-        elems = self._tree.xpath('//*[local-name()="xref"]')
+        elems = self.xpath('//*[local-name()="xref"]')
         for elem in elems:
             rid = elem.get("rid")
 
             # rid is an element ID
-            dest_label = self._tree.find('//*[@id="{}"]/label'.format(rid))
+            dest_label = self._xref_label(rid)
 
             # extract the digit
             match = pattern.findall(rid)
@@ -56,6 +65,13 @@ class ACSParser(XMLDocumentParser):
         # hand over to the parent parser
         return super().parse_tables()
 
+    def _xref_label(self, rid):
+        """ Return the label element of the element referenced by an xref. """
+        dest = self.element_by_id(rid)
+        if dest is None:
+            return None
+        return dest.find('label')
+
     def parse_paragraphs(self):
         self.para_xpaths=['//*[local-name()="p"]']
         return super().parse_paragraphs()
@@ -5,8 +5,8 @@ from .document import HTMLDocumentParser
 class AIPParser(HTMLDocumentParser):
     """ HTML document parser for AIP papers.
     """
-    def __init__(self, filepath) -> None:
-        super().__init__('aip', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('aip', filepath, contents)
         self.tableParser = _aipTableParser
 
         # Meta
@@ -53,7 +53,7 @@ class _aipTableParser(TableParser):
 
         # XPath of caption relative to the table element
         self.caption_rxpath = './/../../preceding-sibling::div[@class="NLM_table"][1]'
-        captions = table_element.xpath(self.caption_rxpath)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
@@ -1,3 +1,4 @@
+import io
 import re
 import json
 from lxml import html, etree
@@ -5,7 +6,7 @@ from datetime import datetime
 
 from . import tabular
 from . import paragraph
-from ..text.normalize import innerText, asciiText
+from ..text.normalize import innerText, TextNormalizer
 
 
 class DocumentParser(object):
@@ -15,11 +16,19 @@ class DocumentParser(object):
         ftype (str): XML or HTML
         publisher (str):    Name of the publisher
         filepath (str):    Path to the html document
+        contents (bytes):  Contents of the document, if already read from
+                            a corpus shard. The filepath is not opened then.
     
     """
 
+    # Compiled XPath expressions, one registry per parser class.
+    _xpaths : dict[str, etree.XPath] = {}
 
-    def __init__(self, ftype, publisher, filepath) -> None:
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._xpaths = {}
+
+    def __init__(self, ftype, publisher, filepath, contents=None) -> None:
         self._tree = None 
 
         # Paper table mapping
@@ -35,6 +44,16 @@ class DocumentParser(object):
         self.publisher = publisher
         self.docname = filepath.split("/")[-1]
 
+        # Element id -> element, built on first use
+        self._ids = None
+
+        # Document bytes given by the caller
+        self._source = contents
+
+        # Raw file contents and body sentences, built on first use
+        self._contents = None
+        self._sentences = None
+
         # Texts
         self.sections = {}
 
@@ -108,9 +127,28 @@ class DocumentParser(object):
         pr += "\n]"
         return pr
 
+    def xpath(self, expr, node = None) -> list:
+        """ Evaluate an XPath on the document tree, or on a node if given.
+            The expression is compiled once and reused for all documents.
+        """
+        compiled = self._xpaths.get(expr)
+        if compiled is None:
+            compiled = self._xpaths[expr] = etree.XPath(expr)
+        return compiled(self._tree if node is None else node)
+
+    def element_by_id(self, id):
+        """ Return the first element with the specified id attribute.
+            The id index is built once per document.
+        """
+        if self._ids is None:
+            self._ids = {}
+            for elem in self.xpath('//*[@id]'):
+                self._ids.setdefault(elem.get('id'), elem)
+        return self._ids.get(id)
+
     def xpath_to_string(self, xpath):
         """ Get the element specified by XPath and return its inner text. """
-        elems = self._tree.xpath(xpath)
+        elems = self.xpath(xpath)
 
         if len(elems) > 0:
             return innerText(elems[0])
@@ -131,7 +169,7 @@ class DocumentParser(object):
     def parse_paragraphs(self):
         """ Parse all the paragraphs from an XML document. """
         for para_xpath in self.para_xpaths:
-            selected_elements = self._tree.xpath(para_xpath)
+            selected_elements = self.xpath(para_xpath)
 
             for item in selected_elements:
                 para = paragraph.ParagraphParser()
@@ -189,15 +227,15 @@ class DocumentParser(object):
     def remove_duplicate_paragraphs(self):
         """
         Loop over the detected paragraphs, and remove duplicates.
-        Check for duplicates using text.
+        Check for duplicates using text. Paragraphs contained in
+        a previous paragraph are also removed.
         """
         paras = []
-        texts = []
+        texts = _SubstringIndex()
         for para in self.paragraphs:
-            part_of_texts = [para.text in t for t in texts]
-            if para.text not in texts and not any(part_of_texts):
+            if not texts.contains(para.text):
                 paras.append(para)
-                texts.append(para.text)
+                texts.add(para.text)
 
         self.paragraphs = paras
 
@@ -207,9 +245,13 @@ class DocumentParser(object):
         doc = self.body.strip()
 
         if len(doc) == 0:
-            fp = open(self.docpath, 'r')
-            doc = fp.read()
-            fp.close()
+            if self._contents is None:
+                if self._source is not None:
+                    self._contents = self._source.decode(errors='replace')
+                else:
+                    with open(self.docpath, 'r') as fp:
+                        self._contents = fp.read()
+            doc = self._contents
 
         # Search for the pattern in the document
         pattern = rf'\b{word}\b'
@@ -217,7 +259,23 @@ class DocumentParser(object):
 
         self.wordcount[word] = len(match)
         return len(match)
-    
+
+    def document(self):
+        """ Return the document as a file object if the contents were given,
+        otherwise the file path. Both can be passed to lxml.
+        """
+        if self._source is not None:
+            return io.BytesIO(self._source)
+        return self.docpath
+
+    def sentence_index(self) -> '_SentenceIndex':
+        """ Return the sentence index of the document body.
+        The index is rebuilt only if the body changes.
+        """
+        if self._sentences is None or self._sentences.source != self.body:
+            self._sentences = _SentenceIndex(self.body)
+        return self._sentences
+
     def find_references(self, object : str) -> list[str]:
         """
         Find the sentences in the document body referencing a table or figure.
@@ -227,46 +285,38 @@ class DocumentParser(object):
                     Ex. 'Table II.', 'Figure 2' etc.
 
         """
-        doc = asciiText(self.body.strip())
+        index = self.sentence_index()
 
-        if len(doc) == 0:
+        if len(index.text) == 0:
             print("Warning: document empty.")
             return []
-        
-        # Haystack = valid sentences
-        pattern = re.compile(r'([a-z][^\.!?]*[\.!?]) ', re.M | re.IGNORECASE)
-        sentenses = pattern.findall(doc)
-
-        # Needle
-        pattern = rf'\b{object}\b'
 
+        sentenses = index.sentences
         results = []
 
         # Search for the needle in the sentences.
-        for i, sent in enumerate(sentenses):
-            match = re.search(pattern, sent, re.IGNORECASE)
-            if match is not None:
-                context = []
+        for i in index.find(object):
+            context = []
 
-                # include the previous sentence for context
-                if i > 0:
-                    context.append(sentenses[i-1].strip())
+            # include the previous sentence for context
+            if i > 0:
+                context.append(sentenses[i-1].strip())
 
-                # include the matching sentence
-                context.append(sent.strip())
+            # include the matching sentence
+            context.append(sentenses[i].strip())
 
-                # include the next sentence for context
-                if i < len(sentenses) - 1:
-                    context.append(sentenses[i+1].strip())
+            # include the next sentence for context
+            if i < len(sentenses) - 1:
+                context.append(sentenses[i+1].strip())
 
-                # combine everything
-                results.append("\n".join(context))
+            # combine everything
+            results.append("\n".join(context))
 
         # If sentewise search fails, fallback to brute force search. 
         # This will not capture previous and next sentences.
         if len(results) == 0:
             pattern = re.compile(rf'([^.!?]*{object}[^.!?]*[.!?])', re.M | re.IGNORECASE)
-            results = pattern.findall(doc)
+            results = pattern.findall(index.text)
 
         return results
 
@@ -294,22 +344,140 @@ class DocumentParser(object):
         return pr
 
 
+class _SubstringIndex(object):
+    """
+    A list of texts that can be checked in near-linear time if a new
+    text is a duplicate or a substring of any of them.
+
+    Every `step`-th k-gram of the added texts is hashed. A text that is
+    at least `step + k - 1` characters long contains one of the hashed
+    k-grams of a text it is part of, within its first `step` offsets.
+    Only the texts sharing such a k-gram are compared directly.
+    Shorter texts are searched once in the joined texts, and in the texts
+    added since the last join. The texts are joined again only when the
+    added texts are longer than the joined ones, so that alternating adds
+    and lookups do not join all the texts every time.
+    Args:
+        k (int):        Length of the hashed k-grams.
+        step (int):     Distance between the hashed k-grams.
+
+    """
+
+    _sep = '\x00'
+
+    def __init__(self, k=32, step=32) -> None:
+        self.k = k
+        self.step = step
+        self.texts : list[str] = []
+        self._exact = set()
+        self._kgrams = {}
+        self._joined = ""
+        self._pending : list[str] = []
+        self._pending_len = 0
+
+    def add(self, text : str):
+        """ Add a new text to the index. """
+        i = len(self.texts)
+        self.texts.append(text)
+        self._exact.add(text)
+        self._pending.append(text)
+        self._pending_len += len(text) + 1
+
+        for p in range(0, len(text) - self.k + 1, self.step):
+            self._kgrams.setdefault(text[p:p + self.k], []).append(i)
+
+    def contains(self, text : str) -> bool:
+        """ Return True if the text is part of any of the added texts. """
+        if len(self.texts) == 0:
+            return False
+
+        if text in self._exact:
+            return True
+
+        if self._sep in text:
+            return any(text in t for t in self.texts)
+
+        if len(text) < self.step + self.k - 1:
+            if self._pending_len > len(self._joined):
+                self._joined = self._sep.join([self._joined] + self._pending)
+                self._pending = []
+                self._pending_len = 0
+            return text in self._joined or any(
+                text in t for t in self._pending)
+
+        candidates = set()
+        for d in range(self.step):
+            candidates.update(self._kgrams.get(text[d:d + self.k], []))
+
+        return any(text in self.texts[i] for i in candidates)
+
+
+class _SentenceIndex:
+    """
+    Sentences of a document body with an inverted index of the
+    'Table N' and 'Figure N' mentions, to find the referencing sentences
+    of all the tables and figures in a single pass over the body.
+    Args:
+        body (str):     The document body text.
+
+    """
+
+    # Haystack = valid sentences
+    _re_sentence = re.compile(r'([a-z][^\.!?]*[\.!?]) ', re.M | re.IGNORECASE)
+    _re_mention = re.compile(r'\b(table|figure) (?=(\w+))', re.IGNORECASE)
+    _re_needle = re.compile(r'(table|figure) (\w+)', re.IGNORECASE)
+
+    def __init__(self, body : str) -> None:
+        self.source = body
+        self.text = TextNormalizer().normalize(body.strip())
+        self.sentences : list[str] = self._re_sentence.findall(self.text)
+
+        # (table|figure, label) -> sentence numbers
+        self.mentions : dict[tuple[str, str], list[int]] = {}
+        for i, sent in enumerate(self.sentences):
+            for match in self._re_mention.finditer(sent):
+                key = (match.group(1).lower(), match.group(2).lower())
+                found = self.mentions.setdefault(key, [])
+                if not found or found[-1] != i:
+                    found.append(i)
+
+    def find(self, object : str) -> list[int]:
+        """ Return the numbers of the sentences containing the word(s),
+        case insensitive.
+        """
+        needle = self._re_needle.fullmatch(object)
+        if needle is not None:
+            key = (needle.group(1).lower(), needle.group(2).lower())
+            return self.mentions.get(key, [])
+
+        # Not a table or figure label, search all the sentences.
+        pattern = re.compile(rf'\b{object}\b', re.IGNORECASE)
+        return [i for i, sent in enumerate(self.sentences)
+                if pattern.search(sent) is not None]
+
+
 class XMLDocumentParser(DocumentParser):
     """
     A DocumentParser to parse XML documents.
     Args:
         publisher (str):    Name of the publisher.
         filepath (str):    Path to the XML document.
+        streaming (bool):   Use the iterparse based streaming engine instead
+                            of loading the full document tree.
+        contents (bytes):   Contents of the XML document, if already read.
     
     """
 
-    def __init__(self, publisher, filepath) -> None:
-        super().__init__('xml', publisher, filepath)
+    def __init__(self, publisher, filepath, streaming=False,
+                 contents=None) -> None:
+        super().__init__('xml', publisher, filepath, contents)
 
         # Parse xml document tree
         # contents = open(filepath, 'rb').read()
         # self._tree = etree.fromstring(contents)
-        self._tree = etree.parse(filepath)
+        self.streaming = streaming
+        if not self.streaming:
+            self._tree = etree.parse(self.document())
 
         self.table_xpath = '//*[local-name()="table"]'
         self.title_xpath = '//*[local-name()="title"]'
@@ -319,10 +487,144 @@ class XMLDocumentParser(DocumentParser):
         self.journal_xpath = '//*[local-name()="journal"]'
         self.para_xpaths = ['//*[local-name()="p"]']
 
+        # Meta XPaths tried by parse_meta() if the defaults are not found.
+        # The streaming engine needs to know them before the single pass.
+        self.fallback_xpaths = []
+
+        # Items collected by the streaming engine.
+        self._stream_meta = {}
+        self._stream_tables = []
+        self._stream_paragraphs = []
+
+    def xpath_to_string(self, xpath):
+        """ Get the element specified by XPath and return its inner text. """
+        if self._tree is None:
+            return self._stream_meta.get(xpath, "")
+        return super().xpath_to_string(xpath)
+
+    def parse(self, parse_tables=True, parse_paragraphs=True):
+        if self.streaming:
+            self.parse_stream(parse_tables, parse_paragraphs)
+        elif self._tree is None:
+            self._tree = etree.parse(self.document())
+        return super().parse(parse_tables, parse_paragraphs)
+
+    def parse_stream(self, parse_tables=True, parse_paragraphs=True):
+        """
+        Collect the meta, table and paragraph items in a single pass over
+        the document using lxml iterparse. Processed subtrees are collapsed
+        into their text content, so that the memory usage stays low and
+        the inner text of the enclosing meta elements remains unchanged.
+        The collected items are then used by parse_meta(), parse_tables()
+        and parse_paragraphs() as usual.
+
+        Only single step XPaths of the form `//*[...]` are supported.
+        The parsed paragraphs do not keep a reference to their elements.
+
+        """
+        meta_xpaths = [
+            self.title_xpath, self.abstract_xpath, self.body_xpath,
+            self.date_xpath, self.journal_xpath] + self.fallback_xpaths
+
+        meta_selectors = [(xp, _StreamSelector(xp)) for xp in meta_xpaths]
+        para_selectors = [_StreamSelector(xp) for xp in self.para_xpaths] \
+            if parse_paragraphs else []
+        table_selector = _StreamSelector(self.table_xpath) \
+            if parse_tables else None
+
+        self._stream_meta = {}
+        self._stream_tables = []
+        self._stream_paragraphs = []
+
+        first_meta = {}     # xpath -> first matching element
+        matched = {}        # element -> list of (kind, key)
+        pinned = set()      # tables and their ancestors, never collapsed
+        structural = 0      # number of open paragraph and table elements
+        pending = []        # ended elements waiting for their tail texts
+        paragraphs = []     # ((xpath index, document order), paragraph)
+        tables = []         # (document order, table)
+        order = 0
+
+        def process(elem):
+            # The tail of an element is only available after the next event.
+            kinds = matched.pop(elem, [])
+            for kind, key in kinds:
+                if kind == 'meta':
+                    self._stream_meta[key] = innerText(elem)
+                elif kind == 'para':
+                    para = paragraph.ParagraphParser()
+                    para.parse(elem)
+                    para.body = None
+                    if para.is_valid():
+                        paragraphs.append((key, para))
+
+            # Elements inside a paragraph or a table must keep their
+            # structure until the enclosing item is parsed. The table
+            # parsers keep their elements for later serialization.
+            if structural == 0 and elem not in pinned:
+                text = etree.tostring(elem, method="text", encoding="unicode",
+                                      with_tail=False)
+                elem.clear(keep_tail=True)
+                elem.text = text
+
+        for event, elem in etree.iterparse(self.document(),
+                                           events=('start', 'end')):
+            for item in pending:
+                process(item)
+            pending = []
+
+            localname = etree.QName(elem).localname
+
+            if event == 'start':
+                order += 1
+                kinds = []
+                for xp, sel in meta_selectors:
+                    if xp not in first_meta and sel.match(elem, localname):
+                        first_meta[xp] = elem
+                        kinds.append(('meta', xp))
+                for i, sel in enumerate(para_selectors):
+                    if sel.match(elem, localname):
+                        kinds.append(('para', (i, order)))
+                if table_selector and table_selector.match(elem, localname):
+                    kinds.append(('table', order))
+
+                if kinds:
+                    matched[elem] = kinds
+                    if any(k != 'meta' for k, _ in kinds):
+                        structural += 1
+                continue
+
+            kinds = matched.get(elem, [])
+            if any(k != 'meta' for k, _ in kinds):
+                structural -= 1
+
+            for kind, key in kinds:
+                if kind == 'table':
+                    tabl = tabular.XMLTableParser()
+                    tabl.parse(elem)
+                    tables.append((key, tabl))
+                    pinned.add(elem)
+                    pinned.update(elem.iterancestors())
+
+            pending.append(elem)
+
+        for item in pending:
+            process(item)
+
+        # Same order as running the XPaths one by one.
+        tables.sort(key=lambda item: item[0])
+        paragraphs.sort(key=lambda item: item[0])
+        self._stream_tables = [tabl for _, tabl in tables]
+        self._stream_paragraphs = [para for _, para in paragraphs]
 
     def parse_tables(self):
+        if self._tree is None:
+            self.tablesfound = len(self._stream_tables)
+            self.tables += [t for t in self._stream_tables if t.is_valid()]
+            return
+
         # Tables from any XML namespace.
-        tables = self._tree.xpath(self.table_xpath)
+        tables = self.xpath(self.table_xpath)
 
         self.tablesfound = len(tables)
 
@@ -332,6 +634,12 @@ class XMLDocumentParser(DocumentParser):
             if tabl.is_valid():
                 self.tables.append(tabl)
 
+    def parse_paragraphs(self):
+        if self._tree is None:
+            self.paragraphs += self._stream_paragraphs
+            return
+        return super().parse_paragraphs()
+
     def parse_meta(self):
         self.title = self.xpath_to_string(self.title_xpath)
         self.abstract = self.xpath_to_string(self.abstract_xpath)
@@ -340,19 +648,54 @@ class XMLDocumentParser(DocumentParser):
         self.journal = self.xpath_to_string(self.journal_xpath)
 
 
+class _StreamSelector(object):
+    """
+    Test if an element is selected by a single step `//*[...]` XPath,
+    while the document is being streamed.
+    Args:
+        xpath (str):    The XPath expression.
+
+    """
+
+    _localname = re.compile(r'local-name\(\)\s*=\s*"([^"]+)"')
+
+    # Compiled self tests, shared by all documents.
+    _tests : dict[str, etree.XPath] = {}
+
+    def __init__(self, xpath) -> None:
+        if not xpath.startswith('//') or '/' in xpath[2:]:
+            raise ValueError("Streaming requires a single step XPath", xpath)
+
+        # Quick check on the local name before evaluating the XPath.
+        names = self._localname.findall(xpath)
+        self.localname = names[0] \
+            if len(names) == 1 and ' or ' not in xpath else None
+        self.test = self._tests.get(xpath)
+        if self.test is None:
+            self.test = self._tests[xpath] = etree.XPath('self::' + xpath[2:])
+
+    def match(self, elem, localname) -> bool:
+        if self.localname is not None and localname != self.localname:
+            return False
+        return bool(self.test(elem))
+
+
 class HTMLDocumentParser(DocumentParser):
     """
     A DocumentParser to parse HTML documents.
     Args:
         publisher (str):    Name of the publisher.
         filepath (str):    Path to the HTML document.
+        contents (bytes):   Contents of the HTML document, if already read.
     
     """
-    def __init__(self, publisher, filepath) -> None:
-        super().__init__('html', publisher, filepath)
+    def __init__(self, publisher, filepath, contents=None) -> None:
+        super().__init__('html', publisher, filepath, contents)
 
         # Parse HTML document tree
-        contents = open(filepath, 'rb').read()
+        if contents is None:
+            with open(filepath, 'rb') as fp:
+                contents = fp.read()
         self._tree = html.fromstring(contents)
 
         self.tableParser = None
@@ -371,7 +714,7 @@ class HTMLDocumentParser(DocumentParser):
 
     def parse_tables(self):
         # Find all tables by XPATH
-        tables = self._tree.xpath(self.table_xpath)
+        tables = self.xpath(self.table_xpath)
         tables += self._full_table_links(self._tree)
 
         self.tablesfound = len(tables)
@@ -6,8 +6,8 @@ class ECSParser(HTMLDocumentParser):
     """HTML Parser for ECS publications. ECS and IOP have similar HTML structures.
     """
 
-    def __init__(self, filepath) -> None:
-        super().__init__('ecs', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('ecs', filepath, contents)
         self.tableParser = _ecsTableParser
 
         # Meta
@@ -26,7 +26,7 @@ class _ecsTableParser(TableParser):
 
         # XPath of caption relative to the table element
         self.caption_rxpath = './/../p'
-        captions = table_element.xpath(self.caption_rxpath)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
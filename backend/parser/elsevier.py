@@ -2,13 +2,19 @@ from .document import XMLDocumentParser
 
 
 class ElsevierParser(XMLDocumentParser):
-    def __init__(self, filepath) -> None:
-        super().__init__('elsevier', filepath)
+    def __init__(self, filepath, streaming=False, contents=None) -> None:
+        super().__init__('elsevier', filepath, streaming, contents)
 
         # Elsevier XML specific configs
         self.table_xpath = '//*[local-name()="table"]'
         self.date_xpath = '//*[local-name()="vor-load-date"]'
         self.journal_xpath = '//*[local-name()="srctitle"]'
+        self.para_xpaths = ['//*[local-name()="para"]']
+        self.fallback_xpaths = [
+            '//*[local-name()="cover-date-end"]',
+            '//*[local-name()="cover-date-orig"]',
+            '//*[local-name()="cover-date-start"]',
+        ]
 
     def parse_meta(self):
         super().parse_meta()
@@ -27,8 +33,3 @@ class ElsevierParser(XMLDocumentParser):
         if self.date.strip() == "":
             self.date_xpath = '//*[local-name()="cover-date-start"]'
             self.date = self.xpath_to_string(self.date_xpath)
-
-
-    def parse_paragraphs(self):
-        self.para_xpaths = ['//*[local-name()="para"]']
-        return super().parse_paragraphs()
\ No newline at end of file
@@ -3,8 +3,8 @@ from .document import HTMLDocumentParser
 
 
 class HindawiParser(HTMLDocumentParser):
-    def __init__(self, filepath) -> None:
-        super().__init__('hindawi', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('hindawi', filepath, contents)
         self.tableParser = _hindawiTableParser
 
         # Hindawi puts table inside another table
@@ -22,7 +22,7 @@ class HindawiParser(HTMLDocumentParser):
         a_elements = []
 
         for i in range(1, 51):
-            full_links = tree.xpath('//a[@href="tab%d/"]' %i)
+            full_links = self.xpath('//a[@href="tab%d/"]' %i, tree)
             if len(full_links) > 0:
                 a_elements += full_links
             else:
@@ -67,7 +67,7 @@ class _hindawiTableParser(TableParser):
         # XPath of caption relative to the table element
 
         caption_rxpath = './/../../../div[@class="floats-partial-footer"]'
-        captions = table_element.xpath(caption_rxpath)
+        captions = self.xpath(caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
@@ -75,7 +75,7 @@ class _hindawiTableParser(TableParser):
         
         # For full text links
         caption_rxpath = './/../../div[@class="groupcaption"]'
-        captions = table_element.xpath(caption_rxpath)
+        captions = self.xpath(caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
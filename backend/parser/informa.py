@@ -6,8 +6,8 @@ class InformaParser(HTMLDocumentParser):
     """ Informa sometimes wraps lists inside tables!! 
         In some cases, both table tags and link to full tables exist.
     """
-    def __init__(self, filepath) -> None:
-        super().__init__('informa_uk', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('informa_uk', filepath, contents)
         self.tableParser = _informaTableParser
 
         # Meta
@@ -57,7 +57,7 @@ class _informaTableParser(TableParser):
 
         # XPath of caption relative to the table element
         caption_rxpath = './/../div[@class="caption"]'
-        captions = table_element.xpath(caption_rxpath)
+        captions = self.xpath(caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
@@ -6,8 +6,8 @@ class IOPParser(HTMLDocumentParser):
     """HTML Parser for IOP publications. ECS and IOP have similar HTML structures.
     """
 
-    def __init__(self, filepath) -> None:
-        super().__init__('iop_publishing', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('iop_publishing', filepath, contents)
         self.tableParser = _iopTableParser
 
         # Meta
@@ -29,7 +29,7 @@ class _iopTableParser(TableParser):
 
         # XPath of caption relative to the table element
         self.caption_rxpath = './/../p'
-        captions = table_element.xpath(self.caption_rxpath)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
@@ -10,8 +10,8 @@ class NatureParser(HTMLDocumentParser):
         Nature does not include the full tables. Additional downloads
         might be necessary.
     """
-    def __init__(self, filepath) -> None:
-        super().__init__('nature', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('nature', filepath, contents)
         self.tableParser = _natureTableParser
 
         # Meta
@@ -24,7 +24,7 @@ class NatureParser(HTMLDocumentParser):
     def _full_table_links(self, tree) -> list:
         # Find all a elements with an href attribute containing '/tables/'
         # Works for springer and nature.
-        a_elements = tree.xpath('//a[contains(@href, "/tables/")]')
+        a_elements = self.xpath('//a[contains(@href, "/tables/")]', tree)
         return a_elements
 
     def parse_paragraphs(self):
@@ -41,7 +41,7 @@ class _natureTableParser(TableParser):
 
         # XPath of caption relative to the table element
         self.caption_rxpath = './/../../figcaption'
-        captions = table_element.xpath(self.caption_rxpath)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
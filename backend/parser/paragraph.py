@@ -34,47 +34,78 @@ class ParagraphParser(object):
         
         return False
     
-    def _clean_text(self, text : str) -> str:
-        """ Clean up a text string, return empty if its a reference."""
-        if text is None:
+    def _raw_text(self, text : str) -> str:
+        """ Return a text string with the special characters replaced but
+        the spaces not normalized, empty if its a reference or has nothing
+        left after normalization. The characters are replaced in each text
+        separately, as they were normalized before joining the texts.
+        """
+        if text is None or self._is_reference(text):
             return ""
-        if not self._is_reference(text):
+        return normalize.replaceChars(text).strip(normalize.BLANK_CHARS)
+
+    def _head_text(self, element) -> str:
+        """ Return the text of an element with the sup/sub markers. """
+        text = self._raw_text(element.text)
+        if not text:
+            return " "
+
+        # Normalize the marked texts separately, they are short.
+        localname = etree.QName(element).localname
+        if localname == 'sup':
+            text = normalize.normText(text)
+            if not text:
+                return " "
+            # Superscript brackets are not markers.
+            text = "^{" + text + "} "
+            text = text.replace("^{[}", "[").replace("^{]}", "]")
+            return " " + text
+        elif localname in ('sub', 'inf'):
             text = normalize.normText(text)
+            return " _{" + text + "} " if text else " "
         else:
-            text = ""
-        return text
+            return " " + text + " "
 
     def _innerText(self, element):
-        """ Recursively loop through the child elements to get the complete
-        inner text and handle special tags such as sup, sub etc.
+        """ Loop through the descendant elements in document order to get the
+        complete inner text and handle special tags such as sup, sub etc.
+        The special characters of each text are replaced before joining,
+        and the joined text is normalized once at the end.
+
+        Same as normalizing every level of the tree, except that a comma
+        run such as ", , ," keeps the spaces that the repeated " , "
+        cleanup removed.
         """
-        text = " "
-        tail = " "
-        cleanedtext = self._clean_text(element.text)
-        cleanedtail = self._clean_text(element.tail)
-
-        if cleanedtext:
-            localname = etree.QName(element).localname
-            if localname == 'sup':
-                text += "^{" + cleanedtext + "} "
-            elif localname == 'sub':
-                text += "_{" + cleanedtext + "} "
-            elif localname == 'inf':
-                text += "_{" + cleanedtext + "} "
-            else:
-                text += cleanedtext + " "
-
-        childtexts = []
-        for child in element:
-            childtexts.append(self._innerText(child))
-
-        if cleanedtail:
-            tail = cleanedtail
-
-        fulltext = text + " ".join(childtexts) + tail
-        # if self.debug:
-        #     breakpoint()
-        return normalize.normText(fulltext)
+        parts = []
+        stack = [element]
+        while stack:
+            item = stack.pop()
+            if type(item) is str:
+                parts.append(item)
+                continue
+
+            if type(item) is int:
+                # End of an element, remove the trailing spaces of its text.
+                while len(parts) > item:
+                    last = parts[-1].rstrip()
+                    if last:
+                        parts[-1] = last
+                        break
+                    parts.pop()
+                continue
+
+            stack.append(len(parts))
+            stack.append(self._raw_text(item.tail) or " ")
+            parts.append(self._head_text(item))
+
+            # Push the children in reverse, separated by spaces.
+            children = list(item)
+            for i in range(len(children) - 1, -1, -1):
+                stack.append(children[i])
+                if i:
+                    stack.append(" ")
+
+        return normalize.normText("".join(parts))
 
     def parse(self, paragraph_element):
         """ Parse the inner text of a paragraph element. """
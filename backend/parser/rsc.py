@@ -3,8 +3,8 @@ from .document import HTMLDocumentParser
 
 
 class RSCParser(HTMLDocumentParser):
-    def __init__(self, filepath) -> None:
-        super().__init__('rsc', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('rsc', filepath, contents)
         self.tableParser = _rscTableParser
 
         # RSC puts figures into tables !!
@@ -46,7 +46,7 @@ class _rscTableParser(TableParser):
 
         # XPath of caption relative to the table element
         self.caption_rxpath = './/../../preceding-sibling::div[@class="table_caption"][1]'
-        captions = table_element.xpath(self.caption_rxpath)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
@@ -8,8 +8,8 @@ class SpringerParser(HTMLDocumentParser):
         Springer does not include the full tables. Additional downloads
         might be necessary.
     """
-    def __init__(self, filepath) -> None:
-        super().__init__('springer', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('springer', filepath, contents)
         self.tableParser = _springerTableParser
 
         self.title_xpath = '//header/h1'
@@ -21,7 +21,7 @@ class SpringerParser(HTMLDocumentParser):
     def _full_table_links(self, tree) -> list:
         # Find all a elements with an href attribute containing '/tables/'
         # Works for springer and nature.
-        a_elements = tree.xpath('//a[contains(@href, "/tables/")]')
+        a_elements = self.xpath('//a[contains(@href, "/tables/")]', tree)
         return a_elements
 
     def parse_meta(self):
@@ -79,7 +79,7 @@ class _springerTableParser(TableParser):
 
         # XPath of caption relative to the table element
         self.caption_rxpath = './/../../figcaption'
-        captions = table_element.xpath(self.caption_rxpath)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
@@ -87,7 +87,7 @@ class _springerTableParser(TableParser):
 
         # XPath of caption relative to the table element
         self.caption_rxpath = './/../../div[@class="Caption"]'
-        captions = table_element.xpath(self.caption_rxpath)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
@@ -1,4 +1,5 @@
 import re
+import math
 import logging
 import pandas as pd
 from lxml import etree, html
@@ -7,8 +8,59 @@ from ..text.normalize import innerText, normText
 
 log = logging.getLogger("tabular")
 
+# Strings of the pandas dataframe, missing values are nan or None.
+_infer_string = pd.get_option("future.infer_string")
+
+
+def _column_strings(values : list) -> list[str]:
+    """ Return the str of the cells of a table column as in the pandas
+        dataframe of the table, without building it. The missing cells
+        are None. Like pandas, the cells are scanned in order: the ints
+        after a missing cell are not range checked and make a float
+        column, ints out of the int64 and uint64 ranges make an object
+        column, and strings with missing cells are nan only if pandas
+        infers the string columns.
+    """
+    null = False
+    signed = unsigned = overflow = False
+    kinds = set()
+
+    for v in values:
+        if v is None:
+            null = True
+        elif type(v) is float:
+            kinds.add('nan' if v != v else 'float')
+        elif type(v) is int:
+            kinds.add('int')
+            if not null:
+                signed |= v < 0
+                unsigned |= v >= 2**63
+                if v < -2**63 or v >= 2**64 or (signed and unsigned):
+                    overflow = True
+        elif type(v) is str:
+            kinds.add('str')
+        else:
+            kinds.add('object')
+
+    if overflow or 'object' in kinds or not kinds:
+        return [str(v) for v in values]
+
+    if 'str' in kinds:
+        if _infer_string and kinds <= {'str', 'nan'}:
+            return [v if type(v) is str else 'nan' for v in values]
+        return [str(v) for v in values]
+
+    if null or kinds != {'int'}:
+        return [str(float(v)) if v is not None else 'nan' for v in values]
+
+    return [str(v) for v in values]
+
+
 class TableParser(object):
 
+    # Compiled XPath expressions, one registry per parser class.
+    _xpaths : dict[str, etree.XPath] = {}
+
     # Mapping for database table
     _mapping = {
         'body': 'table_body',
@@ -16,6 +68,10 @@ class TableParser(object):
         'tbl_index': 'index'
     }
 
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._xpaths = {}
+
     def __init__(self) -> None:
         self.body = None
         self.header = None
@@ -26,6 +82,7 @@ class TableParser(object):
         self.number = None
         self.url = None
         self.dataframe = None
+        self.rows = None
         self.date_added = datetime.now()
 
     @property
@@ -38,14 +95,26 @@ class TableParser(object):
 
     def is_valid(self):
         return self.caption is not None
+
+    def xpath(self, expr, node) -> list:
+        """ Evaluate a compiled XPath relative to a node. """
+        compiled = self._xpaths.get(expr)
+        if compiled is None:
+            compiled = self._xpaths[expr] = etree.XPath(expr)
+        return compiled(node)
     
     def parse(self, table_element):
         self.body = table_element
-        self.to_df() # build table df
-        val = self.dataframe.iloc[0, :].values
-        self.header = "\n".join([str(s) for s in val])
-        val = self.dataframe.iloc[:, 1].values
-        self.index = "\n".join([str(s) for s in val])
+        rows = self.to_rows() # build table rows
+        width = max(len(row) for row in rows) if rows else 0
+
+        # Same strings as the values of the pandas dataframe of the rows.
+        columns = [
+            _column_strings([row[c] if c < len(row) else None for row in rows])
+            for c in range(width)
+        ]
+        self.header = "\n".join([col[0] for col in columns])
+        self.index = "\n".join(columns[1] if width > 1 else [])
     
     def parse_number(self):
         regex = r"^Table (\d+|[IVXLCDM]+)[\.:]*"
@@ -100,8 +169,19 @@ class TableParser(object):
         Convert a table into pandas dataframe.
         
         """
-        if self.dataframe is not None:
-            return self.dataframe
+        if self.dataframe is None:
+            self.dataframe = pd.DataFrame(self.to_rows())
+        return self.dataframe
+
+    def to_rows(self) -> list[list]:
+        """
+        Convert a table into a list of rows. The first item of each row
+        is the block of the row (thead or tbody), followed by the cells.
+        Cells spanning multiple rows or columns are repeated.
+
+        """
+        if self.rows is not None:
+            return self.rows
 
         table = []
         block = 'tbody'
@@ -109,7 +189,13 @@ class TableParser(object):
         lastrowlen = None
         lastrowspan = 1
         col = 0
-        spanset = [[0,0,""]] * 100   # initilize space for elements
+        spanset = []    # [rowspan, colspan, text] of each column
+
+        def span(col) -> list:
+            # Grow the space for the elements as needed.
+            while len(spanset) <= col:
+                spanset.append([0, 0, ""])
+            return spanset[col]
 
         for tag in self.body.iter():
             # print(tag.tag, ": ", tag.text)
@@ -184,7 +270,7 @@ class TableParser(object):
                             pass
 
                 # if prev rowspan was more than 1
-                while spanset[col][0] > 1:
+                while span(col)[0] > 1:
                     
                     # reduce rowspan by 1
                     spanset[col][0] = spanset[col][0] - 1
@@ -200,13 +286,14 @@ class TableParser(object):
                 for i in range(colspan):
                     row.append(text)
                     # Store for the next rows
+                    span(col)
                     spanset[col] = [rowspan, colspan, text]
                     col += 1
                 # print(spanset)
 
         # Add the last row
         if row is not None:
-            if spanset[col][0] > 1:
+            if span(col)[0] > 1:
                 for _ in range(spanset[col][1]):
                     row.append(spanset[col][2])
                 spanset[col][0] = spanset[col][0] - 1
@@ -215,9 +302,34 @@ class TableParser(object):
             for i in range(lastrowspan):
                 table.append(row)
 
-        # Use pandas to convert to jsonl
-        self.dataframe = pd.DataFrame(table)
-        return self.dataframe
+        self.rows = table
+        return self.rows
+
+    def to_columns(self) -> dict:
+        """
+        Convert a table into a compact columnar form, serializable as JSON.
+        The blocks list the block of each row, and the columns list the
+        cells of each column. Missing cells are None, as are the nan and
+        infinite numbers, which are not valid JSON.
+
+        """
+        def cell(row, c):
+            if c >= len(row):
+                return None
+            value = row[c]
+            if isinstance(value, float) and not math.isfinite(value):
+                return None
+            return value
+
+        rows = self.to_rows()
+        width = max(len(row) for row in rows) - 1 if rows else 0
+        return {
+            'blocks': [row[0] for row in rows],
+            'columns': [
+                [cell(row, c) for row in rows]
+                for c in range(1, width + 1)
+            ],
+        }
     
     def to_jsonl(self) -> list[str]:
         """
@@ -245,8 +357,9 @@ class XMLTableParser(TableParser):
     def parse(self, table_element):
         super().parse(table_element)
 
-        labels = table_element.xpath(self.label_rxpath)
-        captions = table_element.xpath(self.caption_rxpath)
+        labels = self.xpath(self.label_rxpath, table_element)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
-            self.parse_caption_label(captions[0], labels[0])
+            label = labels[0] if len(labels) > 0 else None
+            self.parse_caption_label(captions[0], label)
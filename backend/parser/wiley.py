@@ -3,8 +3,8 @@ from .document import HTMLDocumentParser
 
 
 class WileyParser(HTMLDocumentParser):
-    def __init__(self, filepath) -> None:
-        super().__init__('wiley', filepath)
+    def __init__(self, filepath, contents=None) -> None:
+        super().__init__('wiley', filepath, contents)
         self.tableParser = _wileyTableParser
 
         # Meta
@@ -41,7 +41,7 @@ class _wileyTableParser(TableParser):
 
         # XPath of caption relative to the table element
         self.caption_rxpath = './/../../header'
-        captions = table_element.xpath(self.caption_rxpath)
+        captions = self.xpath(self.caption_rxpath, table_element)
 
         if len(captions) > 0:
             self.parse_caption_label(captions[0], label=None)
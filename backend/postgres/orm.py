@@ -4,7 +4,7 @@ from typing import Any, Optional, Dict, Literal, List
 from backend.postgres.base import ORMBase
 from sqlalchemy import (
     Text, JSON, ForeignKey, Integer, DateTime, Float,
-    ARRAY, VARCHAR, Boolean, String
+    ARRAY, VARCHAR, Boolean, String, Index, func, literal_column
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -78,6 +78,51 @@ class PaperCorpus(ORMBase):
         super().__init__(**kwargs)
 
 
+class ParsedFiles(ORMBase):
+    """
+    PostGres table containing the list of corpus files parsed into the
+    paper_texts table, used to reparse only the new or changed files.
+
+    Attributes:
+
+        doi:        DOI string of the paper. Null for the rows of the tar
+                    or zip shards, which record the shard size and mtime
+                    of the last complete incremental parse.
+
+        relpath:    Path of the file relative to the corpus root.
+
+        directory:  Directory name in corpus where the file can be found.
+
+        filebytes:  Size of the file in bytes when parsed.
+
+        filemtime:  Modification time of the file in epoch seconds when parsed.
+
+        fingerprint:
+                    Hash of the file contents when parsed, null for the
+                    shards.
+
+        parser_version:
+                    Version of the parser used, see `backend.parser.ParserVersion`.
+
+        paragraphs: Number of paragraphs found.
+
+    """
+
+    __tablename__ = "parsed_files"
+
+    doi: Mapped[Optional[str]] = mapped_column(Text, index=True)
+    relpath: Mapped[str] = mapped_column(Text, unique=True, index=True)
+    directory: Mapped[str] = mapped_column(Text, index=True)
+    filebytes: Mapped[int] = mapped_column(Integer, default=-1)
+    filemtime: Mapped[float] = mapped_column(Float, nullable=True)
+    fingerprint: Mapped[Optional[str]] = mapped_column(Text)
+    parser_version: Mapped[int] = mapped_column(Integer)
+    paragraphs: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+
 class FilteredPapers(ORMBase):
     """
     PostGres table to store the list of DOIs that passed a named filter,
@@ -180,6 +225,11 @@ class PaperTexts(ORMBase):
     """
 
     __tablename__ = "paper_texts"
+    __table_args__ = (
+        # Used to skip the existing texts during bulk inserts.
+        Index('ix_paper_texts_doi_md5', 'doi',
+              func.md5(literal_column('text'))),
+    )
 
     pid: Mapped[int] = mapped_column(ForeignKey("papers.id", ondelete='CASCADE'),
                         unique=False, index=True)
@@ -656,6 +706,23 @@ class CuratedData(ORMBase):
 
 
 class PaperTables(ORMBase):
+    """
+    PostGres table containing the tables parsed from the papers using the
+    `backend.parser` module.
+
+    Attributes:
+
+        pid:        ID ForeignKey from the papers table.
+
+        body:       Raw XML or HTML of the table element.
+
+        columns:    Cells of the table in columnar form, see
+                    `TableParser.to_columns()`.
+
+        descriptions: Sentences of the paper referring to the table.
+
+    """
+
     __tablename__ = "paper_tables"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -669,6 +736,7 @@ class PaperTables(ORMBase):
     tbl_index: Mapped[Optional[str]] = mapped_column(Text)
     body: Mapped[Optional[str]] = mapped_column(Text)
     jsonl: Mapped[Optional[str]] = mapped_column(Text)
+    columns: Mapped[Optional[Dict]] = mapped_column(JSON, nullable=True)
     descriptions: Mapped[Optional[ARRAY]] = mapped_column(ARRAY(Text, dimensions=1))
 
     pid: Mapped[int] = mapped_column(ForeignKey("papers.id", ondelete='CASCADE'),
@@ -680,6 +748,61 @@ class PaperTables(ORMBase):
             self.date_added = datetime.now()
 
 
+class ParsedTables(ORMBase):
+    """
+    PostGres table containing the list of papers whose tables were parsed
+    into the paper_tables table, including the papers without any table,
+    used to parse the tables of a paper only once.
+
+    Attributes:
+
+        pid:        ID ForeignKey from the papers table.
+
+        tables:     Number of tables found.
+
+        parser_version:
+                    Version of the parser used, see `backend.parser.ParserVersion`.
+
+    """
+
+    __tablename__ = "parsed_tables"
+
+    pid: Mapped[int] = mapped_column(ForeignKey("papers.id", ondelete='CASCADE'),
+                        unique=True, index=True)
+    tables: Mapped[int] = mapped_column(Integer, default=0)
+    parser_version: Mapped[int] = mapped_column(Integer)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+
+class NEROutputs(ORMBase):
+    """
+    PostGres table to cache the outputs of the NER model, so that a
+    paragraph text is passed through a model only once.
+
+    Attributes:
+        text_md5:   MD5 hash of the paragraph text.
+
+        model:      Version key of the NER model and of the windowing of
+                    the long texts, see `MaterialsBERT.init_local_model`.
+
+        entities:   List of the entity groups predicted by the model for
+                    the text.
+    """
+    __tablename__ = "ner_outputs"
+    __table_args__ = (
+        Index('ix_ner_outputs_md5_model', 'text_md5', 'model', unique=True),
+    )
+
+    text_md5: Mapped[str] = mapped_column(VARCHAR(length=32))
+    model: Mapped[str] = mapped_column(Text)
+    entities: Mapped[List[Dict]] = mapped_column(JSON, default=[])
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+
 if __name__ == "__main__":
     from backend import postgres, sett
 
@@ -1,4 +1,6 @@
 import pylogg
+import sqlalchemy as sa
+from datetime import datetime
 from backend.record_extraction.base_classes import (
     MaterialMention, PropertyValuePair, MaterialAmount
 )
@@ -273,3 +275,88 @@ def add_data_filter(db, filter_on : str, filter_name : str, table_name : str,
 
     filt.insert(db)
     return filt.id
+
+
+def add_paper_texts(db, rows : list[dict], batch_size : int = 1000) -> int:
+    """ Bulk insert paragraph texts into the paper_texts table, skipping the
+        texts already added for the same DOI. Each batch is written by a
+        single INSERT .. SELECT statement, deduplicated on the md5 hash of
+        the texts. Does not commit.
+
+        rows:       List of dicts with pid, doi, directory, doctype and text.
+        batch_size: Number of rows per statement.
+
+        Returns the number of inserted rows.
+    """
+    # Remove the duplicates within the rows.
+    seen = set()
+    unique = []
+    now = datetime.now()
+    for row in rows:
+        key = (row['doi'], row['text'])
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append((row['pid'], row['doi'], row['directory'],
+                       row['doctype'], row['text'], now))
+
+    pt = orm.PaperTexts
+    columns = ['pid', 'doi', 'directory', 'doctype', 'text', 'date_added']
+    inserted = 0
+
+    for i in range(0, len(unique), batch_size):
+        values = sa.values(
+            sa.column('pid', sa.Integer), sa.column('doi', sa.Text),
+            sa.column('directory', sa.Text), sa.column('doctype', sa.Text),
+            sa.column('text', sa.Text),
+            sa.column('date_added', sa.DateTime(timezone=True)),
+            name='new_texts',
+        ).data(unique[i:i + batch_size])
+
+        exists = sa.exists().where(
+            pt.doi == values.c.doi,
+            sa.func.md5(pt.text) == sa.func.md5(values.c.text))
+
+        select = sa.select(*[values.c[c] for c in columns]).where(~exists)
+        result = db.execute(sa.insert(pt).from_select(columns, select))
+        inserted += result.rowcount
+
+    log.trace("Inserted {} of {} paragraphs.", inserted, len(rows))
+    return inserted
+
+
+def add_filtered_paragraphs(db, rows : list[tuple[int, str]],
+                            batch_size : int = 1000) -> int:
+    """ Bulk insert paragraphs into the filtered_paragraphs table, skipping
+        the ones already added for the same filter. Each batch is written by
+        a single INSERT .. SELECT statement. Does not commit.
+
+        rows:       List of (para_id, filter_name) tuples.
+        batch_size: Number of rows per statement.
+
+        Returns the number of inserted rows.
+    """
+    unique = list(dict.fromkeys(rows))
+
+    fp = orm.FilteredParagraphs
+    columns = ['para_id', 'filter_name', 'date_added']
+    now = datetime.now()
+    inserted = 0
+
+    for i in range(0, len(unique), batch_size):
+        values = sa.values(
+            sa.column('para_id', sa.Integer), sa.column('filter_name', sa.Text),
+            sa.column('date_added', sa.DateTime(timezone=True)),
+            name='new_paragraphs',
+        ).data([(para_id, name, now) for para_id, name in unique[i:i + batch_size]])
+
+        exists = sa.exists().where(
+            fp.para_id == values.c.para_id,
+            fp.filter_name == values.c.filter_name)
+
+        select = sa.select(*[values.c[c] for c in columns]).where(~exists)
+        result = db.execute(sa.insert(fp).from_select(columns, select))
+        inserted += result.rowcount
+
+    log.trace("Inserted {} of {} filtered paragraphs.", inserted, len(rows))
+    return inserted
@@ -207,11 +207,13 @@ class SimilarShotSelector(ShotSelector):
             t2 = log.info("Computing text embeddings for {} text items.",
                         len(self.curated))
 
-            for para_id, data in self.curated.items():
-                text = self._get_relevant_sentences(data['text'],
-                                                    data['keywords'])
-                self.embeddings[para_id] = \
-                    self.tokenizer.get_text_embeddings(text)
+            para_ids = list(self.curated.keys())
+            texts = [
+                self._get_relevant_sentences(data['text'], data['keywords'])
+                for data in self.curated.values()
+            ]
+            embeddings = self.tokenizer.get_text_embeddings_batch(texts)
+            self.embeddings = dict(zip(para_ids, embeddings))
 
             t2.done("Embeddings computed.")
 
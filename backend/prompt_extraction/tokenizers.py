@@ -13,39 +13,34 @@ class Tokenizer:
     def get_text_embeddings(self, text : str) -> np.array:
         raise NotImplementedError
 
+    def get_text_embeddings_batch(self, texts : list[str],
+                                  batch_size : int = 16) -> list[np.array]:
+        """ Compute the embeddings for a list of texts. """
+        return [self.get_text_embeddings(text) for text in texts]
+
 
 class BertTokenizer(Tokenizer):
     def __init__(self, model : str, device : int = 0) -> None:
         super().__init__(model, device)
 
-        # Load model and tokenizer
-        from transformers import AutoTokenizer
-        from transformers import AutoModelForTokenClassification
-
-        t1 = log.trace("Loading bert model to device = {}.", device)
-        self.tokenizer = \
-            AutoTokenizer.from_pretrained(model, model_max_length=512)
+        # Load model and tokenizer, shared with the NER pipeline.
+        from backend.record_extraction import registry
 
-        self.model = AutoModelForTokenClassification.from_pretrained(model)
-        t1.done("Loaded bert model to device {}", device)
+        loaded = registry.load(model, device)
+        self.tokenizer = loaded.tokenizer
+        self.model = loaded.model
 
 
     def get_text_embeddings(self, text: str) -> np.array:
         """ Compute the embeddings for the given text.
             Returns a numpy array containing the text embeddings.
         """
-        import torch
-
-        # Tokenize the sentences
-        encoded_inputs = self.tokenizer(text, padding=True, truncation=True,
-                                        max_length=512, return_tensors='pt')
-
-        # Obtain the embeddings from the model.
-        # There may be more ways to do this,
-        # can use the CLS token embedding as well.
-        with torch.no_grad():
-            outputs = self.model(**encoded_inputs)
-            embeddings = outputs[0].mean(dim=1).squeeze(0)
-
-        return embeddings.numpy()
+        return self.get_text_embeddings_batch([text], batch_size=1)[0]
 
+    def get_text_embeddings_batch(self, texts : list[str],
+                                  batch_size : int = 16) -> list[np.array]:
+        """ Compute the embeddings for a list of texts in batches,
+            same as get_text_embeddings for each text.
+        """
+        from backend.record_extraction.embeddings import text_embeddings
+        return text_embeddings(self.tokenizer, self.model, texts, batch_size)
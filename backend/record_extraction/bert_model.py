@@ -1,102 +1,174 @@
-from collections import namedtuple
+import os
+import hashlib
 
-import spacy
-import torch
 import pylogg
-from transformers import (
-    AutoModelForTokenClassification, AutoTokenizer, pipeline
+
+from backend.record_extraction import registry, embeddings, utils, windows
+from backend.record_extraction.ner_cache import (
+    NERCache, text_hash, plain_entities
 )
 
 logger = pylogg.New('bert')
 
 
+def model_version(model: str) -> str:
+    """ Return a version key of a model, used to cache the model outputs.
+        For a local model directory, the key changes if the config or the
+        weight files change.
+    """
+    if not os.path.isdir(model):
+        return model
+
+    md5 = hashlib.md5()
+    for name in sorted(os.listdir(model)):
+        path = os.path.join(model, name)
+        if name == 'config.json':
+            with open(path, 'rb') as fp:
+                md5.update(fp.read())
+        elif name.endswith(('.bin', '.safetensors', '.pt', '.onnx')):
+            stat = os.stat(path)
+            md5.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+    name = os.path.basename(os.path.normpath(model))
+    return f"{name}@{md5.hexdigest()[:12]}"
+
+
 class MaterialsBERT:
     def __init__(self) -> None:
-        self.nlp = spacy.load("en_core_web_sm")
         self.model = None
         self.tokenizer = None
         self.pipeline = None
+        self.model_version = None
+        self.cache = None
+
+        # Long texts are split into windows of max_tokens tokens,
+        # overlapping by window_overlap tokens.
+        self.max_tokens = 510
+        self.window_overlap = 128
+
+    def init_local_model(self, model, device=0, backend='pytorch',
+                         quantize=False, onnx_dir=None):
+        """ Load the model, see `registry.load` for the backends. """
+        # Load model and tokenizer, shared with the other users of the
+        # same model and device.
+        loaded = registry.load(model, device, backend, quantize, onnx_dir)
+        self.tokenizer = loaded.tokenizer
+        self.model = loaded.model
+        self.pipeline = loaded.pipeline
+        self.max_tokens = self.tokenizer.model_max_length \
+            - self.tokenizer.num_special_tokens_to_add()
+
+        # Outputs of the different backends and windowings are cached
+        # separately, the older outputs of long texts were truncated.
+        self.model_version = model_version(model)
+        if backend == 'onnx':
+            self.model_version += '+onnx-int8' if quantize else '+onnx'
+        self.model_version += self.window_version()
 
-    def init_local_model(self, model, device=0):
-        # Load model and tokenizer
-        t1 = logger.trace("Loading bert model to device = {}.", device)
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            model, model_max_length=512)
-        self.model = AutoModelForTokenClassification.from_pretrained(model)
-        self.pipeline = pipeline(
-            task="ner", model=model, tokenizer=self.tokenizer,
-            aggregation_strategy="simple", device=device)
-        t1.done("Loaded bert model to device {}", device)
+    def window_version(self) -> str:
+        """ Return the suffix of the model version for the windowing of
+            the long texts.
+        """
+        return f"+w{self.max_tokens}/{self.window_overlap}"
+
+    def init_cache(self, db):
+        """ Reuse and store the NER outputs in postgres for the current
+            model version. Must be called after loading the model.
+        """
+        self.cache = NERCache(db, self.model_version)
+        logger.info("Using NER cache for model {}", self.model_version)
+
+    def text_windows(self, text: str) -> list[tuple[int, int]]:
+        """ Return the (start, end) char spans of the overlapping windows
+            of a text longer than max_tokens, [(0, len(text))] otherwise.
+        """
+        # A token has at least one char.
+        if len(text) <= self.max_tokens:
+            return [(0, len(text))]
+
+        offsets = self.tokenizer(
+            text, add_special_tokens=False,
+            return_offsets_mapping=True)['offset_mapping']
+        return windows.split_windows(
+            text, offsets, self.max_tokens, self.window_overlap)
+
+    def pipeline_batch(self, texts: list[str], batch_size: int = 16) -> list:
+        """ Run the NER pipeline on a list of texts in batches.
+            The texts are sorted by length so that each batch is padded
+            only up to its longest text. If the cache is initialized, only
+            the texts not in the cache are passed through the model.
+            The texts longer than the model limit are split into
+            overlapping windows, which are batched with the other texts,
+            and their entities are merged back to the char offsets of the
+            texts.
+            Returns the NER outputs in the order of the texts.
+        """
+        results = [None] * len(texts)
+
+        if self.cache is not None:
+            keys = [text_hash(text) for text in texts]
+            cached = self.cache.get(texts)
+            for i, key in enumerate(keys):
+                results[i] = cached.get(key)
+
+        missing = [i for i, output in enumerate(results) if output is None]
+        if not missing:
+            return results
+
+        # List of (text index, window start, window text).
+        pieces = [
+            (i, start, texts[i][start:end])
+            for i in missing for start, end in self.text_windows(texts[i])
+        ]
+        pieces.sort(key=lambda piece: len(piece[2]))
+        outputs = self.pipeline([piece[2] for piece in pieces],
+                                batch_size=batch_size)
+
+        grouped = {}
+        for (i, start, _), output in zip(pieces, outputs):
+            grouped.setdefault(i, []).append((start, plain_entities(output)))
+
+        for i, window_outputs in grouped.items():
+            if len(window_outputs) == 1:
+                results[i] = window_outputs[0][1]
+            else:
+                results[i] = windows.merge_entities(window_outputs)
+
+        if self.cache is not None:
+            self.cache.put({keys[i]: results[i] for i in missing})
+
+        return results
 
     def get_tags(self, text: str):
         """ Return NER labels for a text. """
-        tokens = self.pipeline(text)
+        tokens = self.pipeline_batch([text], batch_size=1)[0]
         return self._ner_feed(tokens, text)
-        # return ner_feed(tokens, text)
+
+    def get_tags_batch(self, texts: list[str], batch_size: int = 16) -> list:
+        """ Return the NER labels for a list of texts, same as get_tags
+            for each text, running the model in length sorted batches.
+        """
+        outputs = self.pipeline_batch(texts, batch_size)
+        return [self._ner_feed(tokens, text)
+                for tokens, text in zip(outputs, texts)]
 
     def get_text_embeddings(self, text: str):
         """ Compute the embeddings for the given text.
             Returns a numpy array containing the text embeddings.
         """
+        return self.get_text_embeddings_batch([text], batch_size=1)[0]
 
-        # Tokenize the sentences
-        encoded_inputs = self.tokenizer(text, padding=True, truncation=True,
-                                        max_length=512, return_tensors='pt')
-
-        # Obtain the embeddings from the model.
-        # There may be more ways to do this,
-        # can use the CLS token embedding as well.
-        with torch.no_grad():
-            outputs = self.model(**encoded_inputs)
-            embeddings = outputs[0].mean(dim=1).squeeze(0)
-
-        return embeddings.numpy()
+    def get_text_embeddings_batch(self, texts: list[str],
+                                  batch_size: int = 16) -> list:
+        """ Compute the embeddings for a list of texts in batches.
+            Returns a list of numpy arrays in the order of the texts.
+        """
+        return embeddings.text_embeddings(
+            self.tokenizer, self.model, texts, batch_size)
 
     def _ner_feed(self, seq_pred, text) -> list:
         """ Convert outputs of the NER to a form usable by record extraction
             seq_pred: List of dictionaries
             text: str, text fed to sequence classification model
         """
-        doc = self.nlp(text)
-        token_label = namedtuple('token_label', ["text", "label"])
-        if len(seq_pred) == 0:
-            # If no NER could be reconginzed, the prediction list would be empty.
-            return [token_label(doc[i].text, 'O') for i in range(len(doc))]
-
-        seq_index = 0
-        text_len = len(text)
-        seq_len = len(seq_pred)
-        len_doc = len(doc)
-        token = ''
-        token_labels = []
-        start_index = seq_pred[seq_index]["start"]
-        end_index = seq_pred[seq_index]["end"]
-        i = 0
-        char_index = -1
-
-        while i < len_doc:
-            token = doc[i].text
-            if char_index+1 >= start_index and seq_index < seq_len:
-                # Continue loop till end_index or end of word
-                # increment index and values
-                current_label = seq_pred[seq_index]["entity_group"]
-                while char_index < end_index-1:
-                    token_labels.append(token_label(token, current_label))
-                    char_index += len(token)
-                    if char_index < text_len-1 and text[char_index+1] == ' ':
-                        char_index += 1
-                    i += 1
-                    if i < len_doc:
-                        token = doc[i].text
-                seq_index += 1
-                if seq_index < seq_len:
-                    start_index = seq_pred[seq_index]["start"]
-                    end_index = seq_pred[seq_index]["end"]
-            else:
-                token_labels.append(token_label(token, 'O'))
-                i += 1
-                char_index += len(token)
-                if char_index < text_len-1 and text[char_index+1] == ' ':
-                    char_index += 1
-
-        return token_labels
+        return utils.ner_feed(seq_pred, text)
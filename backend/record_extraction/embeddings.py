@@ -0,0 +1,53 @@
+"""
+Text embeddings from the outputs of a BERT model, computed in batches.
+
+"""
+import numpy as np
+
+
+def mean_pooling(token_embeddings, attention_mask):
+    """ Mean of the token embeddings of each text over its non-padding
+        tokens only.
+    """
+    mask = attention_mask.unsqueeze(-1).to(token_embeddings.dtype)
+    summed = (token_embeddings * mask).sum(dim=1)
+    counts = mask.sum(dim=1).clamp(min=1)
+    return summed / counts
+
+
+def text_embeddings(tokenizer, model, texts : list[str],
+                    batch_size : int = 16) -> list[np.ndarray]:
+    """ Compute the embeddings of a list of texts.
+        The texts are bucketed by their number of tokens, so that each batch
+        is padded only up to its longest text. The padding is excluded from
+        the mean, so the embeddings match the ones computed one by one.
+        Returns the embeddings in the order of the texts.
+    """
+    import torch
+
+    if not texts:
+        return []
+
+    lengths = [
+        len(ids) for ids in tokenizer(
+            texts, truncation=True, max_length=512)['input_ids']
+    ]
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+    results = [None] * len(texts)
+
+    with torch.no_grad():
+        for start in range(0, len(order), max(batch_size, 1)):
+            batch = order[start : start + batch_size]
+            encoded_inputs = tokenizer(
+                [texts[i] for i in batch], padding=True, truncation=True,
+                max_length=512, return_tensors='pt').to(model.device)
+
+            # There may be more ways to do this,
+            # can use the CLS token embedding as well.
+            outputs = model(**encoded_inputs)
+            pooled = mean_pooling(outputs[0], encoded_inputs['attention_mask'])
+
+            for i, embeddings in zip(batch, pooled.cpu().numpy()):
+                results[i] = embeddings
+
+    return results
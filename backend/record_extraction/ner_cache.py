@@ -0,0 +1,87 @@
+"""
+Persistent cache of the NER model outputs, keyed on the paragraph text
+and the model version. Stored in the ner_outputs table of postgres.
+
+"""
+
+import hashlib
+import pylogg
+from datetime import datetime
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
+from backend.postgres.orm import NEROutputs
+
+log = pylogg.New('ner-cache')
+
+
+def text_hash(text : str) -> str:
+    """ Return the cache key of a text. Same as md5(text) in postgres. """
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def plain_entities(ner_output : list[dict]) -> list[dict]:
+    """ Convert the numpy values of the NER pipeline outputs to python. """
+    return [
+        {k: v.item() if hasattr(v, 'item') else v for k, v in entity.items()}
+        for entity in ner_output
+    ]
+
+
+class NERCache:
+    """ Lookup and store the NER outputs of a model in postgres.
+
+    Args:
+        db:         PostGres session. Stored outputs are committed.
+        model:      Version key of the NER model.
+        batch_size: Number of hashes per lookup query.
+
+    """
+
+    def __init__(self, db, model : str, batch_size : int = 1000) -> None:
+        self.db = db
+        self.model = model
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, texts : list[str]) -> dict[str, list[dict]]:
+        """ Return the cached outputs of the texts, keyed by text hash. """
+        keys = list(dict.fromkeys(text_hash(text) for text in texts))
+        found = {}
+        for i in range(0, len(keys), self.batch_size):
+            query = sa.select(NEROutputs.text_md5, NEROutputs.entities).where(
+                NEROutputs.model == self.model,
+                NEROutputs.text_md5.in_(keys[i : i + self.batch_size]))
+            found.update(self.db.execute(query).all())
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, outputs : dict[str, list[dict]]):
+        """ Store the outputs keyed by text hash, skip the existing ones. """
+        if not outputs:
+            return
+
+        now = datetime.now()
+        rows = [
+            {'text_md5': key, 'model': self.model, 'entities': entities,
+             'date_added': now}
+            for key, entities in outputs.items()
+        ]
+        stmt = insert(NEROutputs).on_conflict_do_nothing(
+            index_elements=['text_md5', 'model'])
+        try:
+            self.db.execute(stmt, rows)
+        except Exception:
+            self.db.rollback()
+            raise
+
+        NEROutputs.commit(self.db)
+        log.trace("Stored {} NER outputs for {}.", len(rows), self.model)
+
+    def stats(self) -> str:
+        total = max(self.hits + self.misses, 1)
+        return "{} hits, {} misses ({:.1f}% hit rate)".format(
+            self.hits, self.misses, 100 * self.hits / total)
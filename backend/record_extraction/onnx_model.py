@@ -0,0 +1,73 @@
+"""
+ONNX Runtime backend of the BERT token classification models, for CPU only
+nodes. The model is exported to ONNX once, optionally with dynamic int8
+quantization, and loaded as a drop in replacement of the PyTorch model in
+the Hugging Face pipeline.
+
+Requires the optimum[onnxruntime] package.
+
+"""
+import os
+import pylogg
+
+log = pylogg.New('onnx')
+
+ModelFile = 'model.onnx'
+QuantizedFile = 'model_quantized.onnx'
+
+
+def _optimum():
+    try:
+        from optimum import onnxruntime
+    except ImportError:
+        log.critical("ONNX backend requires: pip install optimum[onnxruntime]")
+        raise
+    return onnxruntime
+
+
+def export_dir(model : str, onnx_dir : str = None) -> str:
+    """ Directory to save the exported ONNX files of a model. """
+    if onnx_dir:
+        return onnx_dir
+    name = os.path.basename(os.path.normpath(model))
+    return os.path.join('models', 'onnx', name)
+
+
+def export(model : str, onnx_dir : str = None, quantize : bool = False) -> tuple[str, str]:
+    """ Export a model to ONNX and optionally quantize the weights to int8,
+        if not already done. Returns the (directory, file name) of the
+        ONNX model.
+    """
+    ort = _optimum()
+    output = export_dir(model, onnx_dir)
+
+    if not os.path.isfile(os.path.join(output, ModelFile)):
+        t1 = log.info("Exporting {} to ONNX: {}", model, output)
+        exported = ort.ORTModelForTokenClassification.from_pretrained(
+            model, export=True)
+        exported.save_pretrained(output)
+        t1.done("Exported {} to ONNX.", model)
+
+    if not quantize:
+        return output, ModelFile
+
+    if not os.path.isfile(os.path.join(output, QuantizedFile)):
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        t1 = log.info("Quantizing {} to int8.", output)
+        quantizer = ort.ORTQuantizer.from_pretrained(output, file_name=ModelFile)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=output, quantization_config=qconfig)
+        t1.done("Saved {}", os.path.join(output, QuantizedFile))
+
+    return output, QuantizedFile
+
+
+def load(model : str, onnx_dir : str = None, quantize : bool = False):
+    """ Load the ONNX Runtime token classification model of a model,
+        exporting it first if needed.
+    """
+    ort = _optimum()
+    output, file_name = export(model, onnx_dir, quantize)
+    return ort.ORTModelForTokenClassification.from_pretrained(
+        output, file_name=file_name)
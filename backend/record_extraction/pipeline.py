@@ -18,8 +18,10 @@ class NERPipeline:
         log.trace("Initialized {}", self.__class__.__name__)
 
 
-    def run(self, paragraph : PaperTexts) -> int:
+    def run(self, paragraph : PaperTexts, ner_tags : list = None) -> int:
         """ Run the NER pipeline on a given paragraph.
+            ner_tags:   Optional NER labels of the paragraph text, if
+                        already computed by `bert.get_tags_batch`.
             Returns the number of records found.
         """
         t2 = log.trace("Processing paragraph.")
@@ -27,7 +29,7 @@ class NERPipeline:
         records = []
 
         # Get the output dictionary.
-        ner_output = self._extract_data(paragraph.text)
+        ner_output = self._extract_data(paragraph.text, ner_tags)
         if ner_output is False:
             log.info("Text is not relevant, no output.")
             return
@@ -45,14 +47,15 @@ class NERPipeline:
         return newfound
 
 
-    def _extract_data(self, text : str) -> dict:
+    def _extract_data(self, text : str, ner_tags : list = None) -> dict:
         """ Extract data from a text by passing through the materials bert
             NER pipeline.
 
             Returns the extracted dictionary of polymer family, monomers,
             and records containing materials, amounts, properties etc.
         """
-        ner_tags = self.bert.get_tags(text)
+        if ner_tags is None:
+            ner_tags = self.bert.get_tags(text)
         relation_extractor = record_extractor.RelationExtraction(
             text, ner_tags, self.norm_dataset, self.prop_meta_file)
         output_para, timings = relation_extractor.process_document()
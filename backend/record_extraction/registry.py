@@ -0,0 +1,83 @@
+"""
+Registry of the loaded BERT models. The NER pipeline, the text embeddings
+and the shot selectors of a process share one copy of the weights for
+each model and device.
+
+"""
+import os
+import pylogg
+from collections import namedtuple
+
+log = pylogg.New('bert')
+
+LoadedModel = namedtuple('LoadedModel', ['tokenizer', 'model', 'pipeline'])
+
+_models : dict[tuple, LoadedModel] = {}
+
+
+def load(model : str, device : int = 0, backend : str = 'pytorch',
+         quantize : bool = False, onnx_dir : str = None) -> LoadedModel:
+    """ Return the tokenizer, the token classification model and the NER
+        pipeline of a model path or hub name on a device, loading them only
+        the first time.
+
+        backend:    'pytorch', or 'onnx' to run the exported model with
+                    ONNX Runtime on the CPU, ignoring the device.
+        quantize:   Use the dynamic int8 quantized ONNX model.
+        onnx_dir:   Directory of the exported ONNX model.
+    """
+    if backend not in ('pytorch', 'onnx'):
+        raise ValueError("Invalid NER backend", backend)
+
+    if os.path.isdir(model):
+        model = os.path.abspath(model)
+
+    if backend == 'onnx':
+        device = -1
+    else:
+        quantize = False
+
+    key = (model, device, backend, quantize)
+    if key in _models:
+        log.trace("Reusing bert model {} on device {}.", model, device)
+        return _models[key]
+
+    from transformers import (
+        AutoModelForTokenClassification, AutoTokenizer, pipeline
+    )
+
+    t1 = log.trace("Loading bert model to device = {} ({}).", device, backend)
+    tokenizer = AutoTokenizer.from_pretrained(model, model_max_length=512)
+
+    if backend == 'onnx':
+        from backend.record_extraction import onnx_model
+        bert = onnx_model.load(model, onnx_dir, quantize)
+        ner = pipeline(
+            task="ner", model=bert, tokenizer=tokenizer,
+            aggregation_strategy="simple")
+    else:
+        bert = AutoModelForTokenClassification.from_pretrained(model)
+        bert.eval()
+
+        # The pipeline moves the model to the device, it does not copy it.
+        ner = pipeline(
+            task="ner", model=bert, tokenizer=tokenizer,
+            aggregation_strategy="simple", device=device)
+
+    t1.done("Loaded bert model to device {} ({})", device, backend)
+
+    _models[key] = LoadedModel(tokenizer, ner.model, ner)
+    return _models[key]
+
+
+def unload(model : str = None, device : int = None):
+    """ Release the registered models, all of them by default. """
+    if model is not None and os.path.isdir(model):
+        model = os.path.abspath(model)
+
+    for key in list(_models):
+        if model is not None and key[0] != model:
+            continue
+        if device is not None and key[1] != device:
+            continue
+        del _models[key]
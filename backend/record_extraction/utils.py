@@ -65,48 +65,43 @@ def process_sentence(grouped_spans, callback, sentence_limit=None):
             # Process the sentence to extract propery value pairs
 
 
+token_label = namedtuple('token_label', ["text", "label"])
+
+_word_splitter = None
+
+
+def word_spans(text : str) -> list[tuple[str, int]]:
+    """ Split a text into (word, char offset) pairs, using only the rule
+        based English tokenizer of spaCy. Gives the same words as the
+        tokenizer of the en_core_web_sm model, without loading a model.
+    """
+    global _word_splitter
+    if _word_splitter is None:
+        _word_splitter = spacy.blank("en").tokenizer
+    return [(token.text, token.idx) for token in _word_splitter(text)]
+
+
 def ner_feed(seq_pred, text):
     """Convert outputs of the NER to a form usable by record extraction
         seq_pred: List of dictionaries
         text: str, text fed to sequence classification model
+
+        Each word is labeled by the entity group whose char span contains
+        the start of the word, 'O' otherwise.
     """
-    seq_index = 0
-    text_len = len(text)
-    seq_len = len(seq_pred)
-    start_index = seq_pred[seq_index]["start"]
-    end_index = seq_pred[seq_index]["end"]
-    nlp = spacy.load("en_core_web_sm")
-    doc = nlp(text)
-    len_doc = len(doc)
-    token = ''
     token_labels = []
-    token_label = namedtuple('token_label', ["text", "label"])
-    i = 0
-    char_index = -1
-    while i < len_doc:
-        token = doc[i].text
-        if char_index+1 >= start_index and seq_index < seq_len:
-            # Continue loop till end_index or end of word
-            # increment index and values
-            current_label = seq_pred[seq_index]["entity_group"]
-            while char_index < end_index-1:
-                token_labels.append(token_label(token, current_label))
-                char_index += len(token)
-                if char_index < text_len-1 and text[char_index+1] == ' ':
-                    char_index += 1
-                i += 1
-                if i < len_doc:
-                    token = doc[i].text
+    seq_len = len(seq_pred)
+    seq_index = 0
+
+    for word, start in word_spans(text):
+        # Skip the entities ending before the word.
+        while seq_index < seq_len and seq_pred[seq_index]["end"] <= start:
             seq_index += 1
-            if seq_index < seq_len:
-                start_index = seq_pred[seq_index]["start"]
-                end_index = seq_pred[seq_index]["end"]
-        else:
-            token_labels.append(token_label(token, 'O'))
-            i += 1
-            char_index += len(token)
-            if char_index < text_len-1 and text[char_index+1] == ' ':
-                char_index += 1
+
+        label = 'O'
+        if seq_index < seq_len and seq_pred[seq_index]["start"] <= start:
+            label = seq_pred[seq_index]["entity_group"]
+        token_labels.append(token_label(word, label))
 
     return token_labels
 
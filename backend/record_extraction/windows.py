@@ -0,0 +1,80 @@
+"""
+Sliding windows over the long texts for the NER model, and merging of the
+entities found in the windows back to the text.
+
+"""
+
+
+def _word_start(text : str, offsets : list, i : int) -> bool:
+    """ True if the i-th token starts after a whitespace. """
+    return i == 0 or offsets[i][0] > offsets[i - 1][1]
+
+
+def split_windows(text : str, offsets : list[tuple[int, int]], size : int,
+                  overlap : int) -> list[tuple[int, int]]:
+    """ Split a text into overlapping windows of at most size tokens.
+        The windows start and end at whitespace if possible, so that the
+        tokens of a window are the same as the tokens of the text.
+
+        offsets:    Char offsets of the tokens of the text, without the
+                    special tokens.
+        overlap:    Number of tokens shared by consecutive windows.
+
+        Returns the list of (start, end) char spans of the windows.
+    """
+    n = len(offsets)
+    if n <= size:
+        return [(0, len(text))]
+
+    windows = []
+    start = 0
+    while True:
+        end = min(start + size, n)
+
+        # Do not cut a word at the end of the window.
+        if end < n:
+            i = end
+            while i > start + 1 and not _word_start(text, offsets, i):
+                i -= 1
+            if i > start + 1:
+                end = i
+
+        windows.append((offsets[start][0], offsets[end - 1][1]))
+        if end >= n:
+            break
+
+        # Start the next window at a word inside the overlap.
+        nxt = max(end - overlap, start + 1)
+        i = nxt
+        while i > start + 1 and not _word_start(text, offsets, i):
+            i -= 1
+        start = i if i > start + 1 else nxt
+
+    return windows
+
+
+def merge_entities(window_outputs : list[tuple[int, list[dict]]]) -> list[dict]:
+    """ Merge the NER outputs of the windows of a text.
+        The entity spans are shifted to the char offsets of the text, and
+        the overlapping entities found by more than one window are resolved
+        by keeping the one with the highest score.
+
+        window_outputs: List of (window char start, entities of the window).
+
+        Returns the entities ordered by their start.
+    """
+    entities = []
+    for offset, output in window_outputs:
+        for entity in output:
+            entity = dict(entity)
+            entity['start'] += offset
+            entity['end'] += offset
+            entities.append(entity)
+
+    kept = []
+    for entity in sorted(entities, key=lambda e: -e.get('score', 0)):
+        if all(entity['end'] <= k['start'] or entity['start'] >= k['end']
+               for k in kept):
+            kept.append(entity)
+
+    return sorted(kept, key=lambda e: e['start'])
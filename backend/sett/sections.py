@@ -33,6 +33,18 @@ class ner_pipeline:
     pytorch_device : int = 0
     """ GPU id to load the BERT model. """
 
+    use_cache : bool = True
+    """ Reuse the NER outputs stored in the ner_outputs table. """
+
+    backend : str = 'pytorch'
+    """ Inference backend of the BERT model, pytorch or onnx (CPU only). """
+
+    onnx_quantize : bool = False
+    """ Use dynamic int8 quantization with the onnx backend. """
+
+    onnx_dir : str = None
+    """ Directory to export the onnx model. Default: models/onnx/<model> """
+
 
 @dataclass
 class full_text_parse:
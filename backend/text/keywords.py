@@ -0,0 +1,73 @@
+"""
+Module for multi-keyword search.
+
+"""
+from collections import deque
+
+
+class KeywordAutomaton:
+    """ Aho-Corasick automaton to find the labels whose keywords occur in a
+    text, scanning the text only once regardless of the number of keywords.
+
+    Args:
+        keywords:   Mapping of label -> list of keywords. The keywords are
+                    matched as case sensitive substrings.
+
+    """
+
+    def __init__(self, keywords : dict[str, list[str]]) -> None:
+        # Keyword trie
+        goto : list[dict[str, int]] = [{}]
+        out : list[set] = [set()]
+
+        for label, words in keywords.items():
+            for word in words or []:
+                if not word:
+                    continue
+                state = 0
+                for ch in word:
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        out.append(set())
+                    state = nxt
+                out[state].add(label)
+
+        # Resolve the failure links breadth first into a deterministic
+        # automaton, every state keeps the transitions of its failure state.
+        fail = [0] * len(goto)
+        delta : list[dict[str, int]] = [{}] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            parent_fail = fail[state]
+            out[state] |= out[parent_fail]
+            delta[state] = {**delta[parent_fail], **goto[state]}
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[parent_fail].get(ch, 0)
+                queue.append(nxt)
+
+        self._delta = delta
+        self._out = [frozenset(labels) if labels else None for labels in out]
+        self.labels = set(keywords.keys())
+        self.keywords = {label: list(words or []) for label, words in keywords.items()}
+
+    def __len__(self) -> int:
+        """ Number of states of the automaton. """
+        return len(self._delta)
+
+    def find(self, text : str) -> set:
+        """ Return the set of labels with at least one keyword in the text. """
+        found = set()
+        delta = self._delta
+        out = self._out
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state] is not None:
+                found |= out[state]
+        return found
@@ -26,12 +26,23 @@ def asciiText(unicode_text: str):
     raise RuntimeError("Please use TextNormalizer.")
 
 
+# Characters that TextNormalizer.norm_chars removes or turns into spaces.
+BLANK_CHARS = ''.join(chr(c) for c in range(0x3001) if chr(c).isspace()) \
+    + 'Â\x80\x86\x88\x89\x90\x92\x93\x94\x97\x98\x99\x8d\x9c\x9d\x96\x8bÃ¶Ä¤'
+
+
 def normText(text: str):
     """ Normalize a string to remove extra spaces and special characters etc."""
     norm = TextNormalizer()
     return norm.norm_chars(text)
 
 
+def replaceChars(text: str):
+    """ Replace the special characters like normText, keeping the spaces. """
+    norm = TextNormalizer()
+    return norm.replace_chars(text)
+
+
 def innerText(elem):
     """ Return the innerText of a XML element. Normalize using normText. """
     value = etree.tostring(elem, method="text", encoding="unicode")
@@ -74,81 +85,126 @@ class TextNormalizer:
         Filter multiple spaces in between and trailing whitespaces
     """
 
-    def __init__(self):
-        self.TILDES = {
-            '~',  # \u007e Tilde
-            '˜',  # \u02dc Small tilde
-            '⁓',  # \u2053 Swung dash
-            '∼',  # \u223c Tilde operator
-            '∽',  # \u223d Reversed tilde
-            '∿',  # \u223f Sine wave
-            '〜',  # \u301c Wave dash
-            '～',  # \uff5e Full-width tilde
-        }
-        self.SLASHES = {
-            '/',  # \u002f Solidus
-            '⁄',  # \u2044 Fraction slash
-            '∕',  # \u2215 Division slash
-        }
-        self.CONTROLS = {
-            '\u0001', '\u0002', '\u0003', '\u0004', '\u0005', '\u0006',
-            '\u0007', '\u0008', '\u000e', '\u000f', '\u0011', '\u0012',
-            '\u0013', '\u0014', '\u0015', '\u0016', '\u0017', '\u0018',
-            '\u0019', '\u001a', '\u001b',
-        }
-        self.replace_char_list = ['[]', '[,]', '()', '( )', '[ ]', ' - ']
-        self.remove_dot_list = [
-            'Dr.', 'Mr.', ',Mrs.', 'et al.', 'cf.', 'viz.', 'etc.', 'Corp.',
-            'Inc.', 'spp.', 'Co.', 'Ltd.', 'eg.', 'ex.',
-        ]
-        self.remove_all_dot_list = ['A.R.', 'A. R.', 'i.e.', 'e.g.']
-
-        # unicode character codes
-        self.degrees = [186, 730, 778, 8304, 8728,
-                        9702, 9675]  
-        self.to_remove = [775, 8224, 8234, 8855, 8482, 9839]
-
-        self.formatting = [i for i in range(
-            8288, 8298)] + [i for i in range(8299, 8304)] + [i for i in range(8232, 8239)]
-
-        self.re_copyright = re.compile(
-            r'© \d{4} .+', flags=re.UNICODE | re.IGNORECASE)
-
-        self.re_consecutive_spaces = re.compile(
-            r'\s+', flags=re.UNICODE | re.IGNORECASE)
+    TILDES = {
+        '~',  # \u007e Tilde
+        '˜',  # \u02dc Small tilde
+        '⁓',  # \u2053 Swung dash
+        '∼',  # \u223c Tilde operator
+        '∽',  # \u223d Reversed tilde
+        '∿',  # \u223f Sine wave
+        '〜',  # \u301c Wave dash
+        '～',  # \uff5e Full-width tilde
+    }
+    SLASHES = {
+        '/',  # \u002f Solidus
+        '⁄',  # \u2044 Fraction slash
+        '∕',  # \u2215 Division slash
+    }
+    CONTROLS = {
+        '\u0001', '\u0002', '\u0003', '\u0004', '\u0005', '\u0006',
+        '\u0007', '\u0008', '\u000e', '\u000f', '\u0011', '\u0012',
+        '\u0013', '\u0014', '\u0015', '\u0016', '\u0017', '\u0018',
+        '\u0019', '\u001a', '\u001b',
+    }
+    replace_char_list = ['[]', '[,]', '()', '( )', '[ ]', ' - ']
+    remove_dot_list = [
+        'Dr.', 'Mr.', ',Mrs.', 'et al.', 'cf.', 'viz.', 'etc.', 'Corp.',
+        'Inc.', 'spp.', 'Co.', 'Ltd.', 'eg.', 'ex.',
+    ]
+    remove_all_dot_list = ['A.R.', 'A. R.', 'i.e.', 'e.g.']
+
+    # unicode character codes
+    degrees = [186, 730, 778, 8304, 8728, 9702, 9675]
+    to_remove = [775, 8224, 8234, 8855, 8482, 9839]
+
+    formatting = [i for i in range(8288, 8298)] \
+        + [i for i in range(8299, 8304)] + [i for i in range(8232, 8239)]
+
+    re_copyright = re.compile(
+        r'© \d{4} .+', flags=re.UNICODE | re.IGNORECASE)
+
+    re_consecutive_spaces = re.compile(
+        r'\s+', flags=re.UNICODE | re.IGNORECASE)
+
+    # Compiled tables and patterns of normalize, built once.
+    _remove_table = str.maketrans({c: None for c in to_remove})
+    _degree_table = str.maketrans({c: chr(176) for c in degrees})
+    _space_table = str.maketrans({
+        '\u000b': ' ', '\u000c': ' ', '\u0085': ' ', '\u2028': ' ',
+        '\u2029': ' ', '\r': ' ', '\n': ' '})
+    _nonunidec_table = str.maketrans({
+        **{c: None for c in formatting},
+        **{c: '~' for c in TILDES},
+        **{c: '/' for c in SLASHES},
+        **{c: None for c in CONTROLS},
+    })
+
+    # Urls need a scheme or www, the short urls a domain followed by a /.
+    _re_url_hint = re.compile(r'://|www|\.[a-z]+/', flags=re.IGNORECASE)
+
+    # Spaces before the sup/sub scripts, the NMR terms, spaces before the
+    # closing brackets of the superscripts.
+    _re_script_spaces = re.compile(r'\s+((?:\^|_){\w*})')
+    _re_nmr_terms = re.compile(r'(\^\{(?:1\}H|13\}C|7\}Li))')
+    _re_sup_close = re.compile(r'(\^{\w*)\s+}')
+
+    # Figures, references, and et al. citations.
+    _re_fig_ref = re.compile(
+        r'Fig.\s*([0-9]+)|[Rr]ef.\s*([0-9]+)|\sal\.\s*[0-9\s]+')
+
+    _re_space_comma = re.compile(r'\s+,')
+    _re_thousands = re.compile(r'([1-9]),([0-9]{3})')
+    _re_equals = re.compile(r'(\w+)=(\d+)')
+    _re_open_paren = re.compile(r'\(\s+')
+    _re_number_comma = re.compile(r'(\d+),([A-Za-z])')
+    _re_fraction = re.compile(r'[-]?\d+[/]\d+')
+
+    _chem_names = {'sulph': 'sulf', 'aluminum': 'aluminium',
+                   'cesium': 'caesium'}
+    _re_chem_names = re.compile('|'.join(_chem_names), flags=re.I)
+
+    class _UnidecodeTable(dict):
+        """ Per codepoint unidecode results, computed on first use. """
+        _keep = re.compile(u'[Α-Ωα-ωÅ°±≈⋯∞∆ϵ⋅≫≡≅≃∙≠]')
+
+        def __missing__(self, code : int) -> str:
+            char = chr(code)
+            if self._keep.match(char) is not None:
+                value = char
+            else:
+                value = str(unidecode.unidecode_expect_nonascii(char))
+            self[code] = value
+            return value
+
+    _unidecode_table = _UnidecodeTable()
 
     def normalize(self, text, unidec=True, chem=True, spaces=True, fig_ref=True,
                   numbers=False, lower_case=False):
         # Use a bunch of textacy functions to pre-process.
         text = html.unescape(text)
-        text = preprocessing.replace.emails(text)
-        text = preprocessing.replace.urls(text)
+        # Emails need an @, see _re_url_hint for the urls.
+        if '@' in text:
+            text = preprocessing.replace.emails(text)
+        if self._re_url_hint.search(text):
+            text = preprocessing.replace.urls(text)
 
         for char_seq in self.replace_char_list:
             text = text.replace(char_seq, '')
 
         # Remove some boiler plate symbols
-        re_str = ''.join([chr(c) for c in self.to_remove])
-        re_str = '[' + re_str + ']'
-        text = re.sub(re_str, '', text)
+        text = text.translate(self._remove_table)
 
         # Replaces empty brackets that are left over from removing references after parsing the HTML
         for chr_seq in self.remove_dot_list:
             text = text.replace(chr_seq, chr_seq[:-1])
 
-        # Fixes issues where the superscript and variable might have a space between them
-        text = re.sub(r'\s+(\^{\w*})', '\\1', text)
+        # Fixes issues where the superscript/subscript and variable might have a space between them
+        text = self._re_script_spaces.sub('\\1', text)
         # Fix the cases where NMR related terms get clubbed with previous terms
-        text = re.sub(r'(\^\{1\}H)', ' \\1', text)
         # TODO: There must be other terms which get similarly clubbed
-        text = re.sub(r'(\^\{13\}C)', ' \\1', text)
-        text = re.sub(r'(\^\{7\}Li)', ' \\1', text)
-        # Fixes issues where the subscript and variable might have a space between them
-        text = re.sub(r'\s+(_{\w*})', '\\1', text)
+        text = self._re_nmr_terms.sub(' \\1', text)
         # Fixes issues where the end bracket and variable in superscript might have a space between them
-        text = re.sub(r'(\^{\w*)\s+}', '\\1}', text)
-        # Fixes issues where the end bracket and variable in subscript might have a space between them
-        text = re.sub(r'(_{\w*\s+)}', '\\1}', text)
+        text = self._re_sup_close.sub('\\1}', text)
 
         # Removes dots as they may cause problems in recognizing sentences
         for chr_seq in self.remove_all_dot_list:
@@ -157,8 +213,7 @@ class TextNormalizer:
 
         # TextCleanup inspired code
         # Degree normalization
-        re_str = '[' + ''.join([chr(c) for c in self.degrees]) + ']'
-        text = re.sub(re_str, chr(176), text)
+        text = text.translate(self._degree_table)
         text = text.replace('° C', '°C')
         text = text.replace('°C', ' °C')
 
@@ -167,28 +222,22 @@ class TextNormalizer:
 
         # Figure and references
         if fig_ref:
-            text = re.sub(r'Fig.\s*([0-9]+)', 'Figure \\1', text)
-            text = re.sub(r'[Rr]ef.\s*([0-9]+)', 'reference \\1', text)
-            text = re.sub(r'\sal\.\s*[0-9\s]+', ' al ', text)
+            text = self._re_fig_ref.sub(self._fig_ref, text)
 
         # Normalizing spaces
         if spaces:
-            text = text.replace('\u000b', ' ').replace(
-                '\u000c', ' ').replace(u'\u0085', ' ')
-            text = text.replace('\u2028', '\n').replace(
-                '\u2029', '\n').replace('\r\n', '\n').replace('\r', '\n')
-            text = text.replace('\n', ' ')
+            text = text.replace('\r\n', '\n').translate(self._space_table)
 
-            text = re.sub(r'\s+,', ',', text)
+            text = self._re_space_comma.sub(',', text)
             # remove coma in thousands
-            text = re.sub(r'([1-9]),([0-9]{3})', '\\1\\2', text)
+            text = self._re_thousands.sub('\\1\\2', text)
             # Put a space around = to sign everywhere
-            text = re.sub(r'(\w+)=(\d+)', '\\1 = \\2', text)
-            text = re.sub(r'\(\s+', '(', text)
+            text = self._re_equals.sub('\\1 = \\2', text)
+            text = self._re_open_paren.sub('(', text)
             text = text.replace('%', ' %')  # Normalize % character
             # Multiple spaces before a bracket
-            text = text.replace('\s+)', ')')
-            text = re.sub(r'(\d+),([A-Za-z])', '\\1, \\2', text)
+            text = text.replace('\\s+)', ')')
+            text = self._re_number_comma.sub('\\1, \\2', text)
 
         if chem:
             text = self.chem_normalizer(text)
@@ -204,23 +253,12 @@ class TextNormalizer:
             text = preprocessing.remove.remove_accents(text)
             text = text.replace('…', '...').replace(' . . . ', ' ... ')
 
-            re_str = ''.join([chr(c) for c in self.formatting])
-            re_str = '[' + re_str + ']'
-            text = re.sub(re_str, '', text)
-
-            for tilde in self.TILDES:
-                text = text.replace(tilde, '~')
-
-            for slash in self.SLASHES:
-                text = text.replace(slash, '/')
-
-            for control in self.CONTROLS:
-                text = text.replace(control, '')
+            # Remove formatting and controls, normalize tildes and slashes.
+            text = text.translate(self._nonunidec_table)
 
         if numbers:
             text = preprocessing.replace.replace_numbers(text)
-            regex_fraction = '[-]?\d+[/]\d+'
-            text = re.sub(regex_fraction, ' _FRAC_ ', text)
+            text = self._re_fraction.sub(' _FRAC_ ', text)
 
         if lower_case:
             text = text.lower()
@@ -229,206 +267,84 @@ class TextNormalizer:
 
         return text
 
-    def unidecode_normalize_string(self, string : str) -> str:
-        ret_string = ''
-        for char in string:
-            if re.match(u'[Α-Ωα-ωÅ°±≈⋯∞∆ϵ⋅≫≡≅≃∙≠]', char) is not None:
-                ret_string += str(char)
-            else:
-                ret_string += str(
-                    unidecode.unidecode_expect_nonascii(str(char)))
+    def _fig_ref(self, match : re.Match) -> str:
+        """ Replacement of a figure, reference or et al. match. """
+        if match.group(1) is not None:
+            return 'Figure ' + match.group(1)
+        elif match.group(2) is not None:
+            return 'reference ' + match.group(2)
+        else:
+            return ' al '
 
-        return ret_string
+    def unidecode_normalize_string(self, string : str) -> str:
+        return string.translate(self._unidecode_table)
 
 
     def chem_normalizer(self, text : str) -> str:
         """Normalizes certain very common chemical name variations"""
         # Can probably add to this list of rules.
-        text = re.sub(r'sulph', r'sulf', text, flags=re.I)
-        text = re.sub(r'aluminum', r'aluminium', text, flags=re.I)
-        text = re.sub(r'cesium', r'caesium', text, flags=re.I)
-
-        return text
+        return self._re_chem_names.sub(
+            lambda m: self._chem_names[m.group().lower()], text)
+
+    # Single character replacements of norm_chars.
+    _char_table = str.maketrans({
+        'â': "-", 'Â': "", '\x80': "", '\x85': "", '\x86': "", '\x88': "",
+        '\x89': "", '\x90': "", '\x92': "", '\x93': "", '\x94': "",
+        '\x97': "", '\x98': "", '\x99': "", '\x8d': "", '\x9c': "",
+        '\x9d': "", '\x96': "", '\x8b': "", '\xa0': " ", '©': "(c)",
+        '¼': "1/4", 'Ã': "", '®': "(R)", '¶': "\n", 'Ä': "", '²': "^{2}",
+        'µ': "\\mu", '′': "'", '“': '"', '‐': "-", '–': "-", '±': "+/-",
+        '−': "-", '\uf8ff': "-", '¤': "", '≈': "~", 'α': "\\alpha",
+        '’': "'", '×': "x", '\uf8fe': "=", '\u2005': " ", 'β': "\\beta",
+        'ζ': "\\zeta", 'ö': "o", 'ü': "u",
+    })
+
+    # Multi character sequences of norm_chars, replaced before the table.
+    _char_sequences = {
+        'Î¼': "\\mu ",
+        'Î±': "\\alpha",
+        'Ïâ': "pi-",
+        'ï£½': "---",
+    }
+    _re_char_sequences = re.compile('|'.join(_char_sequences))
+
+    # Cleanup of the spaces after replacing the characters.
+    _space_fixes = [
+        (" isa ", " is a "), ("( ", "("), (" )", ")"), ("- ", "-"),
+        (" ^", "^"), (" _", "_"), ("}=", "} ="), (" , ", ", "),
+        ("^{[}", "["), ("^{]}", "]"), ("-\\x89", ""),
+    ]
+    _re_spaces = re.compile(r'\s+')
+
+    def replace_chars(self, text : str) -> str:
+        """ Replace the special character sequences and characters. """
+        if 'Î' in text or 'Ï' in text or 'ï' in text:
+            text = self._re_char_sequences.sub(
+                lambda m: self._char_sequences[m.group()], text)
+        return text.translate(self._char_table)
 
     def norm_chars(self, text : str) -> str:
         """ Manually normalize special characters and spaces. """
-        ntext = ""
-        i = 0
-        while i < len(text):
-            # current char
-            c = text[i]
-            i += 1
-
-            if c == 'â':
-                ntext += "-"
-            elif c == 'Â':
-                ntext += ""
-            elif c == '\x80':
-                ntext += ""
-            elif c == '\x85':
-                ntext += ""
-            elif c == '\x86':
-                ntext += ""
-            elif c == '\x88':
-                ntext += ""
-            elif c == '\x89':
-                ntext += ""
-            elif c == '\x90':
-                ntext += ""
-            elif c == '\x92':
-                ntext += ""
-            elif c == '\x93':
-                ntext += ""
-            elif c == '\x94':
-                ntext += ""
-            elif c == '\x97':
-                ntext += ""
-            elif c == '\x98':
-                ntext += ""
-            elif c == '\x99':
-                ntext += ""
-            elif c == '\x8d':
-                ntext += ""
-            elif c == '\x9c':
-                ntext += ""
-            elif c == '\x9d':
-                ntext += ""
-            elif c == '\x96':
-                ntext += ""
-            elif c == '\x8b':
-                ntext += ""
-            elif c == '\xa0':
-                ntext += " "
-            elif c == '©':
-                ntext += "(c)"
-            elif c == '¼':
-                ntext += "1/4"
-            elif c == 'Ã':
-                ntext += ""
-            elif c == '®':
-                ntext += "(R)"
-            elif c == '¶':
-                ntext += "\n"
-            elif c == 'Ä':
-                ntext += ""
-            elif c == '²':
-                ntext += "^{2}"
-            elif c == 'µ':
-                ntext += "\\mu"
-            elif c == '′':
-                ntext += "'"
-            elif c == '“':
-                ntext += '"'
-            elif c == '‐':
-                ntext += "-"
-            elif c == '–':
-                ntext += "-"
-            elif c == '°':
-                ntext += "°"
-            elif c == '±':
-                ntext += "+/-"
-            elif c == '−':
-                ntext += "-"
-            elif c == '\uf8ff':
-                ntext += "-"
-            elif c == '¤':
-                ntext += ""
-            elif c == '≈':
-                ntext += "~"
-            elif c == 'α':
-                ntext += "\\alpha"
-            elif c == '’':
-                ntext += "'"
-            elif c == 'Î' and self._text_char(text, i) == '¼':
-                ntext += "\\mu "
-                i += 1
-            elif c == 'Ï' and self._text_char(text, i) == 'â':
-                ntext += "pi-"
-                i += 1
-            elif c == 'Î' and self._text_char(text, i) == '±':
-                ntext += "\\alpha"
-                i += 1
-            elif c == 'Ï' and self._text_char(text, i) == 'â':
-                ntext += "pi-"
-                i += 1
-            elif c == 'Ï' and self._text_char(text, i) == 'â':
-                ntext += "pi-"
-                i += 1
-            elif c == 'Ï' and self._text_char(text, i) == 'â':
-                ntext += "pi-"
-                i += 1
-            elif c == 'Ï' and self._text_char(text, i) == 'â':
-                ntext += "pi-"
-                i += 1
-            elif c == '×':
-                ntext += "x"
-            elif c == '\uf8fe':
-                ntext += "="
-            elif c == '\u2005':
-                ntext += " "
-            elif c == 'β':
-                ntext += "\\beta"
-            elif c == 'ζ':
-                ntext += "\\zeta"
-            elif c == 'ï' and self._text_char(text, i) == '£' \
-                    and self._text_char(text, i+1) == '½':
-                ntext += "---"
-                i += 2
-            elif c == 'ö':
-                ntext += "o"
-            elif c == 'ü':
-                ntext += "u"
-            # elif c == 'ö':
-            #     ntext += "o"
-            # elif c == 'ö':
-            #     ntext += "o"
-            # elif c == 'ö':
-            #     ntext += "o"
-            # elif c == 'ö':
-            #     ntext += "o"
-            # elif c == 'ö':
-            #     ntext += "o"
-            # elif c == 'ö':
-            #     ntext += "o"
-            # elif c == 'ö':
-            #     ntext += "o"
-            # elif c == 'ö':
-            #     ntext += "o"
-            # elif c == 'ö':
-            #     ntext += "o"
-            else:
-                try:
-                    c = c.encode('utf-8').decode('utf-8')
-                    ntext += c
-                except:
-                    # If additional special characters are found,
-                    # add them to the above elif cases.
-                    print(text[i-50:i+50])
-                    raise ValueError("Unknown Character:", ntext[-20:], c)
+        ntext = self.replace_chars(text)
+
+        try:
+            ntext.encode('utf-8')
+        except UnicodeEncodeError as err:
+            # If additional special characters are found,
+            # add them to the character table.
+            raise ValueError("Unknown Character:",
+                             ntext[max(0, err.start-20):err.start],
+                             ntext[err.start])
 
         # Add space before (
         ntext = ntext.replace("(", " (")
 
         # Remove multiple consecutive spaces.
-        ntext = re.sub(r'\s+', ' ', ntext).strip()
+        ntext = self._re_spaces.sub(' ', ntext).strip()
 
         # Cleanup some extra spaces.
-        ntext = ntext.replace(" isa ", " is a ")
-        ntext = ntext.replace("( ", "(")
-        ntext = ntext.replace(" )", ")")
-        ntext = ntext.replace("- ", "-")
-        ntext = ntext.replace(" ^", "^")
-        ntext = ntext.replace(" _", "_")
-        ntext = ntext.replace("}=", "} =")
-        ntext = ntext.replace(" , ", ", ")
-        ntext = ntext.replace("^{[}", "[")
-        ntext = ntext.replace("^{]}", "]")
-        ntext = ntext.replace("-\\x89", "")
+        for old, new in self._space_fixes:
+            ntext = ntext.replace(old, new)
 
         return ntext
 
-    def _text_char(self, text: str, position: int = 1) -> str:
-        try:
-            return text[position]
-        except IndexError:
-            return ''
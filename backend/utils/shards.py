@@ -0,0 +1,206 @@
+"""
+Read the papers of a corpus directory stored as tar or zip shards.
+
+A publisher directory can hold the paper files either loose, or packed in
+shards such as `acs/part-0001.tar`. A paper inside a shard is addressed as
+`<shard path>/<member name>`, e.g. `acs/part-0001.tar/10.1021@xyz.xml`.
+
+The shards are memory-mapped, and iterating over a shard reads the members
+in their storage order, so that a whole shard is read sequentially.
+"""
+
+import os
+import io
+import mmap
+import time
+import tarfile
+import zipfile
+from collections import namedtuple
+from typing import Iterator
+
+Extensions = ('.tar', '.tar.gz', '.tgz', '.zip')
+
+ShardMember = namedtuple('ShardMember', ['name', 'size', 'mtime'])
+
+
+class _MappedFile(mmap.mmap):
+    """ Read-only memory map usable as a file object by zipfile. """
+
+    def seekable(self) -> bool:
+        return True
+
+
+def is_shard(path : str) -> bool:
+    """ Check if the path is a tar or zip shard, by its extension. """
+    return path.lower().endswith(Extensions)
+
+
+def list_shards(directory : str) -> list[str]:
+    """ Return the sorted paths of the shards in a directory. """
+    return sorted(
+        entry.path for entry in os.scandir(directory)
+        if entry.is_file() and is_shard(entry.name))
+
+
+def member_path(shardpath : str, name : str) -> str:
+    """ Return the path of a shard member. """
+    return shardpath + "/" + name
+
+
+def split_member_path(path : str) -> tuple[str, str | None]:
+    """ Split a path into the shard path and the member name.
+        Returns (path, None) if the path is not inside a shard.
+    """
+    parts = path.split("/")
+    for i in range(len(parts) - 1, 0, -1):
+        shardpath = "/".join(parts[:i])
+        if is_shard(shardpath) and os.path.isfile(shardpath):
+            return shardpath, "/".join(parts[i:])
+    return path, None
+
+
+class ShardIndex:
+    """ Index of the files stored in the shards of a directory, keyed by
+        the member base name. The shards are listed lazily, one at a time,
+        only until a looked up file is found.
+    Args:
+        directory (str):    Path to the directory.
+        defer (set):        Paths of the shards to list only after all the
+                            other shards, and only if asked for.
+
+    Listing a compressed tar shard decompresses it, so the loose files
+    should be checked before looking them up.
+    """
+
+    def __init__(self, directory : str, defer : set[str] = None) -> None:
+        defer = defer or set()
+        self.shards = list_shards(directory)
+        self._pending = [path for path in self.shards if path not in defer]
+        self._deferred = [path for path in self.shards if path in defer]
+        self._index : dict[str, tuple[str, ShardMember]] = {}
+
+    @property
+    def deferred(self) -> list[str]:
+        """ Paths of the deferred shards not listed yet. """
+        return list(self._deferred)
+
+    def _list(self, shardpath : str):
+        with Shard(shardpath) as shard:
+            for member in shard.members():
+                self._index[os.path.basename(member.name)] = (shardpath, member)
+
+    def get(self, filename : str, deferred : bool = True) \
+            -> tuple[str, ShardMember] | None:
+        """ Return the shard path and the member info of a file, or None if
+            not found. The deferred shards are searched only if deferred.
+        """
+        while filename not in self._index:
+            if self._pending:
+                self._list(self._pending.pop(0))
+            elif deferred and self._deferred:
+                self._list(self._deferred.pop(0))
+            else:
+                return None
+        return self._index[filename]
+
+
+class Shard:
+    """ Read-only access to the members of a tar or zip shard.
+    Args:
+        path (str):     Path to the shard.
+
+    Only the file members are listed. Compressed tar shards are supported,
+    but listing or reading a single member needs to decompress the shard
+    up to the member, so they should be iterated instead.
+    """
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self._fp = open(path, 'rb')
+        self._mm = None
+        self._zip = None
+        self._tar = None
+
+        if os.fstat(self._fp.fileno()).st_size > 0:
+            self._mm = _MappedFile(
+                self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+            fileobj = self._mm
+        else:
+            fileobj = io.BytesIO()
+
+        try:
+            if path.lower().endswith('.zip'):
+                self._zip = zipfile.ZipFile(fileobj)
+            else:
+                self._tar = tarfile.open(fileobj=fileobj, mode='r:*')
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self) -> 'Shard':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self):
+        """ Close the shard and release the memory map. """
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+        if self._mm is not None:
+            self._mm.close()
+        self._fp.close()
+
+    def _zip_infos(self) -> list[zipfile.ZipInfo]:
+        # Storage order, so that the reads are sequential.
+        infos = [info for info in self._zip.infolist() if not info.is_dir()]
+        return sorted(infos, key=lambda info: info.header_offset)
+
+    @staticmethod
+    def _zip_member(info : zipfile.ZipInfo) -> ShardMember:
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        return ShardMember(info.filename, info.file_size, mtime)
+
+    @staticmethod
+    def _tar_member(info : tarfile.TarInfo) -> ShardMember:
+        return ShardMember(info.name, info.size, float(info.mtime))
+
+    def members(self) -> list[ShardMember]:
+        """ Return the list of file members, in storage order. """
+        if self._zip is not None:
+            return [self._zip_member(info) for info in self._zip_infos()]
+        return [self._tar_member(info) for info in self._tar.getmembers()
+                if info.isfile()]
+
+    def read(self, name : str) -> bytes:
+        """ Return the contents of a member. Raises KeyError if not found. """
+        if self._zip is not None:
+            return self._zip.read(name)
+        fp = self._tar.extractfile(name)
+        if fp is None:
+            raise KeyError(name)
+        return fp.read()
+
+    def __iter__(self) -> Iterator[tuple[ShardMember, bytes]]:
+        return self.items()
+
+    def items(self, names : set[str] = None) \
+            -> Iterator[tuple[ShardMember, bytes]]:
+        """ Iterate over the file members and their contents, reading the
+            shard sequentially. If names is given, only the members with
+            their base name in it are read.
+        """
+        def wanted(name : str) -> bool:
+            return names is None or os.path.basename(name) in names
+
+        if self._zip is not None:
+            for info in self._zip_infos():
+                if wanted(info.filename):
+                    yield self._zip_member(info), self._zip.read(info)
+            return
+
+        for info in self._tar:
+            if info.isfile() and wanted(info.name):
+                yield self._tar_member(info), self._tar.extractfile(info).read()
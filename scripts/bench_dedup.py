@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for DocumentParser.remove_duplicate_paragraphs on a
+synthetic document. Compares against the previous quadratic version.
+USAGE: python scripts/bench_dedup.py [-n 1000] [-r 5]
+
+"""
+
+import time
+import random
+import argparse
+
+from backend.parser.document import DocumentParser
+from backend.parser.paragraph import ParagraphParser
+
+WORDS = (
+    "polymer glass transition temperature measured films samples blend "
+    "thermal stability modulus tensile strength membrane permeability "
+    "solution viscosity molecular weight copolymer composite increased "
+    "decreased observed reported values results showed higher lower the "
+    "of and was were with by in at to for from as a an is are this these"
+).split()
+
+
+def synthetic_paragraphs(n : int, seed : int = 0) -> list[str]:
+    """ Generate n paragraph texts, some of which are exact duplicates
+        or substrings of the previous ones.
+    """
+    rng = random.Random(seed)
+    texts = []
+    for i in range(n):
+        r = rng.random()
+        if texts and r < 0.1:
+            # exact duplicate
+            texts.append(rng.choice(texts))
+        elif texts and r < 0.2:
+            # part of a previous paragraph
+            words = rng.choice(texts).split()
+            start = rng.randrange(len(words) // 2)
+            texts.append(" ".join(words[start:start + rng.randint(6, 40)]))
+        else:
+            nwords = rng.randint(10, 250)
+            texts.append(" ".join(rng.choices(WORDS, k=nwords)) + ".")
+    return texts
+
+
+def legacy_dedup(paragraphs : list[ParagraphParser]):
+    """ The previous quadratic implementation. """
+    paras = []
+    texts = []
+    for para in paragraphs:
+        part_of_texts = [para.text in t for t in texts]
+        if para.text not in texts and not any(part_of_texts):
+            paras.append(para)
+            texts.append(para.text)
+    return paras
+
+
+def make_document(texts : list[str]) -> DocumentParser:
+    doc = DocumentParser('xml', 'synthetic', 'synthetic.xml')
+    for text in texts:
+        para = ParagraphParser()
+        para.text = text
+        doc.paragraphs.append(para)
+    return doc
+
+
+def best_of(repeat : int, func) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--paragraphs', default=1000, type=int,
+                        help="Number of paragraphs. Default: 1000")
+    parser.add_argument('-r', '--repeat', default=5, type=int,
+                        help="Number of repeats. Default: 5")
+    args = parser.parse_args()
+
+    texts = synthetic_paragraphs(args.paragraphs)
+    chars = sum(len(t) for t in texts)
+    print(f"Synthetic document: {len(texts)} paragraphs, {chars} characters")
+
+    doc = make_document(texts)
+    expected = [p.text for p in legacy_dedup(doc.paragraphs)]
+
+    def new_dedup():
+        doc = make_document(texts)
+        doc.remove_duplicate_paragraphs()
+        return doc
+
+    result = [p.text for p in new_dedup().paragraphs]
+    assert result == expected, "Deduplicated paragraphs do not match."
+    print(f"Kept {len(result)} paragraphs.")
+
+    legacy = best_of(args.repeat, lambda: legacy_dedup(doc.paragraphs))
+    new = best_of(args.repeat, new_dedup)
+
+    print(f"Legacy: {legacy * 1000:.2f} ms")
+    print(f"New:    {new * 1000:.2f} ms ({legacy / new:.1f}x)")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""
+Benchmark the python and the postgres backends of the heuristic filter on
+the same range of paragraphs. Both backends only select the passing
+paragraph ids, nothing is written to the database. The selected ids are
+compared to check that the backends agree.
+USAGE: python scripts/bench_heuristic_filter.py -r property_tg [-n 100000]
+       python scripts/bench_heuristic_filter.py --all-properties
+
+Create the trigram index first for the postgres backend to use it:
+    python backend text-index create
+
+"""
+
+import json
+import time
+import argparse
+import sqlalchemy as sa
+
+from backend import postgres, sett
+from backend.postgres.orm import PropertyMetadata
+from backend.console import heuristic_filter as hf
+from backend.console.text_index import IndexName
+
+
+def load_keywords(db, args) -> dict[str, list[str]]:
+    """ Return the keywords of the benchmarked property filters. """
+    if args.all_properties:
+        return hf.build_property_automaton(db).keywords
+
+    prop = getattr(hf.FilterPropertyName, args.filter)
+    prop_metadata = PropertyMetadata().get_one(db, {"name": prop})
+    if prop_metadata is None:
+        raise ValueError("No property metadata for", prop)
+    return {args.filter: prop_metadata.other_names}
+
+
+def python_backend(db, keywords, first_id, limit, batch_size) -> dict[str, set]:
+    """ Stream the paragraphs and match the keywords in python. """
+    automaton = hf.KeywordAutomaton(keywords)
+    found = {name: set() for name in keywords}
+    for batch in hf.iter_paragraphs(db, first_id, limit, batch_size):
+        for para in batch:
+            for name in hf.keyword_properties(automaton, para):
+                found[name].add(para.id)
+    return found
+
+
+def postgres_backend(db, keywords, first_id, last_id) -> dict[str, set]:
+    """ Match the keywords in postgres, one query per filter. """
+    found = {}
+    for name, keyword_list in keywords.items():
+        condition, params = hf.keyword_condition(keyword_list)
+        query = sa.text(f'''
+        SELECT pt.id FROM paper_texts pt
+        WHERE pt.id > :first_id AND pt.id <= :last_id
+        AND EXISTS (SELECT 1 FROM filtered_papers fp WHERE fp.doi = pt.doi)
+        AND {condition};
+        ''')
+        params.update(first_id=first_id, last_id=last_id)
+        found[name] = set(db.execute(query, params).scalars())
+    return found
+
+
+def uses_index(db, keyword_list) -> bool:
+    """ Check if the planner uses the trigram index for a keyword list. """
+    condition, params = hf.keyword_condition(keyword_list)
+    plan = db.execute(sa.text(
+        f"EXPLAIN SELECT pt.id FROM paper_texts pt WHERE {condition};"), params)
+    return any(IndexName in line for line in plan.scalars())
+
+
+def timed(fn, repeat) -> tuple[float, list[float], object]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), times, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-r", "--filter", default='property_tg',
+                        choices=hf.property_filters(),
+                        help="Property filter to benchmark. Default: property_tg")
+    parser.add_argument("-a", "--all-properties", default=False, action='store_true',
+                        help="Benchmark all the property filters together.")
+    parser.add_argument("-s", "--start", default=0, type=int,
+                        help="Benchmark the paragraphs after this row ID. Default: 0")
+    parser.add_argument("-n", "--paragraphs", default=100000, type=int,
+                        help="Number of paragraphs. Default: 100000")
+    parser.add_argument("-b", "--batch-size", default=hf._batch_size, type=int,
+                        help="Batch size of the python backend stream.")
+    parser.add_argument("-t", "--repeat", default=3, type=int,
+                        help="Number of timed runs per backend. Default: 3")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Save the results as JSON.")
+    args = parser.parse_args()
+
+    sett.load_settings()
+    postgres.load_settings()
+    db = postgres.connect()
+
+    # Benchmark the full range regardless of the debug count.
+    sett.Run.debugCount = 0
+
+    keywords = load_keywords(db, args)
+    last_id = hf.last_paragraph_id(db, args.start, args.paragraphs)
+    if last_id is None:
+        print("No paragraphs after row ID", args.start)
+        return
+
+    print(f"Paragraph ids: ({args.start}, {last_id}], "
+          f"{len(keywords)} filter(s), {args.repeat} run(s) each.")
+
+    indexed = {name: uses_index(db, kw) for name, kw in keywords.items()}
+    print(f"Trigram index used for {sum(indexed.values())} of "
+          f"{len(indexed)} filter(s).")
+
+    py_best, py_times, py_found = timed(
+        lambda: python_backend(db, keywords, args.start, args.paragraphs,
+                               args.batch_size), args.repeat)
+    pg_best, pg_times, pg_found = timed(
+        lambda: postgres_backend(db, keywords, args.start, last_id),
+        args.repeat)
+
+    mismatched = {}
+    for name in keywords:
+        missing = py_found[name] - pg_found[name]
+        extra = pg_found[name] - py_found[name]
+        if missing or extra:
+            mismatched[name] = {'missing': sorted(missing)[:20],
+                                'extra': sorted(extra)[:20]}
+
+    print(f"{'backend':10s} {'best_s':>10s} {'mean_s':>10s} {'passed':>10s}")
+    for label, best, times, found in (('python', py_best, py_times, py_found),
+                                      ('postgres', pg_best, pg_times, pg_found)):
+        passed = sum(len(ids) for ids in found.values())
+        print(f"{label:10s} {best:10.3f} {sum(times) / len(times):10.3f} "
+              f"{passed:10d}")
+    print(f"Speedup: {py_best / max(pg_best, 1e-9):.2f}x")
+
+    for name, diff in mismatched.items():
+        print(f"Mismatch for {name}: missing {diff['missing']}, "
+              f"extra {diff['extra']}")
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({
+                'start': args.start, 'last_id': last_id,
+                'paragraphs': args.paragraphs, 'filters': sorted(keywords),
+                'indexed': indexed,
+                'python': {'best_s': py_best, 'times': py_times},
+                'postgres': {'best_s': pg_best, 'times': pg_times},
+                'passed': {name: len(ids) for name, ids in py_found.items()},
+                'mismatched': mismatched,
+            }, fp, indent=2)
+        print("Saved", args.output)
+
+    return 1 if mismatched else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
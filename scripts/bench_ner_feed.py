@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+"""
+Benchmark and verify record_extraction.utils.ner_feed against the previous
+implementation, which aligned the words of the spaCy en_core_web_sm
+pipeline to the NER entity spans by walking the char indices.
+Both must produce the same token_label sequences.
+USAGE: python scripts/bench_ner_feed.py --export ner.jsonl [-n 2000]
+       python scripts/bench_ner_feed.py --jsonl ner.jsonl [-r 3]
+       python scripts/bench_ner_feed.py [-n 2000] [-r 3]
+
+The JSONL file contains one paragraph per line as
+{"text": ..., "entities": [{"entity_group", "start", "end"}, ...]}.
+--export saves a random sample of the paper_texts paragraphs with their
+NER outputs from the ner_outputs cache (see ps-ner-filter) and verifies
+them. Without a JSONL file, synthetic single spaced paragraphs are used,
+which is only useful for timing. Requires en_core_web_sm.
+
+The texts with multiple spaces or other whitespace such as newlines are
+counted separately, spaCy keeps the extra whitespace as tokens. Any
+mismatch fails the verification, see tests/test_ner_feed.py for the
+intended labels of these texts.
+
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+from collections import namedtuple
+
+import spacy
+
+from backend.record_extraction import utils
+
+WORDS = (
+    "the glass transition temperature Tg of poly(methyl methacrylate) PMMA "
+    "was 105 °C and increased to 120.5 °C for PS-b-PMMA films , while the "
+    "bandgap of P3HT:PCBM blends ( Fig. 2 ) is 1.9 eV . tensile strength "
+    "of 45 MPa was measured at 25 °C ; the samples ' modulus was 2.3 GPa "
+    "and CO2 permeability reached 1,200 Barrer in the membrane [ 12 ] ."
+).split()
+
+LABELS = ['POLYMER', 'PROP_NAME', 'PROP_VALUE', 'MONOMER', 'ORGANIC']
+
+# Multiple spaces, or whitespace other than a space.
+_re_irregular = re.compile(r'\s{2,}|[^\S ]')
+
+
+def legacy_ner_feed(nlp, seq_pred, text):
+    """ The previous implementation of the MaterialsBERT._ner_feed. """
+    doc = nlp(text)
+    token_label = namedtuple('token_label', ["text", "label"])
+    if len(seq_pred) == 0:
+        return [token_label(doc[i].text, 'O') for i in range(len(doc))]
+
+    seq_index = 0
+    text_len = len(text)
+    seq_len = len(seq_pred)
+    len_doc = len(doc)
+    token = ''
+    token_labels = []
+    start_index = seq_pred[seq_index]["start"]
+    end_index = seq_pred[seq_index]["end"]
+    i = 0
+    char_index = -1
+
+    while i < len_doc:
+        token = doc[i].text
+        if char_index+1 >= start_index and seq_index < seq_len:
+            current_label = seq_pred[seq_index]["entity_group"]
+            while char_index < end_index-1:
+                token_labels.append(token_label(token, current_label))
+                char_index += len(token)
+                if char_index < text_len-1 and text[char_index+1] == ' ':
+                    char_index += 1
+                i += 1
+                if i < len_doc:
+                    token = doc[i].text
+            seq_index += 1
+            if seq_index < seq_len:
+                start_index = seq_pred[seq_index]["start"]
+                end_index = seq_pred[seq_index]["end"]
+        else:
+            token_labels.append(token_label(token, 'O'))
+            i += 1
+            char_index += len(token)
+            if char_index < text_len-1 and text[char_index+1] == ' ':
+                char_index += 1
+
+    return token_labels
+
+
+def synthetic_paragraphs(n : int, seed : int = 0) -> list[tuple[str, list]]:
+    """ Generate n paragraphs with entity spans on the word piece
+        boundaries, as the aggregated outputs of the NER pipeline.
+    """
+    rng = random.Random(seed)
+    items = []
+    for _ in range(n):
+        text = " ".join(rng.choices(WORDS, k=rng.randint(5, 300)))
+
+        # BERT splits the words on punctuation before the word pieces.
+        pieces = [m.span() for m in re.finditer(r"\w+|[^\w\s]", text)]
+        entities = []
+        i = rng.randint(0, 5)
+        while i < len(pieces):
+            j = min(i + rng.randint(1, 4), len(pieces))
+            entities.append({
+                'entity_group': rng.choice(LABELS),
+                'start': pieces[i][0], 'end': pieces[j - 1][1],
+            })
+            i = j + rng.randint(1, 12)
+        items.append((text, entities))
+    return items
+
+
+def export_jsonl(filename : str, n : int, model : str, seed : int) -> int:
+    """ Save a random sample of n paragraphs of paper_texts with their
+        cached NER outputs of a model. Returns the number of paragraphs.
+    """
+    from backend import postgres
+
+    postgres.load_settings()
+    postgres.connect()
+
+    query = """
+        SELECT pt.text, nr.entities FROM paper_texts pt
+        JOIN ner_outputs nr ON nr.text_md5 = md5(pt.text)
+        WHERE nr.model = :model
+        ORDER BY md5(pt.id::text || :seed) LIMIT :limit;
+    """
+    records = postgres.raw_sql(
+        query, {'model': model, 'seed': str(seed), 'limit': n})
+
+    with open(filename, 'w') as fp:
+        for row in records:
+            fp.write(json.dumps({'text': row.text, 'entities': row.entities}))
+            fp.write("\n")
+    return len(records)
+
+
+def irregular_spaces(text : str) -> bool:
+    """ True if the text has multiple spaces or whitespace other than a
+        space, where spaCy adds whitespace tokens.
+    """
+    return _re_irregular.search(text) is not None
+
+
+
+def load_jsonl(filename : str) -> list[tuple[str, list]]:
+    with open(filename) as fp:
+        return [(d['text'], d['entities']) for d in map(json.loads, fp)]
+
+
+def timed(fn, repeat : int) -> tuple[float, list]:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--paragraphs", default=2000, type=int,
+                        help="Number of synthetic or exported paragraphs. "
+                             "Default: 2000")
+    parser.add_argument("-r", "--repeat", default=3, type=int,
+                        help="Number of timed runs. Default: 3")
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--jsonl", default=None,
+                        help="Paragraphs and NER outputs to use instead.")
+    parser.add_argument("--export", default=None, metavar="JSONL",
+                        help="Save -n paragraphs of paper_texts with their "
+                             "cached NER outputs, and use them.")
+    parser.add_argument("--model", default=None,
+                        help="Model version of the exported NER outputs. "
+                             "Default: the NERPipeline model with the default "
+                             "windowing.")
+    args = parser.parse_args()
+
+    # The previous version with the blank tokenizer would verify the
+    # word splitter against itself.
+    try:
+        nlp = spacy.load("en_core_web_sm")
+    except OSError:
+        print("Requires en_core_web_sm: python -m spacy download en_core_web_sm")
+        return 2
+
+    if args.export:
+        model = args.model
+        if model is None:
+            from backend import sett
+            from backend.record_extraction.bert_model import (
+                MaterialsBERT, model_version)
+            sett.load_settings()
+            model = model_version(sett.NERPipeline.model) \
+                + MaterialsBERT().window_version()
+
+        count = export_jsonl(args.export, args.paragraphs, model, args.seed)
+        print(f"Saved {count} paragraphs of model {model} to {args.export}")
+        args.jsonl = args.export
+
+    if args.jsonl:
+        items = load_jsonl(args.jsonl)
+    else:
+        items = synthetic_paragraphs(args.paragraphs, args.seed)
+        print("Synthetic paragraphs, use --jsonl or --export to verify.")
+
+    if not items:
+        print("No paragraphs.")
+        return 1
+
+    # Load the tokenizers before timing.
+    utils.word_spans("warm up")
+    nlp("warm up")
+
+    old_s, old = timed(lambda: [legacy_ner_feed(nlp, ents, text)
+                                for text, ents in items], args.repeat)
+    new_s, new = timed(lambda: [utils.ner_feed(ents, text)
+                                for text, ents in items], args.repeat)
+
+    mismatched = [i for i, (a, b) in enumerate(zip(old, new))
+                  if [tuple(t) for t in a] != [tuple(t) for t in b]]
+
+    nwords = sum(len(labels) for labels in new)
+    print(f"{len(items)} paragraphs, {nwords} words.")
+    print(f"previous: {old_s:.3f} s ({1e3 * old_s / len(items):.3f} ms/para)")
+    print(f"current:  {new_s:.3f} s ({1e3 * new_s / len(items):.3f} ms/para)")
+    print(f"Speedup: {old_s / max(new_s, 1e-9):.2f}x")
+
+    irregular = [i for i, (text, _) in enumerate(items)
+                 if irregular_spaces(text)]
+    drifted = [i for i in mismatched if irregular_spaces(items[i][0])]
+    print(f"Mismatched paragraphs: {len(mismatched) - len(drifted)} of "
+          f"{len(items) - len(irregular)} single spaced, {len(drifted)} of "
+          f"{len(irregular)} with multiple spaces or newlines.")
+
+    for i in mismatched[:5]:
+        diff = [(a, b) for a, b in zip(old[i], new[i])
+                if tuple(a) != tuple(b)]
+        print(f"  #{i}: {diff[:5]}")
+
+    return 1 if mismatched else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
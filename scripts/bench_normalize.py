@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Benchmark the throughput of the text normalization functions in MB/s
+against the previous implementations kept in tests/test_normalize.py.
+USAGE: python scripts/bench_normalize.py [-n 2000]
+
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+from backend.text import normalize
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
+import test_normalize as legacy
+
+WORDS = (
+    "The glass transition temperature T_{g} of the polystyrene film was "
+    "measured by DSC at 10 K/min and found to be 100 °C ± 2 °C. "
+    "Films of 10 µm thickness (Table 1) had a bandgap of 3.2 eV, "
+    "whereas the α and β relaxations – see Fig. 2 – were at −20 °C."
+).split()
+
+
+def make_paragraphs(n : int, seed : int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(50, 250)))
+            for _ in range(n)]
+
+
+def throughput(func, texts : list[str], repeat : int) -> float:
+    """ Return the best throughput of func over the texts in MB/s. """
+    size = sum(len(t.encode('utf-8')) for t in texts) / 1e6
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - t0)
+    return size / best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--paragraphs', default=2000, type=int,
+                        help="Number of synthetic paragraphs. Default: 2000")
+    parser.add_argument('-r', '--repeat', default=3, type=int,
+                        help="Number of repeats. Default: 3")
+    args = parser.parse_args()
+
+    texts = make_paragraphs(args.paragraphs)
+    norm = normalize.TextNormalizer()
+
+    benchmarks = [
+        ("norm_chars", legacy.legacy_norm_chars, norm.norm_chars),
+        ("normalize", lambda t: legacy.legacy_normalize(norm, t),
+            norm.normalize),
+    ]
+
+    print(f"{'Function':<16}{'Legacy MB/s':>13}{'New MB/s':>11}{'Speedup':>9}")
+    for name, old, new in benchmarks:
+        old_mbs = throughput(old, texts, args.repeat)
+        new_mbs = throughput(new, texts, args.repeat)
+        print(f"{name:<16}{old_mbs:>13.2f}{new_mbs:>11.2f}"
+              f"{new_mbs / old_mbs:>8.1f}x")
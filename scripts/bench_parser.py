@@ -0,0 +1,553 @@
+#!/usr/bin/env python
+"""
+Benchmark the document parsers on synthetic documents that follow the
+XML/HTML layout of each publisher handled by PaperParser.
+Reports the parse time, peak memory and paragraphs/s per publisher,
+optionally saved as JSON and compared against a previous run.
+USAGE: python scripts/bench_parser.py [-n 50] [-r 3] [-o bench.json]
+                                      [--compare baseline.json]
+
+"""
+
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import resource
+import multiprocessing
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import lxml
+
+from backend.parser import PaperParser
+
+PUBLISHERS = [
+    'acs', 'aip', 'ecs', 'elsevier', 'hindawi', 'informa_uk',
+    'iop_publishing', 'nature', 'rsc', 'springer', 'wiley',
+]
+
+POLYMERS = [
+    "polystyrene (PS)", "poly(methyl methacrylate) (PMMA)",
+    "poly(3-hexylthiophene) (P3HT)", "polyethylene oxide (PEO)",
+    "poly(vinylidene fluoride) (PVDF)", "polyimide", "polycarbonate (PC)",
+]
+
+PROPERTIES = [
+    ("glass transition temperature", "T{sub}g{/sub}", "°C"),
+    ("melting temperature", "T{sub}m{/sub}", "°C"),
+    ("thermal conductivity", "κ", "W m{sup}−1{/sup} K{sup}−1{/sup}"),
+    ("band gap", "E{sub}g{/sub}", "eV"),
+    ("tensile strength", "σ", "MPa"),
+]
+
+SENTENCES = [
+    "The {prop} {sym} of {poly} was {val} ± {err} {unit} as measured by DSC "
+    "at 10 K min{sup}−1{/sup}.",
+    "Films of {poly} with a thickness of {num} µm were spin-coated on "
+    "silicon wafers and annealed at {val} {unit} for 2 h.",
+    "As shown in {ref}, the {prop} increases with the molecular weight "
+    "M{sub}n{/sub} of {poly}.",
+    "The {it}α{/it} and {it}β{/it} relaxations of {poly} were observed "
+    "at −{num} °C and {val} {unit}, respectively.",
+    "Blends of {poly} and {poly2} showed two distinct {sym} values, "
+    "indicating phase separation (see {ref}).",
+    "The samples were characterized by FTIR, XRD and TGA under N{sub}2{/sub} "
+    "atmosphere.",
+]
+
+
+class Markup:
+    """ Paragraph and inline tags of a publisher layout. """
+
+    def __init__(self, sub="sub", sup="sup", it="i", para="p",
+                 para_class=None, ref=None) -> None:
+        self.tags = {
+            'sub': f"<{sub}>", '/sub': f"</{sub}>",
+            'sup': f"<{sup}>", '/sup': f"</{sup}>",
+            'it': f"<{it}>", '/it': f"</{it}>",
+        }
+        self.para = para
+        self.para_attrs = f' class="{para_class}"' if para_class else ''
+        # Callable returning the reference to a table number.
+        self.ref = ref or (lambda n: f"Table {n}")
+
+
+class Document:
+    """ Random contents of a synthetic paper. """
+
+    def __init__(self, rng : random.Random, paragraphs : int,
+                 tables : int) -> None:
+        self.rng = rng
+        self.title = "Thermal properties of " + rng.choice(POLYMERS)
+        self.journal = rng.choice(["Macromolecules", "Polymer",
+                                   "J. Appl. Polym. Sci."])
+        self.date = f"{rng.randint(1, 28)} March {rng.randint(1990, 2023)}"
+        self.tables = tables
+
+        # Sections of up to 5 paragraphs, each paragraph a list of
+        # sentence templates.
+        self.sections = [
+            [rng.sample(SENTENCES, rng.randint(3, 5))
+             for _ in range(min(5, paragraphs - start))]
+            for start in range(0, max(paragraphs, 1), 5)
+        ]
+        self.abstract = rng.sample(SENTENCES, 3)
+
+    def text(self, templates : list[str], markup : Markup) -> str:
+        """ Return the marked up text of a paragraph. """
+        rng = self.rng
+        out = []
+        for sentence in templates:
+            prop, sym, unit = rng.choice(PROPERTIES)
+            poly, poly2 = rng.sample(POLYMERS, 2)
+            out.append(sentence.format(
+                prop=prop, sym=sym.format(**markup.tags),
+                unit=unit.format(**markup.tags), poly=escape(poly),
+                poly2=escape(poly2),
+                ref=markup.ref(rng.randint(1, max(self.tables, 1))),
+                val=rng.randint(20, 400), err=rng.randint(1, 9),
+                num=rng.randint(1, 200), **markup.tags))
+        return " ".join(out)
+
+    def paragraphs(self, markup : Markup, section : int) -> str:
+        p, attrs = markup.para, markup.para_attrs
+        return "\n".join(f"<{p}{attrs}>{self.text(t, markup)}</{p}>"
+                         for t in self.sections[section])
+
+    def table_rows(self, cell="td", head="th", row="tr") -> tuple[str, str]:
+        """ Return the header and body rows of a table. """
+        header = f"<{row}>" + "".join(
+            f"<{head}>{name}</{head}>"
+            for name in ["Polymer", "T<sub>g</sub> (°C)", "M<sub>n</sub>",
+                         "Đ"]) + f"</{row}>"
+        body = "".join(
+            f"<{row}><{cell}>{escape(self.rng.choice(POLYMERS))}</{cell}>"
+            f"<{cell}>{self.rng.randint(20, 400)}</{cell}>"
+            f"<{cell}>{self.rng.randint(5, 500)}k</{cell}>"
+            f"<{cell}>{self.rng.uniform(1, 2):.2f}</{cell}></{row}>"
+            for _ in range(self.rng.randint(4, 12)))
+        return header, body
+
+    def caption(self, n : int) -> str:
+        return f"Thermal properties of the polymers in series {n}."
+
+
+def acs(doc : Document) -> str:
+    markup = Markup(it="italic",
+                    ref=lambda n: f'<xref rid="tbl{n}">Table {n}</xref>')
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows()
+        tables.append(
+            f'<table-wrap id="tbl{n}"><label>Table {n}</label><caption><p>'
+            f'{doc.caption(n)}</p></caption><table><thead>{head}</thead>'
+            f'<tbody>{body}</tbody></table></table-wrap>')
+    secs = "".join(
+        f"<sec><title>Section {i}</title>{doc.paragraphs(markup, i)}"
+        f"{tables[i] if i < len(tables) else ''}</sec>"
+        for i in range(len(doc.sections)))
+    return (
+        '<?xml version="1.0"?><article><front><journal-meta><journal-title>'
+        f'{doc.journal}</journal-title></journal-meta><article-meta>'
+        f'<title-group><article-title>{doc.title}</article-title>'
+        f'</title-group><pub-date pub-type="ppub">{doc.date}</pub-date>'
+        f'<abstract><p>{doc.text(doc.abstract, markup)}</p></abstract>'
+        f'</article-meta></front><body>{secs}</body></article>')
+
+
+def elsevier(doc : Document) -> str:
+    markup = Markup(sub="ce:inf", sup="ce:sup", it="ce:italic",
+                    para="ce:para",
+                    ref=lambda n: f'<ce:cross-ref refid="tbl{n}">Table {n}'
+                                  '</ce:cross-ref>')
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows("entry", "entry", "row")
+        tables.append(
+            f'<ce:table id="tbl{n}"><ce:label>Table {n}</ce:label>'
+            f'<ce:caption><ce:simple-para>{doc.caption(n)}</ce:simple-para>'
+            f'</ce:caption><tgroup><thead>{head}</thead><tbody>{body}</tbody>'
+            '</tgroup></ce:table>')
+    secs = "".join(
+        f"<ce:section><ce:section-title>Section {i}</ce:section-title>"
+        f"{doc.paragraphs(markup, i)}"
+        f"{tables[i] if i < len(tables) else ''}</ce:section>"
+        for i in range(len(doc.sections)))
+    abstract = doc.text(doc.abstract, markup)
+    return (
+        '<?xml version="1.0"?><full-text-retrieval-response '
+        'xmlns="http://www.elsevier.com/xml/svapi/article/dtd" '
+        'xmlns:ce="http://www.elsevier.com/xml/common/dtd" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:xocs="http://www.elsevier.com/xml/xocs/dtd">'
+        f'<coredata><dc:title>{doc.title}</dc:title></coredata>'
+        f'<xocs:meta><xocs:srctitle>{doc.journal}</xocs:srctitle>'
+        f'<xocs:vor-load-date>{doc.date}</xocs:vor-load-date></xocs:meta>'
+        f'<ce:abstract><ce:simple-para>{abstract}</ce:simple-para>'
+        f'</ce:abstract><body><ce:sections>{secs}</ce:sections></body>'
+        '</full-text-retrieval-response>')
+
+
+def _html(head : str, body : str) -> str:
+    return (f'<!DOCTYPE html><html><head><title>Paper</title></head><body>'
+            f'<div class="header">{head}</div>{body}'
+            f'<div class="footer"><span>Cookies</span></div></body></html>')
+
+
+def wiley(doc : Document) -> str:
+    markup = Markup()
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows()
+        tables.append(
+            '<div class="article-table-content">'
+            f'<header class="article-table-caption">Table {n}. '
+            f'{doc.caption(n)}</header>'
+            '<div class="article-table-content-wrapper"><table class="table">'
+            f'<thead>{head}</thead><tbody>{body}</tbody></table></div></div>')
+    secs = "".join(
+        f'<section class="article-section__content"><h2>Section {i}</h2>'
+        f"{doc.paragraphs(markup, i)}"
+        f"{tables[i] if i < len(tables) else ''}</section>"
+        for i in range(len(doc.sections)))
+    return _html(
+        f'<div class="journal-banner-text">{doc.journal}</div>'
+        f'<h1 class="citation__title">{doc.title}</h1>'
+        f'<span class="epub-date">{doc.date}</span>',
+        '<div class="abstract-group"><section class="article-section '
+        f'article-section__abstract"><p>{doc.text(doc.abstract, markup)}'
+        '</p></section></div>'
+        f'<section class="article-section article-section__full">{secs}'
+        '</section>')
+
+
+def rsc(doc : Document) -> str:
+    markup = Markup(it="em")
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows()
+        tables.append(
+            f'<div class="table_caption"><b>Table {n}</b> {doc.caption(n)}'
+            '</div><div class="rtable__wrapper"><div class="rtable__inner">'
+            f'<table class="tgroup rtable"><thead>{head}</thead>'
+            f'<tbody>{body}</tbody></table></div></div>')
+    secs = "".join(
+        f'<h2>Section {i}</h2>{doc.paragraphs(markup, i)}'
+        f"{tables[i] if i < len(tables) else ''}"
+        for i in range(len(doc.sections)))
+    return _html(
+        f'<div class="article_info"><span class="italic"><a>{doc.journal}'
+        f'</a></span></div><h1>{doc.title}</h1>',
+        f'<div id="wrapper"><p>First published on {doc.date}</p>'
+        f'<p class="abstract">{doc.text(doc.abstract, markup)}</p>'
+        f'{secs}</div>')
+
+
+def _springer_like(doc : Document, title : str) -> str:
+    markup = Markup()
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows()
+        tables.append(
+            '<div class="c-article-table-container">'
+            f'<figcaption><b>Table {n}</b> {doc.caption(n)}</figcaption>'
+            '<div class="c-article-table-border"><table class="data">'
+            f'<thead>{head}</thead><tbody>{body}</tbody></table></div></div>')
+    secs = "".join(
+        f'<section data-title="Section {i}"><h2>Section {i}</h2>'
+        f'<div class="c-article-section__content">'
+        f"{doc.paragraphs(markup, i)}"
+        f"{tables[i] if i < len(tables) else ''}</div></section>"
+        for i in range(len(doc.sections)))
+    return _html(
+        f'<header>{title}<p class="c-article-info-details"><i>{doc.journal}'
+        f'</i></p><ul><li><time datetime="2021-03-01">{doc.date}</time></li>'
+        '</ul></header>',
+        '<section data-title="Abstract"><div class="c-article-section__'
+        f'content"><p>{doc.text(doc.abstract, markup)}</p></div></section>'
+        f'<div class="c-article-body">{secs}</div>')
+
+
+def springer(doc : Document) -> str:
+    return _springer_like(doc, f'<h1 class="c-article-title">{doc.title}</h1>')
+
+
+def nature(doc : Document) -> str:
+    return _springer_like(doc, f'<h1 class="c-article-title">{doc.title}</h1>')
+
+
+def _iop_like(doc : Document) -> str:
+    markup = Markup()
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows()
+        tables.append(
+            f'<div class="table-container"><p><b>Table {n}.</b> '
+            f'{doc.caption(n)}</p><table><thead>{head}</thead>'
+            f'<tbody>{body}</tbody></table></div>')
+    secs = "".join(
+        f'<h2>Section {i}</h2>{doc.paragraphs(markup, i)}'
+        f"{tables[i] if i < len(tables) else ''}"
+        for i in range(len(doc.sections)))
+    return _html(
+        f'<h1>{doc.title}</h1><span itemid="periodical">{doc.journal}</span>'
+        f'<span class="wd-jnl-art-pub-date">Published {doc.date}</span>',
+        f'<div class="article-abstract"><p>{doc.text(doc.abstract, markup)}'
+        f'</p></div><div class="article-content">{secs}</div>')
+
+
+def iop(doc : Document) -> str:
+    return _iop_like(doc)
+
+
+def ecs(doc : Document) -> str:
+    return _iop_like(doc)
+
+
+def aip(doc : Document) -> str:
+    markup = Markup(para="div", para_class="NLM_paragraph")
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows()
+        tables.append(
+            f'<div class="NLM_table">TABLE {n}. {doc.caption(n)}</div>'
+            '<div class="NLM_table-container"><div class="inner-table">'
+            f'<table><thead>{head}</thead><tbody>{body}</tbody></table>'
+            '</div></div>')
+    secs = "".join(
+        f'<div class="NLM_sec"><h2>Section {i}</h2>'
+        f"{doc.paragraphs(markup, i)}"
+        f"{tables[i] if i < len(tables) else ''}</div>"
+        for i in range(len(doc.sections)))
+    return _html(
+        f'<div class="header-journal-title"><a>{doc.journal}</a></div>'
+        f'<h1>{doc.title}</h1><div class="publicationContentEpubDate">'
+        f'{doc.date}</div>',
+        '<div class="abstractSection abstractInFull"><div>'
+        f'{doc.text(doc.abstract, markup)}</div></div>'
+        f'<div class="hlFld-Fulltext">{secs}</div>')
+
+
+def hindawi(doc : Document) -> str:
+    markup = Markup()
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows()
+        tables.append(
+            '<div class="floats-wrapper"><div class="table-wrap">'
+            '<div class="table-scroll"><table class="table-group">'
+            f'<thead>{head}</thead><tbody>{body}</tbody></table></div></div>'
+            f'<div class="floats-partial-footer">Table {n}: '
+            f'{doc.caption(n)}</div></div>')
+    secs = "".join(
+        f'<h2>Section {i}</h2>{doc.paragraphs(markup, i)}'
+        f"{tables[i] if i < len(tables) else ''}"
+        for i in range(len(doc.sections)))
+    return _html(
+        f'<div id="journal__navigation"><a>{doc.journal}</a></div>'
+        f'<h1>{doc.title}</h1><div class="articleContent__'
+        f'PublicationTimeLineWrapper"><div><span>Published</span><span>'
+        f'{doc.date}</span></div></div>',
+        '<article class="article_body"><div class="xml-content">'
+        f'<p>{doc.text(doc.abstract, markup)}</p></div>'
+        f'<div class="xml-content">{secs}</div></article>')
+
+
+def informa_uk(doc : Document) -> str:
+    markup = Markup()
+    tables = []
+    for n in range(1, doc.tables + 1):
+        head, body = doc.table_rows()
+        tables.append(
+            f'<div class="tableView"><div class="caption"><b>Table {n}.</b> '
+            f'{doc.caption(n)}</div><table><thead>{head}</thead>'
+            f'<tbody>{body}</tbody></table></div>')
+    secs = "".join(
+        f'<h2>Section {i}</h2>{doc.paragraphs(markup, i)}'
+        f"{tables[i] if i < len(tables) else ''}"
+        for i in range(len(doc.sections)))
+    return _html(
+        f'<h1>{doc.journal}</h1><h1>Volume 1</h1><h1>{doc.title}</h1>'
+        f'<div class="container-fluid"><div>Published online: {doc.date}'
+        '</div></div>',
+        '<div class="abstractSection abstractInFull">'
+        f'<p>{doc.text(doc.abstract, markup)}</p></div>'
+        f'<div class="hlFld-Fulltext">{secs}</div>')
+
+
+LAYOUTS = {
+    'acs': acs, 'aip': aip, 'ecs': ecs, 'elsevier': elsevier,
+    'hindawi': hindawi, 'informa_uk': informa_uk, 'iop_publishing': iop,
+    'nature': nature, 'rsc': rsc, 'springer': springer, 'wiley': wiley,
+}
+
+
+def make_documents(publisher : str, n : int, paragraphs : int, tables : int,
+                   seed : int = 0) -> list[bytes]:
+    """ Generate n synthetic documents in the layout of a publisher. """
+    rng = random.Random(f"{publisher}-{seed}")
+    return [
+        LAYOUTS[publisher](Document(rng, paragraphs, tables)).encode('utf-8')
+        for _ in range(n)
+    ]
+
+
+def max_rss_mb() -> float:
+    """ Peak resident memory of the current process in MB. """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_publisher(publisher : str, args) -> dict:
+    """ Parse the documents of a publisher, repeatedly. Runs in a fresh
+        process, so that the peak memory is not shared with the others.
+    """
+    docs = make_documents(publisher, args.docs, args.paragraphs, args.tables,
+                          args.seed)
+    ext = 'xml' if publisher in ('acs', 'elsevier') else 'html'
+    rss0 = max_rss_mb()
+
+    times = []
+    paras = tables = errors = 0
+    for _ in range(args.repeat):
+        paras = tables = errors = 0
+        t0 = time.perf_counter()
+        for i, contents in enumerate(docs):
+            doc = PaperParser(publisher, f"10.1000@doc{i}.{ext}",
+                              args.stream, contents)
+            try:
+                doc.parse(parse_tables=not args.no_tables)
+            except Exception:
+                errors += 1
+                continue
+            paras += len(doc.paragraphs)
+            tables += len(doc.tables)
+        times.append(time.perf_counter() - t0)
+
+    best = min(times)
+    return {
+        'documents': len(docs),
+        'megabytes': round(sum(len(d) for d in docs) / 1e6, 3),
+        'paragraphs': paras,
+        'tables': tables,
+        'errors': errors,
+        'best_s': round(best, 4),
+        'mean_s': round(sum(times) / len(times), 4),
+        'ms_per_document': round(1000 * best / len(docs), 3),
+        'paragraphs_per_s': round(paras / best, 1),
+        'peak_memory_mb': round(max_rss_mb() - rss0, 2),
+    }
+
+
+def _run(task):
+    publisher, args = task
+    return publisher, bench_publisher(publisher, args)
+
+
+def compare(results : dict, baseline : dict, tolerance : float) -> list[str]:
+    """ Return the regressions against a baseline run. """
+    regressions = []
+    for publisher, res in results.items():
+        base = baseline.get('results', {}).get(publisher)
+        if base is None:
+            continue
+        if res['paragraphs'] != base['paragraphs'] \
+                or res['tables'] != base['tables']:
+            regressions.append(
+                f"{publisher}: {res['paragraphs']} paragraphs and "
+                f"{res['tables']} tables, {base['paragraphs']} and "
+                f"{base['tables']} in baseline")
+        if res['paragraphs_per_s'] < \
+                (1 - tolerance) * base['paragraphs_per_s']:
+            regressions.append(
+                f"{publisher}: {res['paragraphs_per_s']} paragraphs/s, "
+                f"{base['paragraphs_per_s']} in baseline")
+        if res['peak_memory_mb'] > \
+                (1 + tolerance) * base['peak_memory_mb'] + 1:
+            regressions.append(
+                f"{publisher}: {res['peak_memory_mb']} MB peak memory, "
+                f"{base['peak_memory_mb']} MB in baseline")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--docs', default=50, type=int,
+                        help="Number of documents per publisher. Default: 50")
+    parser.add_argument('-p', '--paragraphs', default=40, type=int,
+                        help="Number of paragraphs per document. Default: 40")
+    parser.add_argument('-t', '--tables', default=3, type=int,
+                        help="Number of tables per document. Default: 3")
+    parser.add_argument('-r', '--repeat', default=3, type=int,
+                        help="Number of repeats. Default: 3")
+    parser.add_argument('--seed', default=0, type=int,
+                        help="Seed of the synthetic documents. Default: 0")
+    parser.add_argument('--publishers', nargs='+', default=PUBLISHERS,
+                        choices=PUBLISHERS, help="Publishers to benchmark.")
+    parser.add_argument('--stream', default=False, action='store_true',
+                        help="Use the streaming engine for the XML files.")
+    parser.add_argument('--no-tables', default=False, action='store_true',
+                        help="Parse the paragraphs only.")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Save the results as JSON.")
+    parser.add_argument('--compare', default=None,
+                        help="JSON results of a previous run to compare.")
+    parser.add_argument('--tolerance', default=0.15, type=float,
+                        help="Allowed slowdown or memory increase as a "
+                             "fraction of the baseline. Default: 0.15")
+    args = parser.parse_args()
+
+    print(f"{'Publisher':<16}{'Docs':>6}{'Paras':>7}{'Tables':>7}"
+          f"{'ms/doc':>9}{'paras/s':>10}{'Peak MB':>9}")
+
+    results = {}
+    ctx = multiprocessing.get_context('spawn')
+    for publisher in args.publishers:
+        # One fresh process per publisher for the peak memory.
+        with ctx.Pool(1) as pool:
+            _, res = pool.apply(_run, ((publisher, args),))
+        results[publisher] = res
+        print(f"{publisher:<16}{res['documents']:>6}{res['paragraphs']:>7}"
+              f"{res['tables']:>7}{res['ms_per_document']:>9.2f}"
+              f"{res['paragraphs_per_s']:>10.1f}"
+              f"{res['peak_memory_mb']:>9.2f}")
+        if res['errors'] or not res['paragraphs']:
+            print(f"  {publisher}: {res['errors']} failed documents, "
+                  f"{res['paragraphs']} paragraphs.")
+
+    report = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'lxml': lxml.__version__,
+        'machine': platform.machine(),
+        'args': {k: v for k, v in vars(args).items()
+                 if k not in ('output', 'compare')},
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=4)
+        print("Save OK:", args.output)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+
+        # Only runs on the same documents are comparable.
+        keys = ['docs', 'paragraphs', 'tables', 'seed', 'stream', 'no_tables']
+        changed = [k for k in keys
+                   if baseline['args'].get(k) != report['args'].get(k)]
+        if changed:
+            print("Baseline generated with different options:",
+                  ", ".join(changed))
+            sys.exit(1)
+
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.compare)
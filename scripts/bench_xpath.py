@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Benchmark the compiled XPath registry of the publisher parsers against
+evaluating the XPath strings directly, as done previously.
+Files are sampled from the publisher directories of a corpus.
+USAGE: python scripts/bench_xpath.py <corpus root> [-n 20] [-r 3]
+
+"""
+
+import os
+import time
+import warnings
+import argparse
+import contextlib
+
+from backend.parser import PaperParser
+from backend.parser.acs import ACSParser
+from backend.parser.tabular import TableParser
+from backend.parser.document import DocumentParser
+
+PUBLISHERS = [
+    'acs', 'aip', 'ecs', 'elsevier', 'hindawi', 'informa_uk',
+    'iop_publishing', 'nature', 'rsc', 'springer', 'wiley',
+]
+
+
+@contextlib.contextmanager
+def legacy_xpath():
+    """ Temporarily evaluate the XPath strings without the registry,
+        and look up the ACS xref labels by searching the tree.
+    """
+    doc_xpath = DocumentParser.xpath
+    tab_xpath = TableParser.xpath
+    xref_label = ACSParser._xref_label
+
+    def _doc_xpath(self, expr, node = None):
+        return (self._tree if node is None else node).xpath(expr)
+
+    def _tab_xpath(self, expr, node):
+        return node.xpath(expr)
+
+    def _xref_label(self, rid):
+        return self._tree.find('//*[@id="{}"]/label'.format(rid))
+
+    DocumentParser.xpath = _doc_xpath
+    TableParser.xpath = _tab_xpath
+    ACSParser._xref_label = _xref_label
+    try:
+        yield
+    finally:
+        DocumentParser.xpath = doc_xpath
+        TableParser.xpath = tab_xpath
+        ACSParser._xref_label = xref_label
+
+
+def parse_all(publisher : str, files : list[str]) -> int:
+    """ Parse the meta, tables and paragraphs of the files.
+        Returns the number of paragraphs found.
+    """
+    paras = 0
+    for filepath in files:
+        doc = PaperParser(publisher, filepath)
+        try:
+            doc.parse_meta()
+            doc.parse_tables()
+            doc.parse_paragraphs()
+        except Exception as err:
+            print(f"Failed to parse: {filepath} ({err})")
+        paras += len(doc.paragraphs)
+    return paras
+
+
+def best_of(repeat : int, func) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus', help="Corpus root with publisher directories.")
+    parser.add_argument('-n', '--files', default=20, type=int,
+                        help="Number of files per publisher. Default: 20")
+    parser.add_argument('-r', '--repeat', default=3, type=int,
+                        help="Number of repeats. Default: 3")
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore', FutureWarning)
+
+    print(f"{'Publisher':<16}{'Files':>6}{'Legacy ms':>12}"
+          f"{'Compiled ms':>13}{'Speedup':>9}")
+
+    for publisher in PUBLISHERS:
+        directory = os.path.join(args.corpus, publisher)
+        if not os.path.isdir(directory):
+            continue
+
+        files = sorted(os.listdir(directory))[:args.files]
+        files = [os.path.join(directory, f) for f in files]
+        if not files:
+            continue
+
+        with legacy_xpath():
+            legacy = best_of(args.repeat, lambda: parse_all(publisher, files))
+        compiled = best_of(args.repeat, lambda: parse_all(publisher, files))
+
+        print(f"{publisher:<16}{len(files):>6}"
+              f"{1000 * legacy / len(files):>12.2f}"
+              f"{1000 * compiled / len(files):>13.2f}"
+              f"{legacy / compiled:>8.2f}x")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Compare the ONNX Runtime backends of MaterialsBERT against the PyTorch
+backend on the paragraphs of the curated_data table. Reports the entity
+level agreement (same char span and entity group), the agreement of the
+ps-ner-filter decisions, and the throughput of each backend.
+USAGE: python scripts/eval_onnx_ner.py [-n 500] [--quantize] [--min-f1 0.98]
+
+The model path and device are read from the NERPipeline settings. The NER
+cache is not used. Requires optimum[onnxruntime].
+
+"""
+
+import json
+import time
+import argparse
+
+from backend import postgres, sett
+from backend.record_extraction import bert_model
+from backend.console.ps_ner_filter import _ner_filter
+
+
+def load_paragraphs(n : int) -> list:
+    query = """
+        SELECT pt.id, pt.text FROM paper_texts pt
+        WHERE EXISTS (
+            SELECT 1 FROM curated_data cd WHERE cd.para_id = pt.id
+        )
+        ORDER BY pt.id LIMIT :limit;
+    """
+    return postgres.raw_sql(query, {'limit': n})
+
+
+def run_backend(texts, batch_size, **kwargs) -> tuple[list, float]:
+    """ Returns the NER outputs of the texts and the elapsed seconds. """
+    bert = bert_model.MaterialsBERT()
+    bert.init_local_model(sett.NERPipeline.model,
+                          sett.NERPipeline.pytorch_device, **kwargs)
+
+    # Warm up before timing.
+    bert.pipeline_batch(texts[:batch_size], batch_size)
+
+    t0 = time.perf_counter()
+    outputs = bert.pipeline_batch(texts, batch_size)
+    return outputs, time.perf_counter() - t0
+
+
+def entity_set(ner_output) -> set:
+    return {(e['start'], e['end'], e['entity_group']) for e in ner_output}
+
+
+def agreement(reference : list, outputs : list) -> dict:
+    """ Entity level precision, recall and F1 of the outputs against the
+        reference outputs, and the fraction of same ner filter decisions.
+    """
+    tp = fp = fn = 0
+    same_decision = 0
+    for ref, out in zip(reference, outputs):
+        ref_set, out_set = entity_set(ref), entity_set(out)
+        tp += len(ref_set & out_set)
+        fp += len(out_set - ref_set)
+        fn += len(ref_set - out_set)
+
+        _, ref_flag = _ner_filter(None, None, None, ref)
+        _, out_flag = _ner_filter(None, None, None, out)
+        same_decision += ref_flag == out_flag
+
+    precision = tp / max(tp + fp, 1)
+    recall = tp / max(tp + fn, 1)
+    return {
+        'precision': precision, 'recall': recall,
+        'f1': 2 * precision * recall / max(precision + recall, 1e-9),
+        'filter_agreement': same_decision / max(len(reference), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--paragraphs", default=500, type=int,
+                        help="Number of curated paragraphs. Default: 500")
+    parser.add_argument("-b", "--batch-size", default=16, type=int,
+                        help="NER model batch size. Default: 16")
+    parser.add_argument("--quantize", default=False, action='store_true',
+                        help="Also evaluate the int8 quantized ONNX model.")
+    parser.add_argument("--min-f1", default=0.98, type=float,
+                        help="Fail if an ONNX backend has a lower entity F1.")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Save the results as JSON.")
+    args = parser.parse_args()
+
+    sett.load_settings()
+    postgres.load_settings()
+    postgres.connect()
+
+    records = load_paragraphs(args.paragraphs)
+    texts = [row.text for row in records]
+    if not texts:
+        print("No curated paragraphs found.")
+        return 1
+    print(f"{len(texts)} curated paragraphs, model {sett.NERPipeline.model}")
+
+    onnx_dir = sett.NERPipeline.onnx_dir
+    backends = {
+        'pytorch': {},
+        'onnx': {'backend': 'onnx', 'onnx_dir': onnx_dir},
+    }
+    if args.quantize:
+        backends['onnx-int8'] = {'backend': 'onnx', 'quantize': True,
+                                 'onnx_dir': onnx_dir}
+
+    results = {}
+    reference = None
+    for name, kwargs in backends.items():
+        outputs, elapsed = run_backend(texts, args.batch_size, **kwargs)
+        if reference is None:
+            reference = outputs
+
+        results[name] = {
+            'seconds': elapsed,
+            'paragraphs_per_s': len(texts) / max(elapsed, 1e-9),
+            'entities': sum(len(out) for out in outputs),
+        }
+        results[name].update(agreement(reference, outputs))
+
+    print(f"{'backend':10s} {'para/s':>8s} {'entities':>9s} {'prec':>7s} "
+          f"{'recall':>7s} {'f1':>7s} {'filter':>7s}")
+    for name, res in results.items():
+        print(f"{name:10s} {res['paragraphs_per_s']:8.2f} "
+              f"{res['entities']:9d} {res['precision']:7.4f} "
+              f"{res['recall']:7.4f} {res['f1']:7.4f} "
+              f"{res['filter_agreement']:7.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({'paragraphs': len(texts), 'batch_size': args.batch_size,
+                       'model': sett.NERPipeline.model,
+                       'results': results}, fp, indent=2)
+        print("Saved", args.output)
+
+    failed = [name for name, res in results.items() if res['f1'] < args.min_f1]
+    for name in failed:
+        print(f"{name}: entity F1 {results[name]['f1']:.4f} < {args.min_f1}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
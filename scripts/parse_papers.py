@@ -10,7 +10,8 @@ import sys
 import pylogg as log
 
 from backend import postgres, sett
-from backend.postgres.orm import Papers, PaperTexts
+from backend.postgres import persist
+from backend.postgres.orm import Papers
 
 from backend.utils.frame import Frame
 from backend.parser import PaperParser
@@ -23,29 +24,17 @@ db = postgres.connect()
 
 
 def add_to_postgres(paper : Papers, directory : str, doctype : str,
-                    para : ParagraphParser):
-    """ Add a paragraph text to postgres if it already does not
-        exist in the database.
+                    paras : list[ParagraphParser]) -> int:
+    """ Add the paragraph texts of a paper to postgres in bulk, skipping the
+        ones already in the database. Returns the number of added texts.
     """
-
-    paragraph = PaperTexts().get_one(db, {'doi': paper.doi, 'text': para.text})
-    if paragraph is not None:
-        log.trace(f"Paragraph in PostGres: {para.text}. Skipped.")
-        return False
-    
-    paragraph = PaperTexts()
-    paragraph.pid = paper.id
-    paragraph.directory = directory
-    paragraph.doi = paper.doi
-    paragraph.doctype = doctype
-    paragraph.section = None
-    paragraph.tag = None
-    paragraph.text = para.text
-    paragraph.insert(db)
-
-    log.trace(f"Added to PostGres: {para.text}")
-
-    return True
+    rows = [
+        {'pid': paper.id, 'doi': paper.doi, 'directory': directory,
+         'doctype': doctype, 'text': para.text} for para in paras
+    ]
+    pg = persist.add_paper_texts(db, rows)
+    log.trace("Added {} paragraphs of {} to PostGres.", pg, paper.doi)
+    return pg
 
 
 def parse_file(filepath, root = "") -> DocumentParser | None:    
@@ -81,12 +70,10 @@ def parse_file(filepath, root = "") -> DocumentParser | None:
         # get the foreign key
         paper = Papers().get_one(db, {'doi': doi})
 
-        for para in doc.paragraphs:
-            if paper is None:
-                log.warn(f"{doi} not found in postgres.")
-                break
-            elif add_to_postgres(paper, directory, doc.doctype, para):
-                pg += 1
+        if paper is None:
+            log.warn(f"{doi} not found in postgres.")
+        else:
+            pg = add_to_postgres(paper, directory, doc.doctype, doc.paragraphs)
 
         db.commit()
 
@@ -42,3 +42,10 @@ for filter_name in "${filter_names[@]}"; do
     nohup python "$python_script" --logfile "$log_file" heuristic-filter --filter "$filter_name" -l 15000000 >"$output_file" 2>&1 &
 
 done
+
+# Or run all the property filters in a single pass over the paragraphs.
+# nohup python "$python_script" --logfile "hf/all-properties.log" heuristic-filter --all-properties -l 15000000 >"${nohup_folder}/all-properties.out" 2>&1 &
+
+# Or match the keywords inside postgres, after building the trigram index once.
+# python "$python_script" text-index create
+# nohup python "$python_script" --logfile "hf/all-properties.log" heuristic-filter --all-properties --backend postgres -l 15000000 >"${nohup_folder}/all-properties.out" 2>&1 &
@@ -46,4 +46,6 @@ for filter_name in "${filter_names[@]}"; do
     echo "Running ner filter: $filter_name"
     nohup python "$python_script" --logfile "$log_file" ps-ner-filter --filter "$filter_name"  >"$output_file" 2>&1 &
 
-done
\ No newline at end of file
+done
+# Or run all the ner filters in a single pass over the distinct paragraphs.
+# nohup python "$python_script" --logfile "ner/all.log" ps-ner-filter --all >"${nohup_folder}/ner_all.out" 2>&1 &
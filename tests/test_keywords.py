@@ -0,0 +1,55 @@
+"""
+Test the multi-keyword search against plain substring tests.
+USAGE: pytest tests/test_keywords.py
+
+"""
+
+import random
+from backend.text.keywords import KeywordAutomaton
+
+
+def naive_find(keywords : dict[str, list[str]], text : str) -> set:
+    return {label for label, words in keywords.items()
+            if any(word and word in text for word in words)}
+
+
+def test_keyword_automaton():
+    keywords = {
+        'property_tg': ['glass transition temperature', 'Tg', 'T_{g}'],
+        'property_tm': ['melting temperature', 'T_{m}'],
+        'property_ct': ['crystallization temperature', 'temperature'],
+    }
+    ac = KeywordAutomaton(keywords)
+
+    assert ac.find("") == set()
+    assert ac.find("The T_{g} of PS") == {'property_tg'}
+    # Overlapping and nested keywords.
+    assert ac.find("melting temperature") == {'property_tm', 'property_ct'}
+    assert ac.find("glass transition temperatur") == set()
+    assert ac.labels == set(keywords)
+
+
+def test_keyword_automaton_random():
+    rng = random.Random(0)
+    alphabet = "abAB _{"
+    for _ in range(2000):
+        keywords = {
+            f"p{i}": ["".join(rng.choices(alphabet, k=rng.randint(0, 4)))
+                      for _ in range(rng.randint(0, 3))]
+            for i in range(rng.randint(1, 5))
+        }
+        text = "".join(rng.choices(alphabet, k=rng.randint(0, 40)))
+        assert KeywordAutomaton(keywords).find(text) == \
+            naive_find(keywords, text)
+
+
+def test_keyword_condition():
+    from backend.console.heuristic_filter import keyword_condition
+
+    condition, params = keyword_condition(['tg', 'T_{g}', '50%', 'tg', ''])
+    assert condition == "(pt.text ILIKE :kw_0 OR pt.text LIKE :kw_1 " \
+                        "OR pt.text ILIKE :kw_2)"
+    assert params == {'kw_0': '%tg%', 'kw_1': '%T\\_{g}%', 'kw_2': '%50\\%%'}
+
+    condition, params = keyword_condition([])
+    assert condition == 'FALSE' and params == {}
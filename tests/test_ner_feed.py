@@ -0,0 +1,69 @@
+"""
+Test the alignment of the NER entity spans to the words of a text.
+USAGE: pytest tests/test_ner_feed.py
+
+"""
+
+from backend.record_extraction.utils import ner_feed
+
+
+def test_ner_feed():
+    text = "The Tg of PS-b-PMMA was 105 °C."
+    entities = [
+        {'entity_group': 'PROP_NAME', 'start': 4, 'end': 6},
+        {'entity_group': 'POLYMER', 'start': 10, 'end': 19},
+        {'entity_group': 'PROP_VALUE', 'start': 24, 'end': 30},
+    ]
+
+    labels = [tuple(t) for t in ner_feed(entities, text)]
+    assert labels == [
+        ('The', 'O'), ('Tg', 'PROP_NAME'), ('of', 'O'),
+        ('PS', 'POLYMER'), ('-', 'POLYMER'), ('b', 'POLYMER'),
+        ('-', 'POLYMER'), ('PMMA', 'POLYMER'), ('was', 'O'),
+        ('105', 'PROP_VALUE'), ('°', 'PROP_VALUE'), ('C', 'PROP_VALUE'),
+        ('.', 'O'),
+    ]
+
+    # Entities starting inside a word do not label the word.
+    labels = ner_feed([{'entity_group': 'POLYMER', 'start': 11, 'end': 19}], text)
+    assert [t.label for t in labels][3:8] == ['O', 'POLYMER', 'POLYMER', 'POLYMER', 'POLYMER']
+
+    assert all(t.label == 'O' for t in ner_feed([], text))
+
+
+def _entities(text):
+    def entity(group, span, start=0):
+        start = text.index(span, start)
+        return {'entity_group': group, 'start': start, 'end': start + len(span)}
+
+    return [
+        entity('PROP_NAME', 'Tg'),
+        entity('POLYMER', 'PS'),
+        entity('PROP_VALUE', '105 °C'),
+        entity('PROP_NAME', 'Tg', text.index('PS')),
+        entity('POLYMER', 'PMMA'),
+        entity('PROP_VALUE', '120 °C'),
+    ]
+
+
+def test_ner_feed_whitespace():
+    # The words are aligned by their char offsets, so multiple spaces and
+    # newlines do not shift the labels of the following words. The
+    # whitespace tokens of spaCy are labeled as the other words.
+    text = "The Tg  of\nPS was 105 °C.\n\n  Tg of  PMMA\tis 120 °C."
+
+    labels = [tuple(t) for t in ner_feed(_entities(text), text)]
+    assert labels == [
+        ('The', 'O'), ('Tg', 'PROP_NAME'), (' ', 'O'), ('of', 'O'),
+        ('\n', 'O'), ('PS', 'POLYMER'), ('was', 'O'),
+        ('105', 'PROP_VALUE'), ('°', 'PROP_VALUE'), ('C', 'PROP_VALUE'),
+        ('.', 'O'), ('\n\n  ', 'O'), ('Tg', 'PROP_NAME'), ('of', 'O'),
+        (' ', 'O'), ('PMMA', 'POLYMER'), ('\t', 'O'), ('is', 'O'),
+        ('120', 'PROP_VALUE'), ('°', 'PROP_VALUE'), ('C', 'PROP_VALUE'),
+        ('.', 'O'),
+    ]
+
+    # The words have the same labels as in the single spaced text.
+    single = " ".join(text.split())
+    assert [t for t in labels if t[0].strip()] == [
+        tuple(t) for t in ner_feed(_entities(single), single)]
@@ -0,0 +1,418 @@
+"""
+Test the text normalization functions.
+USAGE: pytest tests/test_normalize.py
+
+"""
+
+import re
+import html
+import random
+import pytest
+import unidecode
+from textacy import preprocessing
+from backend.text import normalize
+
+
+def _text_char(text: str, position: int = 1) -> str:
+    try:
+        return text[position]
+    except IndexError:
+        return ''
+
+
+def legacy_norm_chars(text : str) -> str:
+    """ The previous character by character TextNormalizer.norm_chars. """
+    ntext = ""
+    i = 0
+    while i < len(text):
+        # current char
+        c = text[i]
+        i += 1
+
+        if c == 'â':
+            ntext += "-"
+        elif c == 'Â':
+            ntext += ""
+        elif c == '\x80':
+            ntext += ""
+        elif c == '\x85':
+            ntext += ""
+        elif c == '\x86':
+            ntext += ""
+        elif c == '\x88':
+            ntext += ""
+        elif c == '\x89':
+            ntext += ""
+        elif c == '\x90':
+            ntext += ""
+        elif c == '\x92':
+            ntext += ""
+        elif c == '\x93':
+            ntext += ""
+        elif c == '\x94':
+            ntext += ""
+        elif c == '\x97':
+            ntext += ""
+        elif c == '\x98':
+            ntext += ""
+        elif c == '\x99':
+            ntext += ""
+        elif c == '\x8d':
+            ntext += ""
+        elif c == '\x9c':
+            ntext += ""
+        elif c == '\x9d':
+            ntext += ""
+        elif c == '\x96':
+            ntext += ""
+        elif c == '\x8b':
+            ntext += ""
+        elif c == '\xa0':
+            ntext += " "
+        elif c == '©':
+            ntext += "(c)"
+        elif c == '¼':
+            ntext += "1/4"
+        elif c == 'Ã':
+            ntext += ""
+        elif c == '®':
+            ntext += "(R)"
+        elif c == '¶':
+            ntext += "\n"
+        elif c == 'Ä':
+            ntext += ""
+        elif c == '²':
+            ntext += "^{2}"
+        elif c == 'µ':
+            ntext += "\\mu"
+        elif c == '′':
+            ntext += "'"
+        elif c == '“':
+            ntext += '"'
+        elif c == '‐':
+            ntext += "-"
+        elif c == '–':
+            ntext += "-"
+        elif c == '°':
+            ntext += "°"
+        elif c == '±':
+            ntext += "+/-"
+        elif c == '−':
+            ntext += "-"
+        elif c == '\uf8ff':
+            ntext += "-"
+        elif c == '¤':
+            ntext += ""
+        elif c == '≈':
+            ntext += "~"
+        elif c == 'α':
+            ntext += "\\alpha"
+        elif c == '’':
+            ntext += "'"
+        elif c == 'Î' and _text_char(text, i) == '¼':
+            ntext += "\\mu "
+            i += 1
+        elif c == 'Ï' and _text_char(text, i) == 'â':
+            ntext += "pi-"
+            i += 1
+        elif c == 'Î' and _text_char(text, i) == '±':
+            ntext += "\\alpha"
+            i += 1
+        elif c == 'Ï' and _text_char(text, i) == 'â':
+            ntext += "pi-"
+            i += 1
+        elif c == 'Ï' and _text_char(text, i) == 'â':
+            ntext += "pi-"
+            i += 1
+        elif c == 'Ï' and _text_char(text, i) == 'â':
+            ntext += "pi-"
+            i += 1
+        elif c == 'Ï' and _text_char(text, i) == 'â':
+            ntext += "pi-"
+            i += 1
+        elif c == '×':
+            ntext += "x"
+        elif c == '\uf8fe':
+            ntext += "="
+        elif c == '\u2005':
+            ntext += " "
+        elif c == 'β':
+            ntext += "\\beta"
+        elif c == 'ζ':
+            ntext += "\\zeta"
+        elif c == 'ï' and _text_char(text, i) == '£' \
+                and _text_char(text, i+1) == '½':
+            ntext += "---"
+            i += 2
+        elif c == 'ö':
+            ntext += "o"
+        elif c == 'ü':
+            ntext += "u"
+        else:
+            try:
+                c = c.encode('utf-8').decode('utf-8')
+                ntext += c
+            except:
+                # If additional special characters are found,
+                # add them to the above elif cases.
+                print(text[i-50:i+50])
+                raise ValueError("Unknown Character:", ntext[-20:], c)
+
+    # Add space before (
+    ntext = ntext.replace("(", " (")
+
+    # Remove multiple consecutive spaces.
+    ntext = re.sub(r'\s+', ' ', ntext).strip()
+
+    # Cleanup some extra spaces.
+    ntext = ntext.replace(" isa ", " is a ")
+    ntext = ntext.replace("( ", "(")
+    ntext = ntext.replace(" )", ")")
+    ntext = ntext.replace("- ", "-")
+    ntext = ntext.replace(" ^", "^")
+    ntext = ntext.replace(" _", "_")
+    ntext = ntext.replace("}=", "} =")
+    ntext = ntext.replace(" , ", ", ")
+    ntext = ntext.replace("^{[}", "[")
+    ntext = ntext.replace("^{]}", "]")
+    ntext = ntext.replace("-\\x89", "")
+
+    return ntext
+
+
+
+def legacy_normalize(norm, text, unidec=True, chem=True, spaces=True, fig_ref=True,
+                     numbers=False, lower_case=False):
+    """ The previous TextNormalizer.normalize. """
+    # Use a bunch of textacy functions to pre-process.
+    text = html.unescape(text)
+    text = preprocessing.replace.emails(text)
+    text = preprocessing.replace.urls(text)
+
+    for char_seq in norm.replace_char_list:
+        text = text.replace(char_seq, '')
+
+    # Remove some boiler plate symbols
+    re_str = ''.join([chr(c) for c in norm.to_remove])
+    re_str = '[' + re_str + ']'
+    text = re.sub(re_str, '', text)
+
+    # Replaces empty brackets that are left over from removing references after parsing the HTML
+    for chr_seq in norm.remove_dot_list:
+        text = text.replace(chr_seq, chr_seq[:-1])
+
+    # Fixes issues where the superscript and variable might have a space between them
+    text = re.sub(r'\s+(\^{\w*})', '\\1', text)
+    # Fix the cases where NMR related terms get clubbed with previous terms
+    text = re.sub(r'(\^\{1\}H)', ' \\1', text)
+    # TODO: There must be other terms which get similarly clubbed
+    text = re.sub(r'(\^\{13\}C)', ' \\1', text)
+    text = re.sub(r'(\^\{7\}Li)', ' \\1', text)
+    # Fixes issues where the subscript and variable might have a space between them
+    text = re.sub(r'\s+(_{\w*})', '\\1', text)
+    # Fixes issues where the end bracket and variable in superscript might have a space between them
+    text = re.sub(r'(\^{\w*)\s+}', '\\1}', text)
+    # Fixes issues where the end bracket and variable in subscript might have a space between them
+    text = re.sub(r'(_{\w*\s+)}', '\\1}', text)
+
+    # Removes dots as they may cause problems in recognizing sentences
+    for chr_seq in norm.remove_all_dot_list:
+        chr_dotless = chr_seq.replace('.', '')
+        text = text.replace(chr_seq, chr_dotless)
+
+    # TextCleanup inspired code
+    # Degree normalization
+    re_str = '[' + ''.join([chr(c) for c in norm.degrees]) + ']'
+    text = re.sub(re_str, chr(176), text)
+    text = text.replace('° C', '°C')
+    text = text.replace('°C', ' °C')
+
+    # Removes copyright notices expected to be at the end of abstracts
+    text = norm.re_copyright.sub('', text)
+
+    # Figure and references
+    if fig_ref:
+        text = re.sub(r'Fig.\s*([0-9]+)', 'Figure \\1', text)
+        text = re.sub(r'[Rr]ef.\s*([0-9]+)', 'reference \\1', text)
+        text = re.sub(r'\sal\.\s*[0-9\s]+', ' al ', text)
+
+    # Normalizing spaces
+    if spaces:
+        text = text.replace('\u000b', ' ').replace(
+            '\u000c', ' ').replace(u'\u0085', ' ')
+        text = text.replace('\u2028', '\n').replace(
+            '\u2029', '\n').replace('\r\n', '\n').replace('\r', '\n')
+        text = text.replace('\n', ' ')
+
+        text = re.sub(r'\s+,', ',', text)
+        # remove coma in thousands
+        text = re.sub(r'([1-9]),([0-9]{3})', '\\1\\2', text)
+        # Put a space around = to sign everywhere
+        text = re.sub(r'(\w+)=(\d+)', '\\1 = \\2', text)
+        text = re.sub(r'\(\s+', '(', text)
+        text = text.replace('%', ' %')  # Normalize % character
+        # Multiple spaces before a bracket
+        text = text.replace(r'\s+)', ')')
+        text = re.sub(r'(\d+),([A-Za-z])', '\\1, \\2', text)
+
+    if chem:
+        text = legacy_chem_normalizer(text)
+
+    if unidec:
+        text = legacy_unidecode_normalize_string(text)
+
+    else:
+        text = preprocessing.normalize.unicode(text)
+        text = preprocessing.normalize.hyphenated_words(text)
+        text = preprocessing.normalize.quotation_marks(text)
+        text = preprocessing.normalize.whitespace(text)
+        text = preprocessing.remove.remove_accents(text)
+        text = text.replace('…', '...').replace(' . . . ', ' ... ')
+
+        re_str = ''.join([chr(c) for c in norm.formatting])
+        re_str = '[' + re_str + ']'
+        text = re.sub(re_str, '', text)
+
+        for tilde in norm.TILDES:
+            text = text.replace(tilde, '~')
+
+        for slash in norm.SLASHES:
+            text = text.replace(slash, '/')
+
+        for control in norm.CONTROLS:
+            text = text.replace(control, '')
+
+    if numbers:
+        text = preprocessing.replace.replace_numbers(text)
+        regex_fraction = r'[-]?\d+[/]\d+'
+        text = re.sub(regex_fraction, ' _FRAC_ ', text)
+
+    if lower_case:
+        text = text.lower()
+
+    text = norm.re_consecutive_spaces.sub(' ', text).strip()
+
+    return text
+
+def legacy_unidecode_normalize_string(string : str) -> str:
+    ret_string = ''
+    for char in string:
+        if re.match(u'[Α-Ωα-ωÅ°±≈⋯∞∆ϵ⋅≫≡≅≃∙≠]', char) is not None:
+            ret_string += str(char)
+        else:
+            ret_string += str(
+                unidecode.unidecode_expect_nonascii(str(char)))
+
+    return ret_string
+
+
+def legacy_chem_normalizer(text : str) -> str:
+    """Normalizes certain very common chemical name variations"""
+    # Can probably add to this list of rules.
+    text = re.sub(r'sulph', r'sulf', text, flags=re.I)
+    text = re.sub(r'aluminum', r'aluminium', text, flags=re.I)
+    text = re.sub(r'cesium', r'caesium', text, flags=re.I)
+
+    return text
+
+
+# Characters with special handling in norm_chars and some of their neighbors.
+SPECIAL_CHARS = (
+    "âÂ\x80\x85\x86\x88\x89\x90\x92\x93\x94\x97\x98\x99\x8d\x9c\x9d\x96\x8b"
+    "\xa0©¼Ã®¶Ä²µ′“‐–°±−¤≈α’× βζöüÎÏï£½"
+)
+PLAIN_CHARS = "ab Tg=1()[]{}^_,.-\n\t\\x89"
+
+
+def _random_text(rng : random.Random) -> str:
+    chars = [
+        rng.choice(SPECIAL_CHARS) if rng.random() < 0.4
+        else rng.choice(PLAIN_CHARS) if rng.random() < 0.9
+        else chr(rng.randrange(0x20, 0x3000))
+        for _ in range(rng.randint(0, 60))
+    ]
+    # Insert the multi character sequences.
+    for seq in ["Î¼", "Î±", "Ïâ", "ï£½", "-\\x89", " isa ", "^{[}", "^{]}"]:
+        if rng.random() < 0.2:
+            chars.insert(rng.randint(0, len(chars)), seq)
+    return "".join(chars)
+
+
+# Multi character sequences of norm_chars, and their truncated forms.
+SEQUENCES = ["Î¼", "Î±", "Ïâ", "ï£½", "ï£", "Î", "Ï", "ï", "-\\x89", " isa ",
+             "^{[}", "^{]}", "(", ")", "( a )"]
+
+EDGE_TEXTS = (
+    ["", " ", "\n\t", "\xa0\u2005", "((", "))"]
+    + list(SPECIAL_CHARS)
+    + SEQUENCES
+    + ["a" + seq for seq in SEQUENCES]
+    + [seq + "a" for seq in SEQUENCES]
+    + [seq + seq for seq in SEQUENCES]
+)
+
+
+@pytest.mark.parametrize("text", EDGE_TEXTS)
+def test_norm_chars_edge_cases(text):
+    norm = normalize.TextNormalizer()
+    assert norm.norm_chars(text) == legacy_norm_chars(text)
+
+
+def test_norm_chars_random_texts():
+    rng = random.Random(0)
+    norm = normalize.TextNormalizer()
+    for _ in range(20000):
+        text = _random_text(rng)
+        assert norm.norm_chars(text) == legacy_norm_chars(text), repr(text)
+
+
+def test_norm_chars_unknown():
+    norm = normalize.TextNormalizer()
+    with pytest.raises(ValueError):
+        norm.norm_chars("bad \ud800 char")
+
+    # The context is the text before the character, even near the start.
+    with pytest.raises(ValueError) as err:
+        norm.norm_chars("bad \ud800 char" + " of a long paragraph" * 2)
+    assert err.value.args[1:] == ("bad ", "\ud800")
+
+    with pytest.raises(ValueError) as err:
+        norm.norm_chars("\ud800")
+    assert err.value.args[1:] == ("", "\ud800")
+
+
+# Fragments that exercise the rules of TextNormalizer.normalize.
+FRAGMENTS = [
+    "The", "polymer", "film", "was", "heated", " ", "  ", ".", ",", "(", ")",
+    "Fig. 2", "Fig.12", "fig 3", "Ref. 4", "ref 5", "et al. 12", "al. 3 4",
+    "Dr. Smith", "e.g.", "i.e.", "A. R.", "cf.", "100° C", "5 °C", "20ºC",
+    "1,000", "2,50", "x=5", "T_g=100", "( a", "[ ]", "[]", "[,]", "()",
+    " - ", "15%", "3/4", "-1/2", "sulphur", "Aluminum", "CESIUM", "^{1}H",
+    "^{13}C", "^{7}Li", " ^{2 }", " _{x}", " _{x }", "\r\n", "\r", "\n",
+    "\u2028", "\u2029", "\x0b", "\x85", "&amp;", "&lt;", "a@b.com",
+    "http://example.org/x", "mg.kg/day", "bit.ly/abc123", "J.Mater.Chem/xx",
+    "WWW.x.org", "© 2020 Elsevier Ltd.", "µm", "α", "β", "Å",
+    "é", "ü", "™", "†", "⊗", "~", "∼", "⁄", "∕", "\x01", "…", " . . . ",
+    "\u2060", "\u200b", "—", "“quoted”", "10\u2009K", "±", "≈", "ϵ",
+]
+
+
+@pytest.mark.parametrize("text", FRAGMENTS + ["", " . ", "Fig.", "ref"])
+def test_normalize_edge_cases(text):
+    norm = normalize.TextNormalizer()
+    for flags in [{}, dict(chem=False, spaces=False, fig_ref=False),
+                  dict(lower_case=True)]:
+        assert norm.normalize(text, **flags) == \
+            legacy_normalize(norm, text, **flags)
+
+
+def test_normalize_random_fragments():
+    rng = random.Random(0)
+    norm = normalize.TextNormalizer()
+    for _ in range(1000):
+        text = "".join(rng.choices(FRAGMENTS, k=rng.randint(0, 40)))
+        # The unidec=False and numbers=True options need an older textacy.
+        flags = dict(chem=rng.random() < 0.8, spaces=rng.random() < 0.8,
+                     fig_ref=rng.random() < 0.8, lower_case=rng.random() < 0.2)
+        assert norm.normalize(text, **flags) == \
+            legacy_normalize(norm, text, **flags), repr(text)
@@ -0,0 +1,336 @@
+"""
+Test the document parsers on small synthetic documents.
+USAGE: pytest tests/test_parser.py -s
+
+"""
+
+import re
+import json
+import random
+import tarfile
+import zipfile
+import pytest
+import pandas as pd
+from lxml import etree
+from backend.text import normalize
+from backend.parser import PaperParser
+from backend.parser.document import DocumentParser
+from backend.parser import tabular
+from backend.parser.paragraph import ParagraphParser
+from backend.utils import shards
+
+ELSEVIER_XML = """<?xml version="1.0"?>
+<full-text-retrieval-response
+    xmlns="http://www.elsevier.com/xml/svapi/article/dtd"
+    xmlns:ce="http://www.elsevier.com/xml/common/dtd"
+    xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:xocs="http://www.elsevier.com/xml/xocs/dtd">
+<coredata><dc:title>Glass transition of PS films</dc:title></coredata>
+<xocs:meta><xocs:srctitle>Polymer</xocs:srctitle>
+<xocs:cover-date-orig>2020-01-01</xocs:cover-date-orig></xocs:meta>
+<ce:abstract><ce:simple-para>The T<ce:inf>g</ce:inf> of polystyrene was
+measured by DSC at 10 K/min.</ce:simple-para></ce:abstract>
+<body><ce:section><ce:section-title>Introduction</ce:section-title>
+<ce:para>Polystyrene (PS) has a T<ce:inf>g</ce:inf> of 100 °C as shown in
+<ce:cross-ref refid="tbl1">Table 1</ce:cross-ref>. It is widely used.</ce:para>
+tail text
+<ce:para>Nested <ce:para>inner paragraph with enough words to be valid.</ce:para>
+outer continues with x<ce:sup>2</ce:sup> and more words.</ce:para>
+<ce:table id="tbl1"><ce:label>Table 1</ce:label><ce:caption><ce:simple-para>
+Thermal properties.</ce:simple-para></ce:caption><tgroup><tbody><row>
+<entry>PS</entry><entry>100</entry></row></tbody></tgroup></ce:table>
+<ce:para>As reported, the values in Table 1 agree with the literature.</ce:para>
+</ce:section></body></full-text-retrieval-response>
+"""
+
+ACS_XML = """<?xml version="1.0"?>
+<article><front><journal-meta><journal-title>Macromolecules</journal-title>
+</journal-meta><article-meta><title-group><article-title>Polymer
+<italic>blends</italic></article-title></title-group>
+<pub-date date-type="pub"><day>1</day><year>2021</year></pub-date>
+<abstract><p>We study blends of PS and PMMA. The results are interesting.</p>
+</abstract></article-meta></front>
+<body><sec><title>Intro</title><p>Blends of PS/PMMA show two
+T<sub>g</sub> values (<xref rid="tbl1">1</xref>). This is well known.</p>
+<p>The figure <xref rid="fig2">2</xref> indicates phase separation in
+these blend samples.</p></sec></body></article>
+"""
+
+
+@pytest.fixture(params=[('elsevier', ELSEVIER_XML), ('acs', ACS_XML)])
+def xmlfile(request, tmp_path):
+    """ Write a synthetic XML document and return (publisher, path). """
+    publisher, contents = request.param
+    path = tmp_path / (publisher + ".xml")
+    path.write_text(contents)
+    return publisher, str(path)
+
+
+def test_streaming_engine(xmlfile):
+    publisher, path = xmlfile
+
+    tree = PaperParser(publisher, path)
+    tree.parse(parse_tables=False)
+
+    stream = PaperParser(publisher, path, streaming=True)
+    stream.parse(parse_tables=False)
+
+    assert stream._tree is None
+    assert len(tree.paragraphs) > 0
+    assert [p.text for p in stream.paragraphs] == \
+        [p.text for p in tree.paragraphs]
+
+    for attr in ['title', 'abstract', 'date', 'journal', 'body']:
+        assert getattr(stream, attr) == getattr(tree, attr)
+
+
+@pytest.mark.parametrize('ext', ['.tar', '.tar.gz', '.zip'])
+def test_shard_members(xmlfile, ext):
+    publisher, path = xmlfile
+    shardpath = path + "-shard" + ext
+    member = "10.1000@doc.xml"
+
+    if ext == '.zip':
+        with zipfile.ZipFile(shardpath, 'w') as zf:
+            zf.write(path, member)
+    else:
+        with tarfile.open(shardpath, 'w:gz' if ext.endswith('gz') else 'w') \
+                as tf:
+            tf.add(path, member)
+
+    loose = PaperParser(publisher, path)
+    loose.parse(parse_tables=False)
+    expected = [p.text for p in loose.paragraphs]
+
+    with shards.Shard(shardpath) as shard:
+        assert [m.name for m in shard.members()] == [member]
+        items = list(shard.items({member}))
+        assert len(items) == 1
+
+    # Contents read sequentially, and the member read by its path.
+    memberpath = shards.member_path(shardpath, member)
+    assert shards.split_member_path(memberpath) == (shardpath, member)
+    for contents in [items[0][1], None]:
+        doc = PaperParser(publisher, memberpath, contents=contents)
+        doc.parse(parse_tables=False)
+        assert [p.text for p in doc.paragraphs] == expected
+        assert doc.docname == member
+
+
+def test_remove_duplicate_paragraphs():
+    rng = random.Random(0)
+    words = "the polymer film was heated to 100 °C and Tg measured".split()
+
+    texts = []
+    for _ in range(300):
+        if texts and rng.random() < 0.3:
+            # part of a previous paragraph
+            prev = rng.choice(texts)
+            start = rng.randrange(len(prev))
+            texts.append(prev[start:start + rng.randint(1, 120)])
+        else:
+            texts.append(" ".join(rng.choices(words, k=rng.randint(3, 60))))
+
+    # Brute force, keep the ones not contained in the kept paragraphs.
+    expected = []
+    for text in texts:
+        if not any(text in t for t in expected):
+            expected.append(text)
+
+    doc = DocumentParser('xml', 'test', 'test.xml')
+    for text in texts:
+        para = ParagraphParser()
+        para.text = text
+        doc.paragraphs.append(para)
+
+    doc.remove_duplicate_paragraphs()
+    assert [p.text for p in doc.paragraphs] == expected
+
+
+INNER_TEXTS = [
+    ('<p>The T<sub>g</sub> of PS is 100 °C.</p>',
+     'The T_{g} of PS is 100 °C.'),
+    ('<p>Films of 10 µm<sup> 2 </sup> area (<i>see</i> <xref>Table 1</xref>).</p>',
+     'Films of 10 \\mum^{2} area (see Table 1).'),
+    ('<p>Li<sup>+</sup> conductivity of 10<sup>−4</sup> S cm<sup>−1</sup> '
+     'at 25\xa0°C.</p>',
+     'Li^{+} conductivity of 10^{-4} S cm^{-1} at 25 °C.'),
+    ('<p>Data from <a>https://example.org</a> and ref<sup>[</sup>12'
+     '<sup>]</sup>.</p>',
+     'Data from and ref [ 12 ] .'),
+    ('<ce:para xmlns:ce="http://www.elsevier.com/xml/common/dtd">CO<ce:inf>2'
+     '</ce:inf> uptake by <ce:italic>poly</ce:italic>(<ce:bold>ethylene'
+     '</ce:bold> oxide)<ce:cross-ref>1</ce:cross-ref>, e.g. at M<ce:inf>w'
+     '</ce:inf> = 10<ce:sup>5</ce:sup>.</ce:para>',
+     'CO_{2} uptake by poly (ethylene oxide) 1, e.g. at M_{w} = 10^{5} .'),
+    ('<p>Nested <b>bold <i>italic x<sup>2</sup></i>y</b>z and ± 5 – 10 %.</p>',
+     'Nested bold italic x^{2}yz and +/-5 -10 %.'),
+    # Mojibake split by a tag is not joined.
+    ('<p>A 5 Î<sub>¼</sub>m film\u3000of ï<b>£½</b> x.</p>',
+     'A 5 Î_{1/4} m film of ï £½ x.'),
+    # The spaces of a comma run are kept, the recursive version removed them.
+    ('<p>Values a , , b.</p>', 'Values a, , b.'),
+]
+
+
+@pytest.mark.parametrize("xml, expected", INNER_TEXTS)
+def test_inner_text(xml, expected):
+    para = ParagraphParser()
+    para.parse(etree.fromstring(xml))
+    assert para.text == expected
+
+
+def _recursive_inner_text(para, element):
+    """ The previous recursive implementation, normalizes at every level. """
+    def clean(text):
+        if text is None or para._is_reference(text):
+            return ""
+        return normalize.normText(text)
+
+    text = " "
+    tail = " "
+    cleanedtext = clean(element.text)
+    cleanedtail = clean(element.tail)
+
+    if cleanedtext:
+        localname = etree.QName(element).localname
+        if localname == 'sup':
+            text += "^{" + cleanedtext + "} "
+        elif localname in ('sub', 'inf'):
+            text += "_{" + cleanedtext + "} "
+        else:
+            text += cleanedtext + " "
+
+    childtexts = [_recursive_inner_text(para, child) for child in element]
+    if cleanedtail:
+        tail = cleanedtail
+
+    return normalize.normText(text + " ".join(childtexts) + tail)
+
+
+def test_inner_text_random():
+    rng = random.Random(0)
+    chars = "abcd efg  .,()-=1234\n²°±Â\xa0µÎ¼Ïâï£½\u3000\x85\u2005"
+    tags = ['i', 'b', 'sup', 'sub', 'inf', 'span']
+
+    def build(elem, depth):
+        elem.text = "".join(rng.choices(chars, k=rng.randint(0, 8)))
+        if depth < 4:
+            for _ in range(rng.randint(0, 3)):
+                child = etree.SubElement(elem, rng.choice(tags))
+                build(child, depth + 1)
+                child.tail = "".join(rng.choices(chars, k=rng.randint(0, 8)))
+
+    def comma_spaces(text):
+        return re.sub(r'\s*,\s*', ',', text)
+
+    para = ParagraphParser()
+    differ = 0
+    for _ in range(2000):
+        root = etree.Element('p')
+        build(root, 0)
+        text = para._innerText(root)
+        expected = _recursive_inner_text(para, root)
+        if text != expected:
+            # Documented difference, the spaces of the comma runs.
+            differ += 1
+            assert re.search(r',\s*,', text)
+            assert comma_spaces(text) == comma_spaces(expected)
+
+    assert differ < 10
+
+
+def _scan_references(doc : DocumentParser, object : str) -> list[str]:
+    """ Search the needle in every sentence, like the previous version. """
+    text = normalize.TextNormalizer().normalize(doc.body.strip())
+    pattern = re.compile(r'([a-z][^\.!?]*[\.!?]) ', re.M | re.IGNORECASE)
+    sents = pattern.findall(text)
+    results = []
+    for i, sent in enumerate(sents):
+        if re.search(rf'\b{object}\b', sent, re.IGNORECASE):
+            context = [s.strip() for s in sents[max(i-1, 0):i+2]]
+            results.append("\n".join(context))
+    if len(results) == 0:
+        pattern = re.compile(rf'([^.!?]*{object}[^.!?]*[.!?])', re.M | re.IGNORECASE)
+        results = pattern.findall(text)
+    return results
+
+
+def test_find_references():
+    rng = random.Random(0)
+    words = ["the", "Tg", "was", "high", "Table", "table", "Tables",
+             "Figure", "figure", "1", "2", "10", "II", "1a", "as", "in"]
+
+    sents = []
+    for _ in range(200):
+        sent = " ".join(rng.choices(words, k=rng.randint(3, 12)))
+        sents.append(sent.capitalize() + rng.choice([".", "!", "?"]))
+
+    doc = DocumentParser('xml', 'test', 'test.xml')
+    doc.body = " ".join(sents)
+
+    for needle in ["Table 1", "Table 2", "table 10", "Table II", "Table 1a",
+                   "Figure 1", "Figure 3", "Table II."]:
+        assert doc.find_references(needle) == _scan_references(doc, needle)
+
+    assert doc.sentence_index() is doc.sentence_index()
+
+
+def test_table_columns():
+    table = etree.fromstring(
+        '<table-wrap><label>Table 2</label><caption>Tg</caption><table>'
+        '<thead><tr><th>Polymer</th><th colspan="2">Tg</th></tr></thead>'
+        '<tbody><tr><td rowspan="2">PS</td><td>100</td><td>1.5</td></tr>'
+        '<tr><td>105</td><td>x</td></tr></tbody></table></table-wrap>')
+
+    tabl = tabular.XMLTableParser()
+    tabl.parse(table)
+
+    assert tabl.number == '2'
+    assert tabl.header == "thead\nPolymer\nTg\nTg"
+    assert tabl.index == "Polymer\nPS\nPS"
+    assert tabl.to_columns() == {
+        'blocks': ['thead', 'tbody', 'tbody'],
+        'columns': [['Polymer', 'PS', 'PS'], ['Tg', 100, 105],
+                    ['Tg', 1.5, 'x']],
+    }
+    assert tabl.to_df().values.tolist() == tabl.to_rows()
+
+    # More columns than the initial span space.
+    wide = etree.fromstring(
+        '<table><tr>' + '<td>a</td>' * 150 + '</tr></table>')
+    tabl = tabular.TableParser()
+    tabl.parse(wide)
+    assert len(tabl.to_columns()['columns']) == 150
+
+    # Short rows are padded with nan, the numbers of float columns are floats.
+    short = etree.fromstring(
+        '<table><tr><td>T</td><td>nan</td><td>inf</td></tr>'
+        '<tr><td>100</td><td>1.5</td></tr></table>')
+    tabl = tabular.TableParser()
+    tabl.parse(short)
+    assert tabl.header == "tbody\nT\nnan\ninf"
+    assert tabl.index == "T\n100"
+    assert tabl.to_columns()['columns'] == [['T', 100], [None, 1.5],
+                                            [None, None]]
+    json.dumps(tabl.to_columns(), allow_nan=False)
+
+
+def test_table_header_strings():
+    """ The header and index are the same as the pandas dataframe values. """
+    rng = random.Random(0)
+    cells = [1, 25, -3, 2**63, 10**20, -10**20, 1.5, 0.1, float('nan'),
+             float('inf'), 1e20, "PS", "", "x", None]
+
+    for _ in range(500):
+        rows = [['tbody'] + rng.choices(cells, k=rng.randint(0, 4))
+                for _ in range(rng.randint(1, 4))]
+        tabl = tabular.TableParser()
+        tabl.rows = rows
+        tabl.parse(etree.Element('table'))
+
+        df = pd.DataFrame(rows)
+        assert tabl.header == "\n".join(str(s) for s in df.iloc[0, :].values)
+        if df.shape[1] > 1:
+            assert tabl.index == "\n".join(
+                str(s) for s in df.iloc[:, 1].values)
@@ -129,3 +129,67 @@ def test_add_property(db, material, prop, db_paragraph, method):
 
     db.close()
 
+def test_reparse_filtered_paragraphs(db):
+    from backend.postgres import orm
+    from backend.console import parse_directory
+
+    doi = 'test/reparse'
+    directory = 'test'
+
+    def parsed():
+        return orm.ParsedFiles(
+            doi=doi, relpath='test/test@reparse.xml', directory=directory,
+            filebytes=1, filemtime=0.0, fingerprint='test', parser_version=1)
+
+    paper = orm.Papers().get_one(db, {'doi': doi})
+    if paper is None:
+        orm.Papers(doi=doi, publisher='test', doctype='xml',
+                   directory=directory).insert(db)
+        db.commit()
+
+    texts = ["The first paragraph.", "The second paragraph."]
+    parse_directory._replace_paragraphs(
+        db, doi, directory, 'xml', texts, parsed())
+
+    old = orm.PaperTexts().get_one(db, {'doi': doi, 'text': texts[1]})
+    orm.FilteredParagraphs(para_id=old.id, filter_name='test').insert(db)
+    db.commit()
+
+    # The filtered paragraph is removed by the reparse.
+    texts = ["The first paragraph.", "The changed paragraph."]
+    parse_directory._replace_paragraphs(
+        db, doi, directory, 'xml', texts, parsed())
+
+    rows = db.query(orm.PaperTexts).filter_by(doi=doi).all()
+    assert sorted(row.text for row in rows) == sorted(texts)
+    assert orm.FilteredParagraphs().get_one(db, {'para_id': old.id}) is None
+
+    # Cleanup, the paper_texts rows are removed by cascade.
+    db.query(orm.ParsedFiles).filter_by(doi=doi).delete()
+    db.query(orm.Papers).filter_by(doi=doi).delete()
+    db.commit()
+    db.close()
+
+def test_parsed_tables_without_tables(db):
+    from backend.postgres import orm
+    from backend.console import parse_tables
+
+    doi = 'test/no-tables'
+
+    paper = orm.Papers().get_one(db, {'doi': doi})
+    if paper is None:
+        orm.Papers(doi=doi, publisher='test', doctype='xml',
+                   directory='test').insert(db)
+        db.commit()
+    paper = orm.Papers().get_one(db, {'doi': doi})
+
+    # The paper is recorded even though it has no tables.
+    assert parse_tables._add_tables_batch(db, [(doi, [])]) == 0
+    ret : orm.ParsedTables = orm.ParsedTables().get_one(db, {'pid': paper.id})
+    assert ret is not None
+    assert ret.tables == 0
+
+    # Cleanup, the parsed_tables row is removed by cascade.
+    db.query(orm.Papers).filter_by(doi=doi).delete()
+    db.commit()
+    db.close()
@@ -0,0 +1,58 @@
+"""
+Test the sliding windows of the long texts for the NER model.
+USAGE: pytest tests/test_windows.py
+
+"""
+
+import re
+from backend.record_extraction import windows
+
+
+def tokenize(text : str) -> list[tuple[int, int]]:
+    """ Char offsets of the words and punctuations, as the BERT tokens. """
+    return [m.span() for m in re.finditer(r"\w+|[^\w\s]", text)]
+
+
+def find_entities(text : str) -> list[dict]:
+    return [
+        {'entity_group': 'PROP_NAME', 'score': 0.9, 'word': m.group(),
+         'start': m.start(), 'end': m.end()}
+        for m in re.finditer(r"glass transition temperature", text)
+    ]
+
+
+def test_split_windows():
+    text = "The Tg of PS-b-PMMA was 105 °C. " * 40
+    offsets = tokenize(text)
+
+    assert windows.split_windows(text, offsets, len(offsets), 10) \
+        == [(0, len(text))]
+
+    spans = windows.split_windows(text, offsets, 50, 10)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text.rstrip())
+    for (a, b), (c, d) in zip(spans, spans[1:]):
+        # Overlapping, moving forward, starting at a word.
+        assert a < c < b < d
+        assert text[c - 1] == ' '
+    for a, b in spans:
+        assert len(tokenize(text[a:b])) <= 50
+
+
+def test_merge_entities():
+    text = "The glass transition temperature of the film was 105 °C. " * 30
+    offsets = tokenize(text)
+    spans = windows.split_windows(text, offsets, 40, 15)
+    assert len(spans) > 1
+
+    merged = windows.merge_entities(
+        [(a, find_entities(text[a:b])) for a, b in spans])
+    assert [(e['start'], e['end']) for e in merged] \
+        == [(e['start'], e['end']) for e in find_entities(text)]
+
+    # Overlapping entities are resolved by the score.
+    merged = windows.merge_entities([
+        (0, [{'entity_group': 'POLYMER', 'score': 0.5, 'start': 4, 'end': 10}]),
+        (6, [{'entity_group': 'MONOMER', 'score': 0.8, 'start': 0, 'end': 6}]),
+    ])
+    assert merged == [
+        {'entity_group': 'MONOMER', 'score': 0.8, 'start': 6, 'end': 12}]